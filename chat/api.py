@@ -1,16 +1,103 @@
-from rest_framework.views import APIView
-from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
-from .models import ChatSession, Message
-from chat.rag import rag_answer
-class ChatView(APIView):
-    permission_classes = [IsAuthenticated]
+import logging
 
-    def post(self, request):
-        question = request.data["question"]
+from django.http import JsonResponse, StreamingHttpResponse
+from config.async_views import AsyncAPIView, sse_event
+from rag_engine.deadline import CHAT_DEADLINE, Deadline, DeadlineExceeded
+from rag_engine.timings import collect, wants_timings
+from .history import get_session, load_history, record_turn
+from chat.rag import arag_answer, stream_rag_answer
 
+logger = logging.getLogger(__name__)
 
-        answer = rag_answer(question, request.user)
 
+class AsyncChatView(AsyncAPIView):
+    """Base for the async chat views; the question comes as JSON or form data."""
 
-        return Response({"answer": answer})
+    async def authenticated_question(self, request):
+        """(user, question, None), or (None, None, error response)."""
+        error = await self.initial(request)
+        if error is not None:
+            return None, None, error
+        question = self.data.get("question") if hasattr(self.data, "get") else None
+        if not isinstance(question, str) or not question:
+            return None, None, JsonResponse({"detail": "Missing 'question'."}, status=400)
+        return self.user, question, None
+
+    @staticmethod
+    async def session_and_history(user, session_id):
+        """(session, history, None) for the user's session, a new one if session_id is None, or a 404."""
+        session = await get_session(user, session_id)
+        if session is None:
+            return None, None, JsonResponse({"detail": "Chat session not found."}, status=404)
+        return session, await load_history(session), None
+
+
+class ChatView(AsyncChatView):
+    """
+    Chat answer as one JSON response; waits on retrieval and generation
+    without holding a thread. Without a session_id a new session is started;
+    its id is returned for the follow-up turns. With ?debug=timings the
+    response includes per-stage timings in milliseconds.
+    """
+
+    async def post(self, request, session_id=None):
+        user, question, error = await self.authenticated_question(request)
+        if error is not None:
+            return error
+        session, history, error = await self.session_and_history(user, session_id)
+        if error is not None:
+            return error
+
+        try:
+            with collect(enabled=wants_timings(request)) as timings:
+                answer = await arag_answer(question, user, history, Deadline.after(CHAT_DEADLINE))
+        except DeadlineExceeded:
+            logger.warning(f"Chat for user {user.id} exceeded its {CHAT_DEADLINE}s deadline")
+            return JsonResponse({"detail": "Answer generation timed out."}, status=504)
+        await record_turn(session, history, question, answer)
+
+        response = {"answer": answer, "session_id": session.id}
+        if timings is not None:
+            response["timings"] = timings
+        return JsonResponse(response)
+
+
+class ChatStreamView(AsyncChatView):
+    """
+    Chat answer streamed as server-sent events: a "retrieval" event with the
+    sources, "token" events as the model generates, then "done" with the
+    session id (or "error"). The turn is saved before "done" is sent. With
+    ?debug=timings "done" also carries per-stage timings.
+    """
+
+    async def post(self, request, session_id=None):
+        user, question, error = await self.authenticated_question(request)
+        if error is not None:
+            return error
+        session, history, error = await self.session_and_history(user, session_id)
+        if error is not None:
+            return error
+
+        timings = {} if wants_timings(request) else None
+        return StreamingHttpResponse(
+            self._events(question, user, session, history, Deadline.after(CHAT_DEADLINE), timings),
+            content_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    @staticmethod
+    async def _events(question, user, session, history, deadline, timings):
+        try:
+            async for event, data in stream_rag_answer(question, user, history, deadline, timings):
+                if event == "done":
+                    await record_turn(session, history, question, data["answer"])
+                    data = {**data, "session_id": session.id}
+                    if timings is not None:
+                        data["timings"] = timings
+                yield sse_event(event, data)
+        except DeadlineExceeded:
+            logger.warning(f"Streaming chat for user {user.id} exceeded its {CHAT_DEADLINE}s deadline")
+            yield sse_event("error", {"detail": "Answer generation timed out."})
+        except Exception:
+            logger.error(f"Streaming chat failed for user {user.id}", exc_info=True)
+            yield sse_event("error", {"detail": "Answer generation failed."})
@@ -0,0 +1,148 @@
+import asyncio
+import os
+from dataclasses import asdict, dataclass, field
+from typing import Optional
+
+from django.core.cache import cache
+
+from rag_engine.generation import generate
+from .models import ChatSession, Message
+
+env = os.environ
+
+# Most recent messages kept verbatim in the prompt; older ones are folded into the session summary.
+HISTORY_MESSAGES = int(env.get("CHAT_HISTORY_MESSAGES", 8))
+# Messages beyond the window allowed to pile up before a compaction is queued.
+SUMMARY_BATCH = int(env.get("CHAT_SUMMARY_BATCH", 4))
+SUMMARY_MAX_WORDS = int(env.get("CHAT_SUMMARY_MAX_WORDS", 200))
+HISTORY_CACHE_TTL = int(env.get("CHAT_HISTORY_CACHE_TTL", 3600))
+# Seconds before a queued compaction that never finished may be queued again.
+COMPACTION_PENDING_TTL = int(env.get("CHAT_COMPACTION_PENDING_TTL", 600))
+
+SUMMARY_TEMPLATE = """
+Update the summary of a conversation between a user and a company assistant
+with the new messages below. Keep facts, names, decisions and open questions.
+Answer with the summary only, in at most {words} words.
+
+Summary so far:
+{summary}
+
+New messages:
+{messages}
+"""
+
+
+@dataclass
+class History:
+    """What the prompt sees of a session: the rolling summary and the recent messages, oldest first."""
+    summary: str = ""
+    messages: list[dict] = field(default_factory=list)  # {"role", "content"}
+
+    def to_lines(self) -> list[str]:
+        """The summary, then one line per message; the prompt drops them from the front when short of tokens."""
+        lines = [f"Summary of earlier messages: {self.summary}"] if self.summary else []
+        lines += [format_message(message["role"], message["content"]) for message in self.messages]
+        return lines
+
+
+def format_message(role: str, content: str) -> str:
+    return f"{role.capitalize()}: {content}"
+
+
+def history_key(session_id: int) -> str:
+    return f"chat:history:{session_id}"
+
+
+def compaction_key(session_id: int) -> str:
+    return f"chat:compaction_pending:{session_id}"
+
+
+async def get_session(user, session_id: Optional[int] = None) -> Optional[ChatSession]:
+    """The user's session, a new one when session_id is None, or None if it is not theirs."""
+    if session_id is None:
+        return await ChatSession.objects.acreate(user=user)
+    return await ChatSession.objects.filter(id=session_id, user=user).afirst()
+
+
+async def load_history(session: ChatSession) -> History:
+    """
+    History window of a session, from the cache; the database is only read
+    on a miss (new worker, evicted key or after a compaction).
+    """
+    cached = await cache.aget(history_key(session.id))
+    if cached is not None:
+        return History(**cached)
+
+    recent = Message.objects.filter(session=session, id__gt=session.summarized_through).order_by("-id")
+    messages = [
+        {"role": message.role, "content": message.content}
+        async for message in recent[:HISTORY_MESSAGES + SUMMARY_BATCH]
+    ]
+    history = History(session.summary, messages[::-1])
+    await cache.aset(history_key(session.id), asdict(history), HISTORY_CACHE_TTL)
+    return history
+
+
+async def record_turn(session: ChatSession, history: History, question: str, answer: str) -> None:
+    """
+    Persist a question and its answer in one INSERT and append them to the
+    cached window, which keeps at most HISTORY_MESSAGES + SUMMARY_BATCH
+    messages. Once it is full the oldest are compacted into the summary in
+    the background; one compaction is queued at a time.
+    """
+    await Message.objects.abulk_create([
+        Message(session=session, role="user", content=question),
+        Message(session=session, role="assistant", content=answer),
+    ])
+    limit = HISTORY_MESSAGES + SUMMARY_BATCH
+    history.messages = (history.messages + [
+        {"role": "user", "content": question},
+        {"role": "assistant", "content": answer},
+    ])[-limit:]
+    await cache.aset(history_key(session.id), asdict(history), HISTORY_CACHE_TTL)
+
+    if len(history.messages) >= limit and await cache.aadd(compaction_key(session.id), True, COMPACTION_PENDING_TTL):
+        from .tasks import compact_session
+        await asyncio.to_thread(compact_session.delay, session.id)
+
+
+def summarize(summary: str, messages: list[Message]) -> str:
+    """Fold messages into a session summary with one LLM call."""
+    prompt = SUMMARY_TEMPLATE.format(
+        words=SUMMARY_MAX_WORDS,
+        summary=summary or "(none)",
+        messages="\n".join(format_message(message.role, message.content) for message in messages),
+    )
+    return generate(prompt).strip()
+
+
+def compact_session(session_id: int) -> int:
+    """
+    Fold the messages older than the history window into the session
+    summary, then drop the cached window so the next turn reloads it.
+
+    The LLM call runs outside any transaction, so no row stays locked while
+    it is generating. The summary is then written only if summarized_through
+    has not moved since the messages were read: of two overlapping
+    compactions the first to finish wins and the other's summary is
+    discarded. A compaction that starts after another finished has nothing
+    to fold and does not call the LLM.
+
+    Returns:
+        Number of messages folded into the summary
+    """
+    session = ChatSession.objects.filter(id=session_id).only("summary", "summarized_through").first()
+    if session is None:
+        return 0
+    pending = list(Message.objects.filter(session_id=session_id, id__gt=session.summarized_through).order_by("id"))
+    overflow = pending[:-HISTORY_MESSAGES] if HISTORY_MESSAGES else pending
+    folded = 0
+    if overflow:
+        summary = summarize(session.summary, overflow)
+        updated = ChatSession.objects.filter(id=session_id, summarized_through=session.summarized_through).update(
+            summary=summary,
+            summarized_through=overflow[-1].id,
+        )
+        folded = len(overflow) if updated else 0
+    cache.delete_many([history_key(session_id), compaction_key(session_id)])
+    return folded
@@ -4,9 +4,15 @@ from django.contrib.auth.models import User
 class ChatSession(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     created = models.DateTimeField(auto_now_add=True)
+    # Rolling summary of the messages up to and including summarized_through (a Message id).
+    summary = models.TextField(blank=True, default="")
+    summarized_through = models.BigIntegerField(default=0)
 
 class Message(models.Model):
     session = models.ForeignKey(ChatSession, on_delete=models.CASCADE)
     role = models.CharField(max_length=10)  # user / assistant
     content = models.TextField()
     created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["session", "id"])]
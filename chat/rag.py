@@ -1,13 +1,136 @@
-from rag_engine.prompting import build_prompt, build_prompt_for_score
-from rag_engine.search import SearchRag
+import logging
+import time
+from typing import AsyncIterator, Optional, Sequence
 
+from rag_engine.answer_cache import CachedAnswer, answer_cache
+from rag_engine.cache import acorpus_generation, aget_query_vector
+from rag_engine.deadline import Deadline, deadline_scope, timeout
+from rag_engine.generation import GENERATION_TIMEOUT, agenerate, stream_generate
+from rag_engine.prompting import PackedPrompt, pack_prompt
+from rag_engine.search import AsyncSearchRag, SearchResult
+from rag_engine.timings import collect, record, stage
+from .history import History
 
-def rag_answer(question, user):
-    search = SearchRag()
-    semantic_chunks = search.semantic_search(query=question, user_id=user.id)
-    prompt = build_prompt_for_score(semantic_chunks, question)
-    
+logger = logging.getLogger(__name__)
 
 
-    # per ora mock
-    return "These are the answers: {prompt} ".format(prompt=prompt)
+def _pack(question, user, semantic_chunks: list[SearchResult], history: Sequence[str] = ()) -> PackedPrompt:
+    with stage("prompt_packing"):
+        packed = pack_prompt(semantic_chunks, question, history=history)
+    logger.info(
+        f"Prompt for user {user.id}: {packed.tokens}/{packed.budget} tokens, "
+        f"{packed.used_chunks} chunks used, {packed.dropped_chunks} dropped, "
+        f"{packed.dropped_history} history lines dropped"
+    )
+    return packed
+
+
+async def aretrieve(
+        question,
+        user,
+        history: Optional[History] = None,
+        vector: Optional[list[float]] = None,
+) -> tuple[list[SearchResult], PackedPrompt]:
+    semantic_chunks = await AsyncSearchRag().semantic_search(query=question, user_id=user.id, vector=vector)
+    return semantic_chunks, _pack(question, user, semantic_chunks, history.to_lines() if history else ())
+
+
+def retrieval_metadata(results: list[SearchResult], packed: PackedPrompt) -> dict:
+    return {
+        "sources": packed.sources,
+        "results": [
+            {"_id": r.id, "document_id": r.document_id, "score": r.score, "ordinal": r.ordinal}
+            for r in results
+        ],
+        "prompt_tokens": packed.tokens,
+    }
+
+
+def _cacheable(history: Optional[History]) -> bool:
+    # A follow-up ("and for admins?") means something else in another
+    # conversation, so only standalone questions use the answer cache.
+    return history is None or not (history.summary or history.messages)
+
+
+def _cache_entry(question, answer, results: list[SearchResult], packed: PackedPrompt) -> CachedAnswer:
+    return CachedAnswer(question, answer, chunk_ids=[r.id for r in results], sources=packed.sources)
+
+
+def _lookup(user, vector, generation) -> Optional[CachedAnswer]:
+    with stage("answer_cache"):
+        hit = answer_cache.lookup(user.id, vector, generation)
+    if hit is not None:
+        logger.info(f"Answer cache hit for user {user.id} (similarity {hit.similarity:.3f} to {hit.question!r})")
+    return hit
+
+
+async def arag_answer(question, user, history: Optional[History] = None, deadline: Optional[Deadline] = None):
+    """Answer a question; embedding, retrieval and generation share the deadline (DeadlineExceeded past it)."""
+    with deadline_scope(deadline):
+        cacheable = _cacheable(history)
+        vector = await aget_query_vector(question)
+        if cacheable:
+            generation = await acorpus_generation(user.id)
+            hit = _lookup(user, vector, generation)
+            if hit is not None:
+                return hit.answer
+
+        results, packed = await aretrieve(question, user, history, vector)
+        answer = await agenerate(packed.prompt)
+        if cacheable:
+            answer_cache.store(user.id, vector, generation, _cache_entry(question, answer, results, packed))
+        return answer
+
+
+async def stream_rag_answer(
+        question,
+        user,
+        history: Optional[History] = None,
+        deadline: Optional[Deadline] = None,
+        timings: Optional[dict[str, float]] = None,
+) -> AsyncIterator[tuple[str, dict]]:
+    """
+    Answer a question as a sequence of (event, data) pairs: "retrieval" with
+    the sources first, then one "token" per generated text delta, then "done".
+    A cached answer is sent as a single "token" after a "retrieval" event
+    marked "cached".
+
+    The deadline bounds the time to the first token; once the answer
+    streams, only the generation timeout between chunks applies. Stage
+    timings are added to timings, if given.
+    """
+    cacheable = _cacheable(history)
+    # The scopes are entered only around awaits: a context variable set before a yield
+    # cannot be reset after it.
+    with deadline_scope(deadline), collect(timings, enabled=timings is not None):
+        vector = await aget_query_vector(question)
+        generation = await acorpus_generation(user.id) if cacheable else None
+        hit = _lookup(user, vector, generation) if cacheable else None
+    if hit is not None:
+        yield "retrieval", {
+            "sources": hit.sources,
+            "results": [{"_id": chunk_id} for chunk_id in hit.chunk_ids],
+            "cached": True,
+            "similarity": hit.similarity,
+        }
+        yield "token", {"text": hit.answer}
+        yield "done", {"answer": hit.answer}
+        return
+
+    with deadline_scope(deadline), collect(timings, enabled=timings is not None):
+        results, packed = await aretrieve(question, user, history, vector)
+        generation_timeout = timeout(GENERATION_TIMEOUT, "generation")
+    yield "retrieval", retrieval_metadata(results, packed)
+
+    parts = []
+    started = time.perf_counter()
+    async for token in stream_generate(packed.prompt, generation_timeout):
+        if not parts:
+            record("generation_first_token", time.perf_counter() - started, timings)
+        parts.append(token)
+        yield "token", {"text": token}
+    record("generation", time.perf_counter() - started, timings)
+    answer = "".join(parts)
+    if cacheable:
+        answer_cache.store(user.id, vector, generation, _cache_entry(question, answer, results, packed))
+    yield "done", {"answer": answer}
@@ -0,0 +1,8 @@
+from celery import shared_task
+
+from . import history
+
+
+@shared_task(autoretry_for=(Exception,), retry_backoff=30, retry_kwargs={"max_retries": 3})
+def compact_session(session_id):
+    return {"session_id": session_id, "summarized": history.compact_session(session_id)}
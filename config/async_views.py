@@ -0,0 +1,82 @@
+import json
+import math
+from typing import Optional
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.views import APIView
+
+
+def sse_event(event: str, data: dict) -> str:
+    """One server-sent event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class AsyncAPIView(View):
+    """
+    Base for async views, which DRF's synchronous APIView cannot serve.
+
+    initial() applies the policies an APIView would: the authentication,
+    permission and throttle classes (DRF's defaults, IsAuthenticated unless
+    overridden), then parses the body with the parser classes, so JSON and
+    form posts both work. It runs in a worker thread, off the event loop.
+    """
+    authentication_classes = api_settings.DEFAULT_AUTHENTICATION_CLASSES
+    permission_classes = [IsAuthenticated]
+    throttle_classes = api_settings.DEFAULT_THROTTLE_CLASSES
+    parser_classes = api_settings.DEFAULT_PARSER_CLASSES
+
+    # APIView's own policy checks, so both kinds of view behave alike.
+    get_authenticators = APIView.get_authenticators
+    get_permissions = APIView.get_permissions
+    get_throttles = APIView.get_throttles
+    get_parsers = APIView.get_parsers
+    check_permissions = APIView.check_permissions
+    check_throttles = APIView.check_throttles
+    permission_denied = APIView.permission_denied
+    throttled = APIView.throttled
+    get_authenticate_header = APIView.get_authenticate_header
+
+    async def initial(self, request) -> Optional[JsonResponse]:
+        """
+        Check the request against the view's policies.
+
+        Returns:
+            The error response (401, 403, 415, 429 or 400) of a rejected
+            request, or None with self.user and self.data set
+        """
+        return await sync_to_async(self._initial, thread_sensitive=False)(request)
+
+    def _initial(self, request) -> Optional[JsonResponse]:
+        drf_request = Request(request, parsers=self.get_parsers(), authenticators=self.get_authenticators())
+        try:
+            drf_request.user
+            self.check_permissions(drf_request)
+            self.check_throttles(drf_request)
+            data = drf_request.data
+        except exceptions.APIException as exc:
+            return self._error_response(drf_request, exc)
+        self.user, self.data = drf_request.user, data
+        return None
+
+    def _error_response(self, request: Request, exc: exceptions.APIException) -> JsonResponse:
+        status, headers = exc.status_code, {}
+        if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+            # Like APIView: without a WWW-Authenticate challenge a 401 becomes a 403.
+            challenge = self.get_authenticate_header(request)
+            if challenge:
+                headers["WWW-Authenticate"] = challenge
+            else:
+                status = 403
+        wait = getattr(exc, "wait", None)
+        if wait is not None:
+            headers["Retry-After"] = str(math.ceil(wait))
+        return JsonResponse({"detail": exc.detail}, status=status, headers=headers)
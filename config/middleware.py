@@ -0,0 +1,391 @@
+import asyncio
+import logging
+import math
+import os
+import threading
+import time
+import uuid
+import weakref
+from dataclasses import dataclass
+from typing import Optional
+
+import redis
+import redis.asyncio
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.http import JsonResponse
+from prometheus_client import Counter, Gauge
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+env = os.environ
+logger = logging.getLogger(__name__)
+
+ADMISSION_CONTROL = env.get("ADMISSION_CONTROL", "on") != "off"
+# Requests in flight across all workers; beyond it requests queue, then get a 503.
+GLOBAL_IN_FLIGHT = int(env.get("ADMISSION_GLOBAL_IN_FLIGHT", 200))
+# Longest a request waits for a global slot.
+QUEUE_TIMEOUT = float(env.get("ADMISSION_QUEUE_TIMEOUT", 5))
+# Requests of this process allowed to wait at once; more are rejected immediately.
+MAX_QUEUED = int(env.get("ADMISSION_MAX_QUEUED", 100))
+# A slot not released (crashed worker, dropped stream) frees itself after this many seconds.
+SLOT_TTL = int(env.get("ADMISSION_SLOT_TTL", 300))
+
+
+@dataclass(frozen=True)
+class RouteLimits:
+    rate: float  # requests per second refilled into the bucket
+    burst: int  # bucket size
+    concurrency: int  # requests of one user in flight
+
+
+def _route_limits(name: str, rate: float, burst: int, concurrency: int) -> RouteLimits:
+    prefix = f"ADMISSION_{name.upper()}"
+    return RouteLimits(
+        rate=float(env.get(f"{prefix}_RATE", rate)),
+        burst=int(env.get(f"{prefix}_BURST", burst)),
+        concurrency=int(env.get(f"{prefix}_CONCURRENCY", concurrency)),
+    )
+
+
+# Path prefix -> (route name, limits). Each route has its own buckets and semaphores.
+ADMISSION_ROUTES = {
+    "/api/chat": ("chat", _route_limits("chat", rate=0.5, burst=10, concurrency=4)),
+    "/api/upload": ("upload", _route_limits("upload", rate=0.2, burst=5, concurrency=2)),
+}
+
+# Admit a request: take a slot in the user's and the global semaphore
+# (sorted sets of slot ids scored by expiry) and a token from the user's
+# bucket, refilled by elapsed time, or take nothing. The user's slots are
+# checked first, then the bucket, then the global cap, so a request rejected
+# for concurrency or queued for a global slot does not spend a token.
+# Returns {outcome, seconds until a token is available}; the seconds are a
+# string since Redis truncates Lua numbers to integers.
+ADMIT_SCRIPT = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', now)
+redis.call('ZREMRANGEBYSCORE', KEYS[3], '-inf', now)
+if redis.call('ZCARD', KEYS[2]) >= tonumber(ARGV[4]) then
+    return {1, '0'}
+end
+local rate = tonumber(ARGV[2])
+local burst = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+if tokens < 1 then
+    return {3, tostring((1 - tokens) / rate)}
+end
+if redis.call('ZCARD', KEYS[3]) >= tonumber(ARGV[5]) then
+    return {2, '0'}
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens - 1), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+local ttl = tonumber(ARGV[6])
+redis.call('ZADD', KEYS[2], now + ttl, ARGV[1])
+redis.call('ZADD', KEYS[3], now + ttl, ARGV[1])
+redis.call('EXPIRE', KEYS[2], ttl)
+redis.call('EXPIRE', KEYS[3], ttl)
+return {0, '0'}
+"""
+
+ADMITTED, USER_BUSY, OVERLOADED, RATE_LIMITED = 0, 1, 2, 3
+
+admission_requests = Counter(
+    "rag_admission_requests_total",
+    "Requests seen by admission control, by route and outcome.",
+    ["route", "outcome"],
+)
+admission_queue_wait = Counter(
+    "rag_admission_queue_wait_seconds_total",
+    "Time admitted and rejected requests spent waiting for a global slot.",
+    ["route"],
+)
+admission_in_flight = Gauge(
+    "rag_admission_in_flight",
+    "Admitted requests not finished yet.",
+    ["route"],
+    multiprocess_mode="livesum",
+)
+admission_queued = Gauge(
+    "rag_admission_queued",
+    "Requests waiting for a global slot.",
+    ["route"],
+    multiprocess_mode="livesum",
+)
+
+
+class Rejected(Exception):
+    def __init__(self, outcome: str, status: int, retry_after: float, detail: str):
+        super().__init__(detail)
+        self.outcome = outcome
+        self.status = status
+        self.retry_after = retry_after
+        self.detail = detail
+
+    def response(self) -> JsonResponse:
+        return JsonResponse(
+            {"detail": self.detail},
+            status=self.status,
+            headers={"Retry-After": str(max(1, math.ceil(self.retry_after)))},
+        )
+
+
+def _rate_limited(wait: float) -> Rejected:
+    return Rejected("rate_limited", 429, wait, "Too many requests; slow down.")
+
+
+def _user_busy() -> Rejected:
+    return Rejected("user_concurrency", 429, 1, "Too many requests in progress for this user.")
+
+
+def _overloaded(outcome: str = "overloaded") -> Rejected:
+    return Rejected(outcome, 503, QUEUE_TIMEOUT or 1, "Server busy; retry shortly.")
+
+
+def client_key(request, authentication: JWTAuthentication) -> str:
+    """
+    Who the request counts against: the user id of a valid access token
+    (verified without a database query), else the client address.
+    """
+    header = authentication.get_header(request)
+    raw_token = authentication.get_raw_token(header) if header else None
+    if raw_token is not None:
+        try:
+            return f"user:{authentication.get_validated_token(raw_token)[jwt_settings.USER_ID_CLAIM]}"
+        except (InvalidToken, TokenError, KeyError):
+            pass
+    return f"ip:{request.META.get('REMOTE_ADDR', '')}"
+
+
+class AdmissionController:
+    """
+    Token buckets and concurrency semaphores in Redis, so limits hold across
+    every worker. Requests that find the global cap reached poll for a slot
+    with backoff for up to QUEUE_TIMEOUT seconds.
+    """
+
+    def __init__(self, url: Optional[str] = None):
+        self.url = url or env.get("REDIS_URL", "redis://localhost:6379/0")
+        self.redis = redis.Redis.from_url(self.url)
+        self.admit_script = self.redis.register_script(ADMIT_SCRIPT)
+        # One async client per event loop; its connections belong to that loop.
+        self._async: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, tuple]" = weakref.WeakKeyDictionary()
+        self.queued = 0
+        self._queue_lock = threading.Lock()
+
+    def _async_scripts(self):
+        loop = asyncio.get_running_loop()
+        scripts = self._async.get(loop)
+        if scripts is None:
+            client = redis.asyncio.Redis.from_url(self.url)
+            scripts = self._async[loop] = (client, client.register_script(ADMIT_SCRIPT))
+        return scripts
+
+    @staticmethod
+    def _script_inputs(route: str, limits: RouteLimits, client: str) -> tuple[list, list]:
+        """ADMIT_SCRIPT's keys (bucket, user slots, global slots) and arguments, for a new slot id."""
+        keys = [
+            f"rag:admission:bucket:{route}:{client}",
+            f"rag:admission:slots:{route}:{client}",
+            "rag:admission:slots:global",
+        ]
+        args = [uuid.uuid4().hex, limits.rate, limits.burst, limits.concurrency, GLOBAL_IN_FLIGHT, SLOT_TTL]
+        return keys, args
+
+    @staticmethod
+    def _outcome(reply) -> int:
+        """ADMITTED or OVERLOADED from ADMIT_SCRIPT's reply; raises Rejected for the user's own limits."""
+        outcome, wait = int(reply[0]), float(reply[1])
+        if outcome == RATE_LIMITED:
+            raise _rate_limited(wait)
+        if outcome == USER_BUSY:
+            raise _user_busy()
+        return outcome
+
+    def _enter_queue(self, route: str) -> None:
+        with self._queue_lock:
+            if self.queued >= MAX_QUEUED:
+                raise _overloaded("queue_full")
+            self.queued += 1
+        admission_queued.labels(route=route).inc()
+
+    def _leave_queue(self, route: str, started: float) -> None:
+        with self._queue_lock:
+            self.queued -= 1
+        admission_queued.labels(route=route).dec()
+        admission_queue_wait.labels(route=route).inc(time.monotonic() - started)
+
+    def admit(self, route: str, limits: RouteLimits, client: str) -> tuple[str, str]:
+        """Take a slot and a rate token; returns what release() needs, or raises Rejected."""
+        keys, args = self._script_inputs(route, limits, client)
+        result = self._outcome(self.admit_script(keys=keys, args=args))
+        if result == OVERLOADED:
+            self._enter_queue(route)
+            started = time.monotonic()
+            try:
+                delay = 0.05
+                while result == OVERLOADED and time.monotonic() - started + delay <= QUEUE_TIMEOUT:
+                    time.sleep(delay)
+                    delay = min(delay * 2, 0.5)
+                    result = self._outcome(self.admit_script(keys=keys, args=args))
+            finally:
+                self._leave_queue(route, started)
+        if result == OVERLOADED:
+            raise _overloaded()
+        return keys[1], args[0]
+
+    async def aadmit(self, route: str, limits: RouteLimits, client: str) -> tuple[str, str]:
+        """Async admit(); waiting for a slot does not block the event loop."""
+        _, admit_script = self._async_scripts()
+        keys, args = self._script_inputs(route, limits, client)
+        result = self._outcome(await admit_script(keys=keys, args=args))
+        if result == OVERLOADED:
+            self._enter_queue(route)
+            started = time.monotonic()
+            try:
+                delay = 0.05
+                while result == OVERLOADED and time.monotonic() - started + delay <= QUEUE_TIMEOUT:
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, 0.5)
+                    result = self._outcome(await admit_script(keys=keys, args=args))
+            finally:
+                self._leave_queue(route, started)
+        if result == OVERLOADED:
+            raise _overloaded()
+        return keys[1], args[0]
+
+    def release(self, user_slots: str, slot: str) -> None:
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.zrem(user_slots, slot)
+        pipe.zrem("rag:admission:slots:global", slot)
+        pipe.execute()
+
+    async def arelease(self, user_slots: str, slot: str) -> None:
+        client, _ = self._async_scripts()
+        async with client.pipeline(transaction=False) as pipe:
+            pipe.zrem(user_slots, slot)
+            pipe.zrem("rag:admission:slots:global", slot)
+            await pipe.execute()
+
+
+class AdmissionControlMiddleware:
+    """
+    Admission control for the expensive routes (ADMISSION_ROUTES): a
+    per-user token bucket (429), a per-user concurrency limit (429) and a
+    global in-flight cap that queues briefly, then rejects (503). Rejections
+    carry Retry-After. Streaming responses hold their slot until the stream
+    ends. If Redis is unreachable requests are let through.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        self.controller = AdmissionController() if ADMISSION_CONTROL else None
+        self.authentication = JWTAuthentication()
+
+    def _route(self, request):
+        if self.controller is None or request.method == "OPTIONS":
+            return None
+        for prefix, route in ADMISSION_ROUTES.items():
+            if request.path.startswith(prefix):
+                return route
+        return None
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        route = self._route(request)
+        if route is None:
+            return self.get_response(request)
+
+        name, limits = route
+        try:
+            slot = self.controller.admit(name, limits, client_key(request, self.authentication))
+        except Rejected as rejected:
+            admission_requests.labels(route=name, outcome=rejected.outcome).inc()
+            return rejected.response()
+        except redis.RedisError:
+            logger.warning("Admission control unavailable, admitting request", exc_info=True)
+            admission_requests.labels(route=name, outcome="limiter_error").inc()
+            return self.get_response(request)
+
+        admission_requests.labels(route=name, outcome="admitted").inc()
+        admission_in_flight.labels(route=name).inc()
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            self._release(name, slot)
+            raise
+        if response.streaming and not response.is_async:
+            response.streaming_content = self._release_after(response.streaming_content, name, slot)
+        elif response.streaming:
+            response.streaming_content = self._arelease_after(response.streaming_content, name, slot)
+        else:
+            self._release(name, slot)
+        return response
+
+    async def __acall__(self, request):
+        route = self._route(request)
+        if route is None:
+            return await self.get_response(request)
+
+        name, limits = route
+        try:
+            slot = await self.controller.aadmit(name, limits, client_key(request, self.authentication))
+        except Rejected as rejected:
+            admission_requests.labels(route=name, outcome=rejected.outcome).inc()
+            return rejected.response()
+        except redis.RedisError:
+            logger.warning("Admission control unavailable, admitting request", exc_info=True)
+            admission_requests.labels(route=name, outcome="limiter_error").inc()
+            return await self.get_response(request)
+
+        admission_requests.labels(route=name, outcome="admitted").inc()
+        admission_in_flight.labels(route=name).inc()
+        try:
+            response = await self.get_response(request)
+        except BaseException:
+            await self._arelease(name, slot)
+            raise
+        if response.streaming and response.is_async:
+            response.streaming_content = self._arelease_after(response.streaming_content, name, slot)
+        elif response.streaming:
+            response.streaming_content = self._release_after(response.streaming_content, name, slot)
+        else:
+            await self._arelease(name, slot)
+        return response
+
+    def _release(self, name, slot) -> None:
+        admission_in_flight.labels(route=name).dec()
+        try:
+            self.controller.release(*slot)
+        except redis.RedisError:
+            logger.warning("Could not release admission slot; it expires after SLOT_TTL", exc_info=True)
+
+    async def _arelease(self, name, slot) -> None:
+        admission_in_flight.labels(route=name).dec()
+        try:
+            await self.controller.arelease(*slot)
+        except redis.RedisError:
+            logger.warning("Could not release admission slot; it expires after SLOT_TTL", exc_info=True)
+
+    def _release_after(self, content, name, slot):
+        try:
+            yield from content
+        finally:
+            self._release(name, slot)
+
+    async def _arelease_after(self, content, name, slot):
+        try:
+            async for part in content:
+                yield part
+        finally:
+            await self._arelease(name, slot)
@@ -15,14 +15,27 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path
-from documents.api import UploadDocument
-from chat.api import ChatView
+from documents.api import DocumentDetail, DocumentList, DocumentProgress, DocumentProgressStream, UploadDocument
+from chat.api import ChatStreamView, ChatView
+from rag_engine.api import BatchSearchView, SearchView
+from rag_engine.metrics import metrics_view
 from rest_framework_simplejwt.views import TokenObtainPairView
 urlpatterns = [
     path('admin/', admin.site.urls),
     path("api/token", TokenObtainPairView.as_view()),
     path("api/upload", UploadDocument.as_view()),
+    path("api/documents", DocumentList.as_view()),
+    path("api/documents/progress", DocumentProgress.as_view()),
+    path("api/documents/progress/stream", DocumentProgressStream.as_view()),
+    path("api/documents/<uuid:document_id>", DocumentDetail.as_view()),
+    path("api/documents/<uuid:document_id>/progress", DocumentProgress.as_view()),
+    path("api/documents/<uuid:document_id>/progress/stream", DocumentProgressStream.as_view()),
+    path("api/chat/stream", ChatStreamView.as_view()),
+    path("api/chat/<int:session_id>/stream", ChatStreamView.as_view()),
     path("api/chat/<int:session_id>", ChatView.as_view()),
     path("api/chat/", ChatView.as_view()),
+    path("api/search", SearchView.as_view()),
+    path("api/search/batch", BatchSearchView.as_view()),
+    path("metrics", metrics_view),
 ]
 
@@ -1,8 +1,51 @@
+import json
+import logging
+import time
+from uuid import UUID
+
+from django.http import JsonResponse, StreamingHttpResponse
 from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from .serializers import DocumentUploadSerializer
+from config.async_views import AsyncAPIView, sse_event
+from rag_engine.cache import bump_corpus_generation
+from rag_engine.dedup import DEDUP_INDEX_BACKEND, forget_document_signatures
+from rag_engine.storage import delete_document_file
+from rag_engine.vector_store import get_vector_store
+from .catalog import DOCUMENT_PAGE_SIZE, InvalidCursor, document_count, invalidate_document_count, list_documents
+from .models import Document
+from .progress import PROGRESS_STREAM_TIMEOUT, progress
+from .serializers import DocumentSerializer, DocumentUploadSerializer
+from .tasks import rehome_references
+
+logger = logging.getLogger(__name__)
+
+# Most documents one progress request may ask about.
+MAX_PROGRESS_IDS = 100
+# Seconds between keepalive comments on an idle progress stream.
+PROGRESS_KEEPALIVE = 15
+
+
+def progress_document_ids(params, document_id=None):
+    """Document ids of a progress request (the path's, or the comma-separated "ids" parameter), or None if invalid."""
+    if document_id is not None:
+        return [str(document_id)]
+    raw = [value for value in params.get("ids", "").split(",") if value]
+    if not raw or len(raw) > MAX_PROGRESS_IDS:
+        return None
+    try:
+        return list(dict.fromkeys(str(UUID(value)) for value in raw))
+    except ValueError:
+        return None
+
+
+def own_progress(states, user_id):
+    """Progress states with other users' documents hidden."""
+    return {
+        document_id: state if state is not None and state["user_id"] == user_id else None
+        for document_id, state in states.items()
+    }
 
 class UploadDocument(APIView):
     permission_classes = [IsAuthenticated]
@@ -22,3 +65,162 @@ class UploadDocument(APIView):
             {"status": "success", "document_ids": document_ids},
             status=status.HTTP_201_CREATED
         )
+
+
+class DocumentList(APIView):
+    """
+    The user's documents, newest first, from the Document table.
+
+    Query parameters: limit (page size) and cursor (the "next" value of the
+    previous page). "count" is the total number of the user's documents.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            limit = int(request.query_params.get("limit", DOCUMENT_PAGE_SIZE))
+        except ValueError:
+            return Response({"detail": "'limit' must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            documents, next_cursor = list_documents(request.user.id, request.query_params.get("cursor"), limit)
+        except InvalidCursor:
+            return Response({"detail": "Invalid cursor."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            "count": document_count(request.user.id),
+            "next": next_cursor,
+            "results": DocumentSerializer(documents, many=True).data,
+        })
+
+
+class DocumentDetail(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @staticmethod
+    def _get_owned_document(client, request, document_id):
+        document = client.get_document(str(document_id))
+        if document is None or document["user_id"] != request.user.id:
+            return None
+        return document
+
+    def delete(self, request, document_id):
+        with get_vector_store() as client:
+            document = self._get_owned_document(client, request, document_id)
+            if document is None:
+                return Response({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
+            deleted_chunks = client.delete_document(str(document_id))
+        if Document.objects.filter(document_id=document_id, owner=request.user).delete()[0]:
+            invalidate_document_count(request.user.id)
+
+        delete_document_file(document["bucket"], document["storage_path"])
+        forget_document_signatures(request.user.id, str(document_id))
+        if DEDUP_INDEX_BACKEND != "off":
+            # Other documents' near-duplicates of the deleted chunks.
+            rehome_references.delay(str(document_id), request.user.id)
+        bump_corpus_generation(request.user.id)
+        return Response(
+            {"status": "deleted", "document_id": str(document_id), "deleted_chunks": deleted_chunks},
+            status=status.HTTP_200_OK,
+        )
+
+    def put(self, request, document_id):
+        file = request.FILES.get("file")
+        if not file:
+            return Response({"detail": "Missing 'file'."}, status=status.HTTP_400_BAD_REQUEST)
+        with get_vector_store() as client:
+            document = self._get_owned_document(client, request, document_id)
+        if document is None:
+            return Response({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        serializer = DocumentUploadSerializer(document, data={"file": file}, context={"request": request})
+        serializer.is_valid(raise_exception=True)
+        doc = serializer.save()
+        return Response({"status": "success", "document_id": doc["id"]}, status=status.HTTP_200_OK)
+
+
+class DocumentProgress(APIView):
+    """
+    Ingestion progress from Redis, for one document or a batch (?ids=a,b).
+
+    A document's state has its stage, "total", "stored" and "duplicates"
+    chunk counts, the last error and the ingestion rate. Documents without
+    recorded progress are null (a 404 for a single document).
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, document_id=None):
+        document_ids = progress_document_ids(request.query_params, document_id)
+        if document_ids is None:
+            return Response(
+                {"detail": f"'ids' must be 1 to {MAX_PROGRESS_IDS} comma-separated document ids."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        states = own_progress(progress.get_many(document_ids), request.user.id)
+        if document_id is None:
+            return Response({"documents": states})
+        state = states[str(document_id)]
+        if state is None:
+            return Response({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(state)
+
+
+class DocumentProgressStream(AsyncAPIView):
+    """
+    Ingestion progress as server-sent events: a "progress" event with each
+    document's current state, then one per update published by the task,
+    until every document is done or failed ("done"), or after
+    PROGRESS_STREAM_TIMEOUT seconds ("timeout"). Documents without recorded
+    progress get a "missing" event and are not waited for.
+    """
+
+    async def get(self, request, document_id=None):
+        error = await self.initial(request)
+        if error is not None:
+            return error
+        document_ids = progress_document_ids(request.GET, document_id)
+        if document_ids is None:
+            return JsonResponse(
+                {"detail": f"'ids' must be 1 to {MAX_PROGRESS_IDS} comma-separated document ids."},
+                status=400,
+            )
+
+        return StreamingHttpResponse(
+            self._events(self.user.id, document_ids),
+            content_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    @staticmethod
+    async def _events(user_id, document_ids):
+        # Subscribe before reading the current states so no update falls in between.
+        pubsub = await progress.asubscribe(user_id)
+        try:
+            pending = {}  # document id -> "updated" of the last state sent
+            for document_id, state in own_progress(await progress.aget_many(document_ids), user_id).items():
+                if state is None:
+                    yield sse_event("missing", {"document_id": document_id})
+                    continue
+                yield sse_event("progress", state)
+                if not state["finished"]:
+                    pending[document_id] = state["updated"]
+
+            stop_at = time.monotonic() + PROGRESS_STREAM_TIMEOUT
+            while pending and time.monotonic() < stop_at:
+                message = await pubsub.get_message(timeout=min(PROGRESS_KEEPALIVE, stop_at - time.monotonic()))
+                if message is None:
+                    yield ": keepalive\n\n"
+                    continue
+                state = json.loads(message["data"])
+                # Updates published before the states were read may arrive after them.
+                if state["document_id"] not in pending or state["updated"] < pending[state["document_id"]]:
+                    continue
+                yield sse_event("progress", state)
+                if state["finished"]:
+                    del pending[state["document_id"]]
+                else:
+                    pending[state["document_id"]] = state["updated"]
+            yield sse_event("timeout" if pending else "done", {"pending": list(pending)})
+        except Exception:
+            logger.error(f"Progress stream failed for user {user_id}", exc_info=True)
+            yield sse_event("error", {"detail": "Progress unavailable."})
+        finally:
+            await pubsub.aclose()
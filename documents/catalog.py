@@ -0,0 +1,90 @@
+"""
+A user's documents, listed and counted from the Document table.
+
+Listing uses keyset pagination over the (owner, uploaded_at, id) index:
+a page continues strictly after the last row of the previous one, so
+deep pages cost the same as the first and concurrent uploads do not
+shift or repeat rows. Counts are cached and dropped when a document is
+added or deleted.
+"""
+
+import base64
+import os
+from datetime import datetime
+from typing import Optional
+
+from django.core.cache import cache
+from django.db.models import Q
+
+from .models import Document
+
+env = os.environ
+
+DOCUMENT_PAGE_SIZE = int(env.get("DOCUMENT_PAGE_SIZE", 50))
+DOCUMENT_MAX_PAGE_SIZE = int(env.get("DOCUMENT_MAX_PAGE_SIZE", 200))
+DOCUMENT_COUNT_CACHE_TTL = int(env.get("DOCUMENT_COUNT_CACHE_TTL", 300))
+
+
+class InvalidCursor(ValueError):
+    """A pagination cursor that was not produced by encode_cursor."""
+
+
+def encode_cursor(document: Document) -> str:
+    """Opaque cursor pointing just past a document in newest-first order."""
+    position = f"{document.uploaded_at.isoformat()}|{document.pk}"
+    return base64.urlsafe_b64encode(position.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        uploaded_at, pk = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").split("|")
+        return datetime.fromisoformat(uploaded_at), int(pk)
+    except (ValueError, UnicodeError) as exc:
+        raise InvalidCursor(f"Invalid cursor: {cursor!r}") from exc
+
+
+def list_documents(
+        owner_id: int,
+        cursor: Optional[str] = None,
+        limit: int = DOCUMENT_PAGE_SIZE,
+) -> tuple[list[Document], Optional[str]]:
+    """
+    One page of a user's documents, newest first.
+
+    Args:
+        owner_id: Id of the owning user
+        cursor: next cursor of the previous page, or None for the first page
+        limit: Page size, capped at DOCUMENT_MAX_PAGE_SIZE
+
+    Returns:
+        The page's documents and the cursor of the next page (None on the last page)
+
+    Raises:
+        InvalidCursor: if cursor cannot be decoded
+    """
+    limit = max(1, min(limit, DOCUMENT_MAX_PAGE_SIZE))
+    queryset = Document.objects.filter(owner_id=owner_id)
+    if cursor:
+        uploaded_at, pk = decode_cursor(cursor)
+        queryset = queryset.filter(Q(uploaded_at__lt=uploaded_at) | Q(uploaded_at=uploaded_at, pk__lt=pk))
+    page = list(queryset.order_by("-uploaded_at", "-pk")[:limit + 1])
+    if len(page) > limit:
+        return page[:limit], encode_cursor(page[limit - 1])
+    return page, None
+
+
+def _count_key(owner_id: int) -> str:
+    return f"documents:count:{owner_id}"
+
+
+def document_count(owner_id: int) -> int:
+    """Number of a user's documents, cached for DOCUMENT_COUNT_CACHE_TTL seconds."""
+    count = cache.get(_count_key(owner_id))
+    if count is None:
+        count = Document.objects.filter(owner_id=owner_id).count()
+        cache.set(_count_key(owner_id), count, DOCUMENT_COUNT_CACHE_TTL)
+    return count
+
+
+def invalidate_document_count(owner_id: int) -> None:
+    cache.delete(_count_key(owner_id))
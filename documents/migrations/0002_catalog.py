@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:58
+
+import uuid
+
+from django.db import migrations, models
+
+
+def gen_document_ids(apps, schema_editor):
+    Document = apps.get_model("documents", "Document")
+    for document in Document.objects.filter(document_id__isnull=True).only("id"):
+        document.document_id = uuid.uuid4()
+        document.save(update_fields=["document_id"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='document_id',
+            field=models.UUIDField(editable=False, null=True),
+        ),
+        migrations.RunPython(gen_document_ids, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='document',
+            name='document_id',
+            field=models.UUIDField(default=uuid.uuid4, editable=False, unique=True),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='size',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('processed', 'Processed'), ('failed', 'Failed')], default='pending', max_length=16),
+        ),
+        migrations.AddIndex(
+            model_name='document',
+            index=models.Index(fields=['owner', 'uploaded_at', 'id'], name='documents_d_owner_i_f06056_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='document',
+            index=models.Index(fields=['owner', 'content_hash'], name='documents_d_owner_i_024b69_idx'),
+        ),
+    ]
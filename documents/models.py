@@ -1,9 +1,29 @@
+from uuid import uuid4
+
 from django.db import models
 from django.contrib.auth.models import User
 
 class Document(models.Model):
+    class Status(models.TextChoices):
+        PENDING = "pending"
+        PROCESSING = "processing"
+        PROCESSED = "processed"
+        FAILED = "failed"
+
     owner = models.ForeignKey(User, on_delete=models.CASCADE)
+    # Id of the document and its chunks in the vector store.
+    document_id = models.UUIDField(default=uuid4, unique=True, editable=False)
     file = models.FileField(upload_to="docs/")
     filename = models.CharField(max_length=255)
+    size = models.BigIntegerField(default=0)  # bytes
+    content_hash = models.CharField(max_length=64, blank=True, default="")  # sha256 hex digest
+    status = models.CharField(max_length=16, choices=Status.choices, default=Status.PENDING)
     uploaded_at = models.DateTimeField(auto_now_add=True)
     processed = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            # Newest-first keyset pagination of a user's documents (see documents.catalog).
+            models.Index(fields=["owner", "uploaded_at", "id"]),
+            models.Index(fields=["owner", "content_hash"]),
+        ]
@@ -0,0 +1,193 @@
+"""
+Live ingestion progress of uploaded documents, kept in Redis.
+
+Each document has a hash rag:ingest:<document_id> with its stage, chunk
+counters and last error. The upload creates it and process_document
+updates it. Every update also publishes the full state on the owner's
+channel rag:ingest:events:<user_id>, so one subscription follows any
+batch of that user's documents. Status reads and streams never touch
+the database.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+import weakref
+from typing import Iterable, Optional
+
+import redis
+import redis.asyncio
+
+logger = logging.getLogger(__name__)
+
+env = os.environ
+
+# Seconds a document's progress is kept after its last update.
+PROGRESS_TTL = int(env.get("INGEST_PROGRESS_TTL", 86400))
+# Longest a client may follow progress on one stream, in seconds.
+PROGRESS_STREAM_TIMEOUT = float(env.get("INGEST_PROGRESS_STREAM_TIMEOUT", 600))
+
+QUEUED = "queued"
+CHUNKING = "chunking"
+EMBEDDING = "embedding"
+FINALIZING = "finalizing"
+RETRYING = "retrying"
+DONE = "done"
+FAILED = "failed"
+TERMINAL_STAGES = (DONE, FAILED)
+
+COUNTERS = ("total", "stored", "duplicates")
+
+
+def progress_key(document_id: str) -> str:
+    return f"rag:ingest:{document_id}"
+
+
+def progress_channel(user_id: int) -> str:
+    return f"rag:ingest:events:{user_id}"
+
+
+def snapshot(document_id: str, raw: dict) -> Optional[dict]:
+    """
+    A document's progress from its Redis hash, or None if it has none.
+
+    Adds "processed" (chunks stored or skipped as duplicates), "finished"
+    and "chunks_per_second" since the current attempt started.
+    """
+    if not raw:
+        return None
+    fields = {
+        (key.decode() if isinstance(key, bytes) else key): (value.decode() if isinstance(value, bytes) else value)
+        for key, value in raw.items()
+    }
+    state = {
+        "document_id": document_id,
+        "user_id": int(fields.get("user_id", 0)),
+        "filename": fields.get("filename", ""),
+        "stage": fields.get("stage", QUEUED),
+        "error": fields.get("error", ""),
+        **{name: int(fields.get(name, 0)) for name in COUNTERS},
+    }
+    started = float(fields.get("started", 0))
+    updated = float(fields.get("updated", 0))
+    processed = state["stored"] + state["duplicates"]
+    elapsed = updated - started
+    state.update(
+        processed=processed,
+        finished=state["stage"] in TERMINAL_STAGES,
+        chunks_per_second=round(processed / elapsed, 2) if started and elapsed > 0 else 0.0,
+        updated=updated,
+    )
+    return state
+
+
+class IngestProgress:
+    """
+    Writes and reads ingestion progress. Progress is advisory: Redis errors
+    are logged and never fail an upload or an ingestion task.
+    """
+
+    def __init__(self, url: Optional[str] = None):
+        self.url = url or env.get("REDIS_URL", "redis://localhost:6379/0")
+        self.redis = redis.Redis.from_url(self.url)
+        # One async client per event loop; its connections belong to that loop.
+        self._async: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, redis.asyncio.Redis]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+    def _async_client(self) -> redis.asyncio.Redis:
+        loop = asyncio.get_running_loop()
+        client = self._async.get(loop)
+        if client is None:
+            client = self._async[loop] = redis.asyncio.Redis.from_url(self.url)
+        return client
+
+    def _update(
+            self,
+            document_id: str,
+            user_id: int,
+            fields: dict,
+            increments: Optional[dict] = None,
+            reset: bool = False,
+    ) -> Optional[dict]:
+        key = progress_key(document_id)
+        try:
+            pipe = self.redis.pipeline()
+            if reset:
+                pipe.delete(key)
+            pipe.hset(key, mapping={**fields, "user_id": user_id, "updated": time.time()})
+            for name, amount in (increments or {}).items():
+                pipe.hincrby(key, name, amount)
+            pipe.expire(key, PROGRESS_TTL)
+            pipe.hgetall(key)
+            state = snapshot(document_id, pipe.execute()[-1])
+            self.redis.publish(progress_channel(user_id), json.dumps(state))
+            return state
+        except redis.RedisError:
+            logger.warning(f"Could not record ingestion progress of document {document_id}", exc_info=True)
+            return None
+
+    def queued(self, document_id: str, user_id: int, filename: str) -> None:
+        self._update(
+            document_id,
+            user_id,
+            {"stage": QUEUED, "filename": filename, "error": "", "started": 0, **dict.fromkeys(COUNTERS, 0)},
+            reset=True,
+        )
+
+    def started(self, document_id: str, user_id: int) -> None:
+        """An ingestion attempt started; counters restart, as a retry re-processes every chunk."""
+        self._update(
+            document_id,
+            user_id,
+            {"stage": CHUNKING, "error": "", "started": time.time(), **dict.fromkeys(COUNTERS, 0)},
+        )
+
+    def chunked(self, document_id: str, user_id: int, total: int) -> None:
+        self._update(document_id, user_id, {"stage": EMBEDDING, "total": total})
+
+    def advance(self, document_id: str, user_id: int, stored: int, duplicates: int = 0) -> None:
+        self._update(document_id, user_id, {}, increments={"stored": stored, "duplicates": duplicates})
+
+    def stage(self, document_id: str, user_id: int, stage: str, error: str = "") -> None:
+        fields = {"stage": stage}
+        if error:
+            fields["error"] = error
+        self._update(document_id, user_id, fields)
+
+    def get_many(self, document_ids: Iterable[str]) -> dict[str, Optional[dict]]:
+        """Progress of each document; None for documents without any, or for all of them if Redis fails."""
+        document_ids = list(document_ids)
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for document_id in document_ids:
+                pipe.hgetall(progress_key(document_id))
+            raws = pipe.execute()
+        except redis.RedisError:
+            logger.warning("Could not read ingestion progress", exc_info=True)
+            raws = [None] * len(document_ids)
+        return {document_id: snapshot(document_id, raw) for document_id, raw in zip(document_ids, raws)}
+
+    async def aget_many(self, document_ids: Iterable[str]) -> dict[str, Optional[dict]]:
+        """Async get_many()."""
+        document_ids = list(document_ids)
+        try:
+            pipe = self._async_client().pipeline(transaction=False)
+            for document_id in document_ids:
+                pipe.hgetall(progress_key(document_id))
+            raws = await pipe.execute()
+        except redis.RedisError:
+            logger.warning("Could not read ingestion progress", exc_info=True)
+            raws = [None] * len(document_ids)
+        return {document_id: snapshot(document_id, raw) for document_id, raw in zip(document_ids, raws)}
+
+    async def asubscribe(self, user_id: int) -> redis.asyncio.client.PubSub:
+        """Subscription to a user's progress updates; the caller closes it with aclose()."""
+        pubsub = self._async_client().pubsub(ignore_subscribe_messages=True)
+        await pubsub.subscribe(progress_channel(user_id))
+        return pubsub
+
+
+progress = IngestProgress()
@@ -1,12 +1,22 @@
+import hashlib
+import os
+from functools import partial
 from pathlib import Path
 from uuid import uuid4
 
 from django.conf import settings
 from django.core.files.storage import FileSystemStorage
-from django.utils import timezone
+from celery import chain
+from django.db import transaction
 from rest_framework import serializers
-from documents.tasks import process_document
-from rag_engine.weaviate_client import WeaviateClient
+from documents.catalog import invalidate_document_count
+from documents.models import Document
+from documents.progress import progress
+from documents.tasks import process_document, rehome_references
+from rag_engine.cache import bump_corpus_generation
+from rag_engine.dedup import DEDUP_INDEX_BACKEND
+from rag_engine.storage import delete_document_file
+from rag_engine.vector_store import get_vector_store
 
 
 DEFAULT_ALLOWED_MIME_TYPES = getattr(
@@ -19,6 +29,15 @@ DEFAULT_STORAGE_SUBDIR = getattr(settings, "DOCUMENT_STORAGE_SUBDIR", "documents
 DEFAULT_STORAGE_BUCKET = getattr(settings, "DOCUMENT_STORAGE_BUCKET", "local")
 
 
+class DocumentSerializer(serializers.ModelSerializer):
+    id = serializers.UUIDField(source="document_id", read_only=True)
+
+    class Meta:
+        model = Document
+        fields = ("id", "filename", "size", "content_hash", "status", "processed", "uploaded_at")
+        read_only_fields = fields
+
+
 class DocumentUploadSerializer(serializers.Serializer):
     id = serializers.CharField(read_only=True)
     file = serializers.FileField(required=True, write_only=True)
@@ -37,42 +56,137 @@ class DocumentUploadSerializer(serializers.Serializer):
             raise serializers.ValidationError("Unsupported file type.")
         return value
 
-    def create(self, validated_data):
+    def _get_user(self):
         request = self.context.get("request")
         if not request or not request.user.is_authenticated:
             raise serializers.ValidationError("Authenticated user required.")
+        return request.user
 
-        upload = validated_data["file"]
+    @staticmethod
+    def _store_upload(upload):
         storage_root = Path(settings.MEDIA_ROOT) / DEFAULT_STORAGE_SUBDIR
         storage_root.mkdir(parents=True, exist_ok=True)
         storage = FileSystemStorage(location=storage_root)
         stored_name = f"{uuid4().hex}_{upload.name}"
         saved_name = storage.save(stored_name, upload)
-        file_path = storage.path(saved_name)
+        return storage.path(saved_name)
+
+    @staticmethod
+    def _content_hash(upload):
+        digest = hashlib.sha256()
+        for chunk in upload.chunks():
+            digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def _catalog_fields(upload, file_path):
+        return {
+            "file": os.path.relpath(file_path, settings.MEDIA_ROOT),
+            "filename": upload.name,
+            "size": upload.size,
+            "content_hash": DocumentUploadSerializer._content_hash(upload),
+            "status": Document.Status.PENDING,
+            "processed": False,
+        }
+
+    def create(self, validated_data):
+        """
+        Store the upload, record it in the catalog and the vector store, and
+        queue ingestion. The Document row and the task are committed together:
+        the task is only sent once the row is visible to the worker.
+        """
+        user = self._get_user()
+        upload = validated_data["file"]
+        file_path = self._store_upload(upload)
 
         document_id = str(uuid4())
-        with WeaviateClient() as client:
+        with transaction.atomic():
+            document = Document.objects.create(
+                owner=user,
+                document_id=document_id,
+                **self._catalog_fields(upload, file_path),
+            )
+            with get_vector_store() as client:
+                client.create_document(
+                    doc_id=document_id,
+                    user_id=user.id,
+                    filename=upload.name,
+                    bucket=DEFAULT_STORAGE_BUCKET,
+                    processed=False,
+                    text="",
+                    storage_path=file_path,
+                )
 
-            client.create_document(
+            transaction.on_commit(partial(invalidate_document_count, user.id))
+            transaction.on_commit(partial(progress.queued, document_id, user.id, upload.name))
+            transaction.on_commit(partial(
+                process_document.delay,
                 doc_id=document_id,
-                user_id=request.user.id,
-                filename=upload.name,
+                user_id=user.id,
+                file_path=file_path,
                 bucket=DEFAULT_STORAGE_BUCKET,
-                processed=False,
-                text="",
+                filename=upload.name,
+            ))
+
+        return {
+            "id": document_id,
+            "filename": upload.name,
+            "uploaded_at": document.uploaded_at,
+            "processed": False,
+        }
+
+    def update(self, instance, validated_data):
+        """
+        Replace a document's content: drop its chunks, swap the stored file
+        and re-run ingestion under the same document id.
+        """
+        user = self._get_user()
+        upload = validated_data["file"]
+        file_path = self._store_upload(upload)
+        document_id = instance["_id"]
+
+        with transaction.atomic():
+            # Documents uploaded before the catalog existed get their row here.
+            document, created = Document.objects.update_or_create(
+                document_id=document_id,
+                owner=user,
+                defaults=self._catalog_fields(upload, file_path),
+            )
+
+        # The vector store does not roll back with the database: it changes once the row is committed.
+        with get_vector_store() as client:
+            client.delete_chunks(document_id)
+            client.update_document(
+                document_id,
+                {
+                    "filename": upload.name,
+                    "bucket": DEFAULT_STORAGE_BUCKET,
+                    "storage_path": file_path,
+                    "processed": False,
+                },
             )
 
-        process_document.delay(
+        ingest = process_document.si(
             doc_id=document_id,
-            user_id=request.user.id,
+            user_id=user.id,
             file_path=file_path,
             bucket=DEFAULT_STORAGE_BUCKET,
             filename=upload.name,
         )
+        if DEDUP_INDEX_BACKEND != "off":
+            # Other documents' near-duplicates of the dropped chunks are rehomed
+            # before re-ingestion reuses their chunk ids (uuid5 of doc:ordinal).
+            ingest = chain(rehome_references.si(document_id, user.id), ingest)
+        if created:
+            transaction.on_commit(partial(invalidate_document_count, user.id))
+        transaction.on_commit(partial(progress.queued, document_id, user.id, upload.name))
+        transaction.on_commit(ingest.delay)
+        delete_document_file(instance["bucket"], instance["storage_path"])
+        bump_corpus_generation(user.id)
 
         return {
             "id": document_id,
             "filename": upload.name,
-            "uploaded_at": timezone.now(),
+            "uploaded_at": document.uploaded_at,
             "processed": False,
         }
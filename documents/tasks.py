@@ -1,28 +1,106 @@
+import logging
+from collections import defaultdict
+from contextlib import nullcontext
+from dataclasses import replace
 
-from celery import shared_task
-from rag_engine.weaviate_client import WeaviateClient
+from celery import Task, shared_task
+from rag_engine.cache import bump_corpus_generation
+from rag_engine.chunking import Chunk, chunk_text
+from rag_engine.dedup import get_signature_index, minhash
+from rag_engine.vector_store import chunk_uuid, get_vector_store
+from rag_engine.vectors import pool_vectors
 
+from .models import Document
+from .progress import DONE, FAILED, FINALIZING, RETRYING, progress
 
+logger = logging.getLogger(__name__)
 
-@shared_task(bind=True, autoretry_for=(Exception,), retry_backoff=30, retry_kwargs={"max_retries": 5})
-def process_document(self, doc_id, user_id, file_path, bucket="local", filename=None):
-    import logging
-    logger = logging.getLogger(__name__)
+EMBED_BATCH_SIZE = 64
+
+
+def set_document_status(doc_id, status):
+    """Record ingestion progress on the document's catalog row (if it has one)."""
+    Document.objects.filter(document_id=doc_id).update(
+        status=status,
+        processed=status == Document.Status.PROCESSED,
+    )
+
+
+class DocumentTask(Task):
+    @staticmethod
+    def _document(args, kwargs):
+        return kwargs.get("doc_id", args[0] if args else None), kwargs.get("user_id", args[1] if len(args) > 1 else None)
+
+    def on_retry(self, exc, task_id, args, kwargs, einfo):
+        doc_id, user_id = self._document(args, kwargs)
+        if doc_id is not None:
+            progress.stage(doc_id, user_id, RETRYING, error=str(exc))
 
-    with WeaviateClient() as client:
+    def on_failure(self, exc, task_id, args, kwargs, einfo):
+        # Called once retries are exhausted, not on each retry.
+        doc_id, user_id = self._document(args, kwargs)
+        if doc_id is not None:
+            set_document_status(doc_id, Document.Status.FAILED)
+            progress.stage(doc_id, user_id, FAILED, error=str(exc))
+
+
+@shared_task(
+    bind=True,
+    base=DocumentTask,
+    autoretry_for=(Exception,),
+    retry_backoff=30,
+    retry_kwargs={"max_retries": 5},
+)
+def process_document(self, doc_id, user_id, file_path, bucket="local", filename=None):
+    set_document_status(doc_id, Document.Status.PROCESSING)
+    progress.started(doc_id, user_id)
+    with get_vector_store() as client, (get_signature_index() or nullcontext()) as signatures:
 
         logger.info(f"Processing document {doc_id}")
 
         with open(file_path, "rb") as file_handle:
             text = file_handle.read().decode("utf-8")
-        chunks = client.chunk_text(text)
+        chunks = chunk_text(text)
         logger.info(f"Created {len(chunks)} chunks for document {doc_id}")
+        progress.chunked(doc_id, user_id, len(chunks))
 
-        for chunk in chunks:
-            client.store_chunk(chunk, doc_id, user_id)
+        if signatures is not None:
+            # A retry or a replaced upload must not match its own earlier chunks.
+            signatures.forget_document(user_id, doc_id)
+
+        vectors = []
+        kept = []
+        skipped = []
+        for start in range(0, len(chunks), EMBED_BATCH_SIZE):
+            batch = chunks[start:start + EMBED_BATCH_SIZE]
+            batch_size = len(batch)
+            ordinals = list(range(start, start + len(batch)))
+            if signatures is not None:
+                batch_signatures, matches = signatures.find_duplicates(user_id, [chunk.text for chunk in batch])
+                references = signatures.resolve_duplicates(user_id, doc_id, batch, ordinals, matches)
+                skipped.extend(chunk for chunk, reference in zip(batch, references) if reference is not None)
+                keep = [i for i, reference in enumerate(references) if reference is None]
+                batch = [batch[i] for i in keep]
+                ordinals = [ordinals[i] for i in keep]
+            if batch:
+                vectors.extend(client.store_chunks(batch, doc_id, user_id, ordinals=ordinals))
+                kept.extend(batch)
+            if signatures is not None:
+                signatures.add(
+                    user_id,
+                    doc_id,
+                    [(chunk_uuid(doc_id, ordinal), batch_signatures[keep[i]]) for i, ordinal in enumerate(ordinals)],
+                )
+                # Scoped searches and rehome_references find skipped chunks through these.
+                signatures.add_references(user_id, [reference for reference in references if reference is not None])
+            progress.advance(doc_id, user_id, stored=len(batch), duplicates=batch_size - len(batch))
+        # Length-weighted mean of the chunk vectors stands in for a full-text
+        # embedding, which Ollama would truncate anyway.
+        document_vector = pool_vectors(vectors, weights=[len(chunk.text) for chunk in kept])
 
 
         # Log before update
+        progress.stage(doc_id, user_id, FINALIZING)
         logger.info(f"Updating document {doc_id} to processed=True")
         client.update_document(
                     doc_id,
@@ -32,7 +110,93 @@ def process_document(self, doc_id, user_id, file_path, bucket="local", filename=
                         "bucket": bucket,
                         "filename": filename or "",
                     },
+                    vector=document_vector,
                 )
         logger.info(f"Update result for {doc_id}")
 
-    return {"doc_id": doc_id, "processed": True}
\ No newline at end of file
+    set_document_status(doc_id, Document.Status.PROCESSED)
+    progress.stage(doc_id, user_id, DONE)
+    bump_corpus_generation(user_id)
+
+    # Each skipped chunk saves one embedding and its stored vector and text.
+    dimension = len(vectors[0]) if vectors else 0
+    index_bytes_saved = sum(len(chunk.text.encode("utf-8")) + dimension * 4 for chunk in skipped)
+    if skipped:
+        logger.info(
+            f"Skipped {len(skipped)} near-duplicate chunks of document {doc_id}: "
+            f"{len(skipped)} embeddings and ~{index_bytes_saved} index bytes saved"
+        )
+
+    return {
+        "doc_id": doc_id,
+        "processed": True,
+        "chunks": len(chunks),
+        "duplicate_chunks": len(skipped),
+        "embeddings_saved": len(skipped),
+        "index_bytes_saved": index_bytes_saved,
+    }
+
+
+@shared_task(autoretry_for=(Exception,), retry_backoff=30, retry_kwargs={"max_retries": 5})
+def rehome_references(doc_id, user_id):
+    """
+    Store the chunks other documents skipped as near-duplicates of a
+    document's chunks, once those chunks are deleted or replaced.
+
+    For each canonical chunk, the first reference whose document is still
+    readable becomes a real chunk (embedded from its own document's text)
+    and the remaining references point at it instead.
+    """
+    signatures = get_signature_index()
+    if signatures is None:
+        return {"doc_id": doc_id, "rehomed_chunks": 0}
+
+    with get_vector_store() as client, signatures:
+        by_canonical = defaultdict(list)
+        for reference in signatures.references_to(user_id, doc_id):
+            # The document's own references go with it.
+            if reference.document_id != doc_id:
+                by_canonical[reference.canonical_id].append(reference)
+
+        texts = {}
+
+        def readable(reference):
+            if reference.document_id not in texts:
+                document = client.get_document(reference.document_id, include_text=True)
+                texts[reference.document_id] = document["text"] if document else None
+            return texts[reference.document_id] is not None
+
+        heads = {
+            canonical_id: next((reference for reference in references if readable(reference)), None)
+            for canonical_id, references in by_canonical.items()
+        }
+        promoted = defaultdict(list)
+        for head in heads.values():
+            if head is not None:
+                promoted[head.document_id].append(head)
+
+        # Store first: until the references change, a retry finds the same work.
+        for document_id, references in promoted.items():
+            text = texts[document_id]
+            chunks = [Chunk(text[ref.start_offset:ref.end_offset], ref.start_offset, ref.end_offset) for ref in references]
+            client.store_chunks(chunks, document_id, user_id, ordinals=[ref.ordinal for ref in references])
+            signatures.add(
+                user_id,
+                document_id,
+                [(ref.chunk_id, minhash(chunk.text)) for ref, chunk in zip(references, chunks)],
+            )
+
+        for canonical_id, references in by_canonical.items():
+            head = heads[canonical_id]
+            signatures.remove_references(user_id, references)
+            if head is not None:
+                signatures.add_references(user_id, [
+                    replace(other, canonical_id=head.chunk_id, canonical_document_id=head.document_id)
+                    for other in references if other != head
+                ])
+
+    rehomed = sum(len(references) for references in promoted.values())
+    if rehomed:
+        bump_corpus_generation(user_id)
+        logger.info(f"Stored {rehomed} chunks that referenced chunks of document {doc_id}")
+    return {"doc_id": doc_id, "rehomed_chunks": rehomed}
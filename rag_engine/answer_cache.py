@@ -0,0 +1,141 @@
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field, replace
+from typing import Optional, Sequence
+
+import numpy as np
+
+from .vectors import normalize
+
+env = os.environ
+
+# Cosine similarity above which a new question is answered from the cache.
+ANSWER_CACHE_THRESHOLD = float(env.get("RAG_ANSWER_CACHE_THRESHOLD", 0.95))
+# Answers kept per user (oldest replaced first); 0 disables the cache.
+ANSWER_CACHE_SIZE = int(env.get("RAG_ANSWER_CACHE_SIZE", 256))
+# Users with cached answers per worker (least recently used dropped first).
+ANSWER_CACHE_USERS = int(env.get("RAG_ANSWER_CACHE_USERS", 1024))
+# Rows a user's matrix starts with; it doubles as answers are added, up to ANSWER_CACHE_SIZE.
+INITIAL_ROWS = 8
+
+
+@dataclass
+class CachedAnswer:
+    """A generated answer with the retrieval it was based on."""
+    question: str
+    answer: str
+    chunk_ids: list[str] = field(default_factory=list)
+    sources: list[str] = field(default_factory=list)
+    similarity: float = 1.0  # of the question that hit it
+
+
+class _UserAnswers:
+    """
+    Unit-length query vectors of one user's answers, as the first `size` rows
+    of a matrix that grows on demand up to `capacity` rows, then is reused
+    as a ring.
+    """
+
+    def __init__(self, generation: int, dimension: int, capacity: int):
+        self.generation = generation
+        self.capacity = capacity
+        self.matrix = np.zeros((min(INITIAL_ROWS, capacity), dimension), dtype=np.float32)
+        self.entries: list[CachedAnswer] = []
+        self.next = 0  # oldest row, replaced next once full
+
+    @property
+    def size(self) -> int:
+        return len(self.entries)
+
+    def add(self, query: np.ndarray, entry: CachedAnswer) -> None:
+        if self.size < self.capacity:
+            if self.size == len(self.matrix):
+                rows = min(2 * len(self.matrix), self.capacity)
+                grown = np.zeros((rows, self.matrix.shape[1]), dtype=np.float32)
+                grown[:self.size] = self.matrix
+                self.matrix = grown
+            self.matrix[self.size] = query
+            self.entries.append(entry)
+            return
+        self.matrix[self.next] = query
+        self.entries[self.next] = entry
+        self.next = (self.next + 1) % self.capacity
+
+
+class SemanticAnswerCache:
+    """
+    Per-process cache of answers, looked up by query-embedding similarity.
+
+    Each user has a small matrix of normalized query vectors, so a lookup is
+    one matrix-vector product; only the max_users most recently active users
+    are kept. Entries are tagged with the user's corpus generation; when it
+    changes (a document was added, reprocessed or deleted) the user's entries
+    are dropped on the next access. Every worker keeps its own cache; the
+    generation lives in the shared Django cache (see rag_engine.checks), so
+    none serves stale answers.
+    """
+
+    def __init__(
+            self,
+            threshold: float = ANSWER_CACHE_THRESHOLD,
+            capacity: int = ANSWER_CACHE_SIZE,
+            max_users: int = ANSWER_CACHE_USERS,
+    ):
+        self.threshold = threshold
+        self.capacity = capacity
+        self.max_users = max_users
+        self._users: "OrderedDict[int, _UserAnswers]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _current(self, user_id: int, generation: int) -> Optional[_UserAnswers]:
+        answers = self._users.get(user_id)
+        if answers is None:
+            return None
+        if answers.generation != generation:
+            del self._users[user_id]
+            return None
+        self._users.move_to_end(user_id)
+        return answers
+
+    def lookup(self, user_id: int, vector: Sequence[float], generation: int) -> Optional[CachedAnswer]:
+        """
+        The cached answer whose question is most similar to the query vector,
+        if it reaches the threshold and was cached at this corpus generation.
+        """
+        if not self.capacity:
+            return None
+        query = normalize(np.asarray(vector, dtype=np.float32))
+        with self._lock:
+            answers = self._current(user_id, generation)
+            if answers is None or not answers.size or answers.matrix.shape[1] != len(query):
+                return None
+            scores = answers.matrix[:answers.size] @ query
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                return None
+            return replace(answers.entries[best], similarity=float(scores[best]))
+
+    def store(self, user_id: int, vector: Sequence[float], generation: int, entry: CachedAnswer) -> None:
+        """Cache an answer, replacing the user's oldest one when full."""
+        if not self.capacity:
+            return
+        query = normalize(np.asarray(vector, dtype=np.float32))
+        with self._lock:
+            answers = self._current(user_id, generation)
+            if answers is None or answers.matrix.shape[1] != len(query):
+                answers = self._users[user_id] = _UserAnswers(generation, len(query), self.capacity)
+                self._users.move_to_end(user_id)
+                while len(self._users) > self.max_users:
+                    self._users.popitem(last=False)
+            answers.add(query, entry)
+
+    def clear(self, user_id: Optional[int] = None) -> None:
+        with self._lock:
+            if user_id is None:
+                self._users.clear()
+            else:
+                self._users.pop(user_id, None)
+
+
+answer_cache = SemanticAnswerCache()
@@ -0,0 +1,157 @@
+import json
+
+from django.core import signing
+from django.http import StreamingHttpResponse
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.fields import BooleanField
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework.permissions import IsAuthenticated
+from .cache import document_scope, query_key
+from .deadline import SEARCH_DEADLINE, Deadline, DeadlineExceeded, deadline_scope
+from .search import SearchRag
+from .timings import collect, wants_timings
+
+SEARCH_STRATEGIES = ("semantic", "keyword", "hybrid")
+MAX_BATCH_QUERIES = 32
+MAX_PAGE_SIZE = 100
+MAX_STREAM_RESULTS = 5000
+CURSOR_SALT = "rag_engine.search.cursor"
+
+
+def encode_cursor(query, user_id, strategy, offset, document_ids=None):
+    """Opaque, signed pagination token bound to the query, user, strategy and document filter."""
+    return signing.dumps(
+        {"q": query_key(query), "u": user_id, "s": strategy, "d": document_scope(document_ids), "o": offset},
+        salt=CURSOR_SALT,
+    )
+
+
+def decode_cursor(cursor, query, user_id, strategy, document_ids=None):
+    """Return the offset stored in a cursor, or raise BadSignature if it does not match this search."""
+    data = signing.loads(cursor, salt=CURSOR_SALT)
+    if (
+            data.get("q") != query_key(query)
+            or data.get("u") != user_id
+            or data.get("s") != strategy
+            or data.get("d") != document_scope(document_ids)
+    ):
+        raise signing.BadSignature("Cursor does not belong to this search.")
+    return int(data["o"])
+
+
+class SearchView(APIView):
+    """
+    Paginated search.
+
+    Each response carries a `next_cursor`; pass it back with the same query
+    and strategy to get the following page. Deeper pages reuse the cached
+    query embedding and never re-send earlier results. With "stream": true
+    the results are streamed as NDJSON, one result per line, followed by a
+    final {"next_cursor": ...} line. With ?debug=timings a (non-streamed)
+    response includes per-stage timings in milliseconds.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        query = request.data.get("query")
+        if not isinstance(query, str) or not query:
+            return Response({"detail": "Missing 'query'."}, status=status.HTTP_400_BAD_REQUEST)
+        strategy = request.data.get("strategy", "semantic")
+        if strategy not in SEARCH_STRATEGIES:
+            return Response({"detail": f"Unknown search strategy: {strategy}"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            # Form posts send "false" and "0" as strings, which bool() would take as true.
+            stream = BooleanField().to_internal_value(request.data.get("stream", False))
+        except ValidationError:
+            return Response({"detail": "'stream' must be a boolean."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = int(request.data.get("limit", MAX_STREAM_RESULTS if stream else 10))
+        except (TypeError, ValueError):
+            return Response({"detail": "'limit' must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+        limit = max(1, min(limit, MAX_STREAM_RESULTS if stream else MAX_PAGE_SIZE))
+
+        document_ids = request.data.get("document_ids")
+        offset = 0
+        cursor = request.data.get("cursor")
+        if cursor:
+            try:
+                offset = decode_cursor(cursor, query, request.user.id, strategy, document_ids)
+            except (signing.BadSignature, KeyError, TypeError, ValueError):
+                return Response({"detail": "Invalid cursor."}, status=status.HTTP_400_BAD_REQUEST)
+
+        options = {"document_ids": document_ids}
+        if stream:
+            return StreamingHttpResponse(
+                self._stream(query, request.user.id, strategy, limit, offset, options),
+                content_type="application/x-ndjson",
+            )
+
+        try:
+            with collect(enabled=wants_timings(request)) as timings:
+                with deadline_scope(Deadline.after(SEARCH_DEADLINE)), SearchRag() as search:
+                    results = search.search(query, request.user.id, limit, strategy, offset=offset, **options)
+        except DeadlineExceeded:
+            return Response({"detail": "Search timed out."}, status=status.HTTP_504_GATEWAY_TIMEOUT)
+        next_cursor = (
+            encode_cursor(query, request.user.id, strategy, offset + len(results), document_ids)
+            if len(results) == limit else None
+        )
+        response = {"results": results, "next_cursor": next_cursor}
+        if timings is not None:
+            response["timings"] = timings
+        return Response(response)
+
+    @staticmethod
+    def _stream(query, user_id, strategy, limit, offset, options):
+        sent = 0
+        with SearchRag() as search:
+            for result in search.iter_results(
+                    query, user_id, strategy, page_size=MAX_PAGE_SIZE, max_results=limit, offset=offset, **options
+            ):
+                sent += 1
+                yield json.dumps(result) + "\n"
+        next_cursor = (
+            encode_cursor(query, user_id, strategy, offset + sent, options["document_ids"]) if sent == limit else None
+        )
+        yield json.dumps({"next_cursor": next_cursor}) + "\n"
+
+
+class BatchSearchView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        queries = request.data.get("queries")
+        if not isinstance(queries, list) or not queries or not all(isinstance(q, str) and q for q in queries):
+            return Response({"detail": "'queries' must be a non-empty list of strings."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(queries) > MAX_BATCH_QUERIES:
+            return Response(
+                {"detail": f"At most {MAX_BATCH_QUERIES} queries per request."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        strategy = request.data.get("strategy", "semantic")
+        if strategy not in SEARCH_STRATEGIES:
+            return Response({"detail": f"Unknown search strategy: {strategy}"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = int(request.data.get("limit", 5))
+        except (TypeError, ValueError):
+            return Response({"detail": "'limit' must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+        try:
+            with deadline_scope(Deadline.after(SEARCH_DEADLINE)), SearchRag() as search:
+                results = search.search_many(
+                    queries,
+                    user_id=request.user.id,
+                    limit=limit,
+                    strategy=strategy,
+                    document_ids=request.data.get("document_ids"),
+                )
+        except DeadlineExceeded:
+            return Response({"detail": "Search timed out."}, status=status.HTTP_504_GATEWAY_TIMEOUT)
+
+        return Response({
+            "strategy": strategy,
+            "results": [{"query": query, "results": found} for query, found in zip(queries, results)],
+        })
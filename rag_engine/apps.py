@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class RagEngineConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'rag_engine'
+
+    def ready(self):
+        from . import checks  # noqa: F401
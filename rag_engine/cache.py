@@ -0,0 +1,86 @@
+import hashlib
+import os
+from typing import Iterable, Optional
+
+from django.core.cache import cache
+
+from .embeddings import OLLAMA_EMBED_MODEL, aembed, embed
+
+QUERY_VECTOR_TTL = int(os.environ.get("RAG_QUERY_VECTOR_TTL", 600))
+# Seconds a fused hybrid ranking is kept for paging through it.
+HYBRID_RANKING_TTL = int(os.environ.get("RAG_HYBRID_RANKING_TTL", 600))
+
+
+def _generation_key(user_id: int) -> str:
+    return f"rag:corpus_generation:{user_id}"
+
+
+def corpus_generation(user_id: int) -> int:
+    """
+    Version number of a user's indexed corpus.
+
+    Caches built from a user's documents store the generation they were
+    computed at and are treated as stale once it changes.
+    """
+    return cache.get(_generation_key(user_id), 0)
+
+
+async def acorpus_generation(user_id: int) -> int:
+    """Async corpus_generation()."""
+    return await cache.aget(_generation_key(user_id), 0)
+
+
+def bump_corpus_generation(user_id: int) -> int:
+    """
+    Invalidate every cache derived from a user's corpus.
+
+    Bumps made by Celery workers reach the web processes only through a
+    shared default cache (see rag_engine.checks).
+    """
+    key = _generation_key(user_id)
+    cache.add(key, 0, timeout=None)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # The key was evicted between add() and incr().
+        cache.set(key, 1, timeout=None)
+        return 1
+
+
+def query_key(query: str) -> str:
+    """Stable key of a query string under the current embedding model."""
+    return hashlib.sha256(f"{OLLAMA_EMBED_MODEL}\0{query}".encode("utf-8")).hexdigest()
+
+
+def document_scope(document_ids: Optional[Iterable[str]]) -> str:
+    """Stable key of a document_ids filter; empty when the search is not restricted."""
+    if not document_ids:
+        return ""
+    return hashlib.sha256("\0".join(sorted(document_ids)).encode("utf-8")).hexdigest()
+
+
+def hybrid_ranking_key(query: str, user_id: int, generation: int, document_ids: Optional[Iterable[str]] = None) -> str:
+    return f"rag:hybrid_ranking:{user_id}:{generation}:{query_key(query)}:{document_scope(document_ids)}"
+
+
+def get_query_vector(query: str) -> list[float]:
+    """
+    Embedding of a search query, cached so that repeated queries and deeper
+    result pages skip the embedding call.
+    """
+    key = f"rag:query_vector:{query_key(query)}"
+    vector = cache.get(key)
+    if vector is None:
+        vector = embed(query)
+        cache.set(key, vector, timeout=QUERY_VECTOR_TTL)
+    return vector
+
+
+async def aget_query_vector(query: str) -> list[float]:
+    """Async get_query_vector()."""
+    key = f"rag:query_vector:{query_key(query)}"
+    vector = await cache.aget(key)
+    if vector is None:
+        vector = await aembed(query)
+        await cache.aset(key, vector, timeout=QUERY_VECTOR_TTL)
+    return vector
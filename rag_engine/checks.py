@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+# Backends whose entries live in one process only.
+PROCESS_LOCAL_CACHES = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Corpus generations (rag_engine.cache) and the caches keyed on them only
+    invalidate across the web and Celery processes if the default cache is
+    shared between them.
+    """
+    backend = settings.CACHES.get("default", {}).get("BACKEND", "")
+    if backend not in PROCESS_LOCAL_CACHES:
+        return []
+    return [
+        Warning(
+            f"The default cache ({backend}) is local to each process.",
+            hint=(
+                "Corpus generation bumps made by workers will not reach the web processes, so cached "
+                "query results and answers can outlive the documents they came from. Point CACHES at "
+                "Redis (REDIS_CACHE_URL)."
+            ),
+            id="rag_engine.W001",
+        )
+    ]
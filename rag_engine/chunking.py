@@ -0,0 +1,258 @@
+import os
+import re
+from bisect import bisect_left
+from collections import deque
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable, Iterable, Iterator, Literal, Optional
+
+env = os.environ
+
+DEFAULT_CHUNK_SIZE = int(env.get("RAG_CHUNK_SIZE", 800))
+DEFAULT_CHUNK_OVERLAP = int(env.get("RAG_CHUNK_OVERLAP", 150))
+DEFAULT_CHUNK_UNIT = env.get("RAG_CHUNK_UNIT", "chars")
+DEFAULT_SEPARATORS = ("\n\n", "\n", ". ", " ", "")
+TOKENIZER_ENCODING = env.get("RAG_TOKENIZER_ENCODING", "cl100k_base")
+
+_FALLBACK_TOKEN_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+
+@dataclass(frozen=True)
+class Chunk:
+    """A slice of a source text, with its character offsets in that text."""
+    text: str
+    start: int
+    end: int
+
+
+@lru_cache(maxsize=1)
+def _get_encoding():
+    """The shared tiktoken encoding, or None in an environment installed without tiktoken."""
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    return tiktoken.get_encoding(TOKENIZER_ENCODING)
+
+
+def get_tokenizer() -> Callable[[str], list]:
+    """
+    Return the cached encode function used for token-based sizing.
+
+    Uses tiktoken, a project dependency. Where it is missing (a partial
+    install) a regex word/punctuation tokenizer stands in; it approximates
+    BPE counts closely enough for chunk sizing and prompt budgeting.
+    """
+    encoding = _get_encoding()
+    return _FALLBACK_TOKEN_RE.findall if encoding is None else encoding.encode_ordinary
+
+
+def count_tokens(text: str) -> int:
+    return len(get_tokenizer()(text))
+
+
+def token_starts(text: str) -> list[int]:
+    """Character offset at which each token of `text` starts."""
+    encoding = _get_encoding()
+    if encoding is None:
+        return [match.start() for match in _FALLBACK_TOKEN_RE.finditer(text)]
+    _, offsets = encoding.decode_with_offsets(encoding.encode_ordinary(text))
+    return offsets
+
+
+class RecursiveChunker:
+    """
+    Recursive separator-based splitter producing chunks with offsets.
+
+    Character sizing cuts each chunk at the last highest-priority separator
+    inside its window with str.rfind, so the text is scanned a bounded number
+    of times and no intermediate pieces are built. Token sizing splits the
+    text into (start, end) spans level by level and merges them with a single
+    sliding window, counting tokens by bisecting the token offsets of a
+    single tokenizer pass. Both are linear in the text length.
+    """
+
+    def __init__(
+            self,
+            size: int = DEFAULT_CHUNK_SIZE,
+            overlap: int = DEFAULT_CHUNK_OVERLAP,
+            unit: Literal["chars", "tokens"] = "chars",
+            separators: tuple[str, ...] = DEFAULT_SEPARATORS,
+    ):
+        if size <= 0:
+            raise ValueError("Chunk size must be positive.")
+        if not 0 <= overlap < size:
+            raise ValueError("Chunk overlap must be in [0, size).")
+        if unit not in ("chars", "tokens"):
+            raise ValueError(f"Unknown chunk unit: {unit}")
+        self.size = size
+        self.overlap = overlap
+        self.unit = unit
+        self.separators = separators
+
+    def _split(
+            self,
+            text: str,
+            start: int,
+            end: int,
+            level: int,
+            measure: Callable[[int, int], int],
+            out: list,
+    ) -> None:
+        length = measure(start, end)
+        if length <= self.size:
+            out.append((start, end, length))
+            return
+
+        separator, depth = "", level
+        for depth in range(level, len(self.separators)):
+            separator = self.separators[depth]
+            if separator == "" or text.find(separator, start, end) != -1:
+                break
+
+        if separator == "":
+            # A token spans at least one character, so a window of `size`
+            # characters never exceeds `size` tokens either.
+            for offset in range(start, end, self.size):
+                piece_end = min(offset + self.size, end)
+                out.append((offset, piece_end, measure(offset, piece_end)))
+            return
+
+        position = start
+        while position < end:
+            index = text.find(separator, position, end)
+            piece_end = end if index == -1 else index + len(separator)
+            self._split(text, position, piece_end, depth + 1, measure, out)
+            position = piece_end
+
+    def _make_chunk(self, text: str, start: int, end: int) -> Optional[Chunk]:
+        raw = text[start:end]
+        stripped = raw.strip()
+        if not stripped:
+            return None
+        start += len(raw) - len(raw.lstrip())
+        return Chunk(text=stripped, start=start, end=start + len(stripped))
+
+    def _iter_char_chunks(self, text: str) -> Iterator[Chunk]:
+        length = len(text)
+        start = 0
+        floor = 0  # end of the previous chunk; the next one must reach past it
+        while start < length:
+            limit = start + self.size
+            end = min(limit, length)
+            if limit < length:
+                for separator in self.separators:
+                    if separator == "":
+                        break
+                    index = text.rfind(separator, max(start + 1, floor), limit)
+                    if index != -1:
+                        end = index + len(separator)
+                        break
+
+            chunk = self._make_chunk(text, start, end)
+            if chunk is not None:
+                yield chunk
+            if end >= length:
+                break
+
+            next_start = end
+            if self.overlap and chunk is not None:
+                # Measured back from the chunk's last character, whichever
+                # separator (and trailing whitespace) ended it.
+                lower = max(chunk.end - self.overlap, start + 1)
+                for separator in self.separators:
+                    if separator == "":
+                        break
+                    index = text.find(separator, lower, chunk.end)
+                    if index != -1 and index + len(separator) < chunk.end:
+                        next_start = index + len(separator)
+                        break
+            floor = end
+            start = next_start
+
+    def iter_chunks(self, text: str) -> Iterator[Chunk]:
+        """
+        Yield chunks of at most `size` units, consecutive chunks sharing up to
+        `overlap` units.
+
+        Args:
+            text: Source text
+
+        Returns:
+            Iterator of Chunk objects in document order
+        """
+        if self.unit == "chars":
+            yield from self._iter_char_chunks(text)
+            return
+
+        starts = token_starts(text)
+
+        def measure(start: int, end: int) -> int:
+            return bisect_left(starts, end) - bisect_left(starts, start)
+
+        spans: list[tuple[int, int, int]] = []
+        self._split(text, 0, len(text), 0, measure, spans)
+
+        window: deque[tuple[int, int, int]] = deque()
+        total = 0
+        for span in spans:
+            length = span[2]
+            if window and total + length > self.size:
+                chunk = self._make_chunk(text, window[0][0], window[-1][1])
+                if chunk is not None:
+                    yield chunk
+                while window and (total > self.overlap or total + length > self.size):
+                    total -= window.popleft()[2]
+            window.append(span)
+            total += length
+
+        if window:
+            chunk = self._make_chunk(text, window[0][0], window[-1][1])
+            if chunk is not None:
+                yield chunk
+
+    def split_text(self, text: str) -> list[str]:
+        return [chunk.text for chunk in self.iter_chunks(text)]
+
+
+@lru_cache(maxsize=32)
+def get_chunker(
+        size: int = DEFAULT_CHUNK_SIZE,
+        overlap: int = DEFAULT_CHUNK_OVERLAP,
+        unit: Literal["chars", "tokens"] = DEFAULT_CHUNK_UNIT,
+) -> RecursiveChunker:
+    """Return a shared chunker for the given configuration."""
+    return RecursiveChunker(size=size, overlap=overlap, unit=unit)
+
+
+def chunk_text(
+        text: str,
+        size: int = DEFAULT_CHUNK_SIZE,
+        overlap: int = DEFAULT_CHUNK_OVERLAP,
+        unit: Literal["chars", "tokens"] = DEFAULT_CHUNK_UNIT,
+) -> list[Chunk]:
+    return list(get_chunker(size, overlap, unit).iter_chunks(text))
+
+
+def merge_chunks(chunks: Iterable[Chunk]) -> list[Chunk]:
+    """
+    Stitch chunks of one source text into contiguous windows.
+
+    Overlapping or touching chunks are joined with the shared text kept once,
+    so each window reads exactly like the source span it covers.
+
+    Args:
+        chunks: Chunks of the same text, in any order
+
+    Returns:
+        Non-overlapping windows ordered by start offset
+    """
+    merged: list[Chunk] = []
+    for chunk in sorted(chunks, key=lambda c: (c.start, c.end)):
+        if merged and chunk.start <= merged[-1].end:
+            last = merged[-1]
+            if chunk.end > last.end:
+                merged[-1] = Chunk(last.text + chunk.text[last.end - chunk.start:], last.start, chunk.end)
+        else:
+            merged.append(chunk)
+    return merged
@@ -0,0 +1,118 @@
+"""
+Request deadlines carried through retrieval in a context variable.
+
+A view opens a scope with an absolute deadline; the embedding, vector-store
+and generation calls below it size their timeouts from the time left and
+skip work that can no longer finish. Context variables follow awaits,
+asyncio tasks and asyncio.to_thread, but not plain thread pools: compute
+timeout() before handing work to one.
+"""
+
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Awaitable, Iterator, Optional, TypeVar
+
+env = os.environ
+
+# Overall budget of a chat request (retrieval and generation) and of a search request, in seconds.
+CHAT_DEADLINE = float(env.get("RAG_CHAT_DEADLINE", 20))
+SEARCH_DEADLINE = float(env.get("RAG_SEARCH_DEADLINE", 10))
+
+T = TypeVar("T")
+
+
+class DeadlineExceeded(TimeoutError):
+    """The request's deadline passed before the work could finish."""
+
+
+@dataclass(frozen=True)
+class Deadline:
+    expires: float  # time.monotonic() value
+
+    @classmethod
+    def after(cls, seconds: float) -> "Deadline":
+        return cls(time.monotonic() + seconds)
+
+    def remaining(self) -> float:
+        return self.expires - time.monotonic()
+
+
+_current: ContextVar[Optional[Deadline]] = ContextVar("rag_deadline", default=None)
+
+
+def current() -> Optional[Deadline]:
+    return _current.get()
+
+
+@contextmanager
+def deadline_scope(deadline: Optional[Deadline]) -> Iterator[Optional[Deadline]]:
+    """Run the block under a deadline; an enclosing earlier deadline still applies."""
+    enclosing = _current.get()
+    if deadline is None or (enclosing is not None and enclosing.expires <= deadline.expires):
+        yield enclosing
+        return
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
+
+
+def check(stage: str = "request") -> None:
+    """Raise DeadlineExceeded if the current deadline has passed."""
+    deadline = _current.get()
+    if deadline is not None and deadline.remaining() <= 0:
+        raise DeadlineExceeded(f"Deadline exceeded before {stage}")
+
+
+def timeout(default: float, stage: str = "request") -> float:
+    """
+    Timeout for a call: default, shortened to the time left before the
+    current deadline. Raises DeadlineExceeded when none is left.
+    """
+    deadline = _current.get()
+    if deadline is None:
+        return default
+    remaining = deadline.remaining()
+    if remaining <= 0:
+        raise DeadlineExceeded(f"Deadline exceeded before {stage}")
+    return min(default, remaining)
+
+
+async def wait_for(awaitable: Awaitable[T], stage: str = "request") -> T:
+    """Await within the current deadline, cancelling the awaitable when it passes."""
+    deadline = _current.get()
+    if deadline is None:
+        return await awaitable
+    try:
+        return await asyncio.wait_for(awaitable, timeout(math.inf, stage))
+    except asyncio.TimeoutError as exc:
+        raise DeadlineExceeded(f"Deadline exceeded during {stage}") from exc
+
+
+class LatencyWindow:
+    """Latencies of the most recent calls, for percentile-based hedging."""
+
+    def __init__(self, size: int = 200, min_samples: int = 20):
+        self.samples: deque[float] = deque(maxlen=size)
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self.samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """The q-th percentile, or None until min_samples calls were observed."""
+        with self._lock:
+            if len(self.samples) < self.min_samples:
+                return None
+            ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, math.ceil(q / 100 * len(ordered)) - 1)]
@@ -0,0 +1,552 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+from abc import ABC, abstractmethod
+from dataclasses import asdict, astuple, dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterable, Optional, Sequence
+
+import numpy as np
+
+from .chunking import Chunk
+from .vector_store import chunk_uuid
+
+logger = logging.getLogger(__name__)
+
+env = os.environ
+
+# "off" (default), "redis" or "sqlite".
+DEDUP_INDEX_BACKEND = env.get("RAG_DEDUP_INDEX", "off")
+# Estimated Jaccard similarity of word shingles above which a chunk is a near-duplicate.
+DEDUP_THRESHOLD = float(env.get("RAG_DEDUP_THRESHOLD", 0.8))
+# Shorter chunks carry too few shingles for a reliable signature and are always kept.
+DEDUP_MIN_CHARS = int(env.get("RAG_DEDUP_MIN_CHARS", 80))
+# Seconds a Redis band bucket lives after its last write; 0 keeps buckets until their documents are forgotten.
+DEDUP_BUCKET_TTL = int(env.get("RAG_DEDUP_BUCKET_TTL", 0))
+SHINGLE_SIZE = 3
+NUM_PERMUTATIONS = 64
+# 16 bands of 4 rows: pairs above ~0.5 similarity almost always share a band,
+# pairs around 0.2 rarely do, so lookups stay small.
+NUM_BANDS = 16
+ROWS_PER_BAND = NUM_PERMUTATIONS // NUM_BANDS
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+_rng = np.random.default_rng(0x5D5)
+_MASKS = _rng.integers(0, 2 ** 63, size=NUM_PERMUTATIONS, dtype=np.uint64)
+_MULTIPLIERS = _rng.integers(0, 2 ** 63, size=NUM_PERMUTATIONS, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+
+
+def minhash(text: str) -> np.ndarray:
+    """
+    MinHash signature of a text's word 3-gram shingles.
+
+    Each of the NUM_PERMUTATIONS rows is the minimum of a multiply-shift
+    hash over the shingle hashes; the fraction of rows two signatures share
+    estimates the Jaccard similarity of their shingle sets.
+    """
+    tokens = _TOKEN_RE.findall(text.lower())
+    shingles = {" ".join(tokens[i:i + SHINGLE_SIZE]) for i in range(max(1, len(tokens) - SHINGLE_SIZE + 1))}
+    hashes = np.fromiter(
+        (
+            int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "little")
+            for shingle in shingles
+        ),
+        dtype=np.uint64,
+        count=len(shingles),
+    )
+    with np.errstate(over="ignore"):
+        permuted = ((hashes[:, None] ^ _MASKS) * _MULTIPLIERS) >> np.uint64(32)
+    return permuted.min(axis=0).astype(np.uint32)
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Estimated Jaccard similarity of two MinHash signatures."""
+    return float(np.count_nonzero(a == b)) / len(a)
+
+
+def band_keys(signature: np.ndarray) -> list[int]:
+    """One signed 64-bit key per band of ROWS_PER_BAND signature rows."""
+    return [
+        int.from_bytes(
+            hashlib.blake2b(signature[i:i + ROWS_PER_BAND].tobytes(), digest_size=8).digest(), "little", signed=True
+        )
+        for i in range(0, NUM_PERMUTATIONS, ROWS_PER_BAND)
+    ]
+
+
+@dataclass(frozen=True)
+class ChunkReference:
+    """A chunk that was not stored because it near-duplicates `canonical_id`."""
+    document_id: str
+    ordinal: int
+    start_offset: Optional[int]
+    end_offset: Optional[int]
+    canonical_id: str
+    canonical_document_id: str
+
+    @property
+    def chunk_id(self) -> str:
+        """Id the chunk has once it is stored."""
+        return chunk_uuid(self.document_id, self.ordinal)
+
+
+class SignatureIndex(ABC):
+    """Per-user index of chunk MinHash signatures, bucketed by LSH band for near-duplicate lookup."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+    def close(self) -> None:
+        pass
+
+    @abstractmethod
+    def candidates(self, user_id: int, signatures: Sequence[np.ndarray]) -> list[dict[str, np.ndarray]]:
+        """For each signature, the {chunk_id: signature} entries sharing at least one band with it."""
+
+    @abstractmethod
+    def add(self, user_id: int, doc_id: str, entries: Sequence[tuple[str, np.ndarray]]) -> None:
+        """Index (chunk_id, signature) pairs of a document's stored chunks."""
+
+    @abstractmethod
+    def forget_document(self, user_id: int, doc_id: str) -> None:
+        """
+        Drop every signature and reference of a document, e.g. before it is
+        re-ingested or after it is deleted. References of other documents to
+        its chunks are kept for rehoming.
+        """
+
+    @abstractmethod
+    def chunk_documents(self, user_id: int, chunk_ids: Sequence[str]) -> dict[str, str]:
+        """Document id of each indexed chunk; chunks the index does not know are left out."""
+
+    @abstractmethod
+    def add_references(self, user_id: int, references: Sequence[ChunkReference]) -> None:
+        """Record chunks skipped as near-duplicates."""
+
+    @abstractmethod
+    def references(self, user_id: int, document_ids: Sequence[str]) -> list[ChunkReference]:
+        """References held by the given documents."""
+
+    @abstractmethod
+    def references_to(self, user_id: int, doc_id: str) -> list[ChunkReference]:
+        """References whose canonical chunk belongs to doc_id."""
+
+    @abstractmethod
+    def remove_references(self, user_id: int, references: Sequence[ChunkReference]) -> None:
+        ...
+
+    def resolve_duplicates(
+            self,
+            user_id: int,
+            doc_id: str,
+            chunks: Sequence[Chunk],
+            ordinals: Sequence[int],
+            matches: Sequence[Optional[str]],
+    ) -> list[Optional[ChunkReference]]:
+        """
+        Reference rows for a batch's find_duplicates() matches, None for the
+        chunks to store. A match whose document the index does not know
+        (signatures indexed before references existed) is stored after all.
+        """
+        documents = self.chunk_documents(user_id, [match for match in matches if match and not match.startswith("batch:")])
+        references = []
+        for chunk, ordinal, match in zip(chunks, ordinals, matches):
+            if match is None:
+                references.append(None)
+                continue
+            if match.startswith("batch:"):
+                canonical_id, canonical_document_id = chunk_uuid(doc_id, ordinals[int(match[6:])]), doc_id
+            else:
+                canonical_id, canonical_document_id = match, documents.get(match)
+            references.append(
+                ChunkReference(doc_id, ordinal, chunk.start, chunk.end, canonical_id, canonical_document_id)
+                if canonical_document_id is not None else None
+            )
+        return references
+
+    def find_duplicates(self, user_id: int, texts: Sequence[str]) -> tuple[list[np.ndarray], list[Optional[str]]]:
+        """
+        Signatures of a batch of texts and, for each, the id of an indexed
+        near-duplicate chunk (or None).
+
+        Texts earlier in the same batch count as indexed; their position in
+        the batch is returned as "batch:<i>" in place of a chunk id.
+        """
+        signatures = [minhash(text) for text in texts]
+        found = self.candidates(user_id, signatures)
+        pending: list[tuple[int, np.ndarray]] = []
+        matches: list[Optional[str]] = []
+        for i, (text, signature) in enumerate(zip(texts, signatures)):
+            match = None
+            if len(text) >= DEDUP_MIN_CHARS:
+                match = next(
+                    (chunk_id for chunk_id, other in found[i].items() if similarity(signature, other) >= DEDUP_THRESHOLD),
+                    None,
+                ) or next(
+                    (f"batch:{j}" for j, other in pending if similarity(signature, other) >= DEDUP_THRESHOLD),
+                    None,
+                )
+                if match is None:
+                    pending.append((i, signature))
+            matches.append(match)
+        return signatures, matches
+
+
+class RedisSignatureIndex(SignatureIndex):
+    """
+    Signatures in one hash per user (rag:minhash:<user> -> {chunk_id: bytes}),
+    band buckets as sets of chunk ids, and a per-document set of the bucket
+    entries it wrote so a document can be forgotten without a scan.
+    References are JSON in one hash per user, keyed "<document>\t<ordinal>"
+    and listed per referencing and per canonical document.
+
+    Buckets hold NUM_BANDS entries per indexed chunk and shrink when a
+    document is forgotten, so they grow with the corpus rather than without
+    bound. RAG_DEDUP_BUCKET_TTL caps them further: a bucket not written for
+    that long expires, and its chunks are no longer matched by new uploads
+    (references, which searches need, never expire).
+    """
+
+    def __init__(self, url: Optional[str] = None):
+        import redis
+
+        self.redis = redis.Redis.from_url(url or env.get("REDIS_URL", "redis://localhost:6379/0"))
+
+    def close(self) -> None:
+        self.redis.close()
+
+    @staticmethod
+    def _bucket(user_id: int, band: int, key: int) -> str:
+        return f"rag:minhash:{user_id}:{band}:{key}"
+
+    def candidates(self, user_id: int, signatures: Sequence[np.ndarray]) -> list[dict[str, np.ndarray]]:
+        pipe = self.redis.pipeline(transaction=False)
+        for signature in signatures:
+            for band, key in enumerate(band_keys(signature)):
+                pipe.smembers(self._bucket(user_id, band, key))
+        replies = iter(pipe.execute())
+        chunk_ids = [set().union(*(next(replies) for _ in range(NUM_BANDS))) for _ in signatures]
+
+        wanted = sorted(set().union(*chunk_ids)) if chunk_ids else []
+        stored = dict(zip(wanted, self.redis.hmget(f"rag:minhash:{user_id}", wanted))) if wanted else {}
+        return [
+            {
+                chunk_id.decode(): np.frombuffer(stored[chunk_id], dtype=np.uint32)
+                for chunk_id in ids if stored.get(chunk_id) is not None
+            }
+            for ids in chunk_ids
+        ]
+
+    def add(self, user_id: int, doc_id: str, entries: Sequence[tuple[str, np.ndarray]]) -> None:
+        if not entries:
+            return
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.hset(f"rag:minhash:{user_id}", mapping={chunk_id: signature.tobytes() for chunk_id, signature in entries})
+        pipe.hset(f"rag:minhash:chunk_docs:{user_id}", mapping={chunk_id: doc_id for chunk_id, _ in entries})
+        for chunk_id, signature in entries:
+            for band, key in enumerate(band_keys(signature)):
+                bucket = self._bucket(user_id, band, key)
+                pipe.sadd(bucket, chunk_id)
+                if DEDUP_BUCKET_TTL:
+                    pipe.expire(bucket, DEDUP_BUCKET_TTL)
+                pipe.sadd(f"rag:minhash:doc:{doc_id}", f"{bucket}\t{chunk_id}")
+        pipe.execute()
+
+    def forget_document(self, user_id: int, doc_id: str) -> None:
+        members = self.redis.smembers(f"rag:minhash:doc:{doc_id}")
+        pipe = self.redis.pipeline(transaction=False)
+        chunk_ids = set()
+        for member in members:
+            bucket, chunk_id = member.decode().split("\t")
+            pipe.srem(bucket, chunk_id)
+            chunk_ids.add(chunk_id)
+        if chunk_ids:
+            pipe.hdel(f"rag:minhash:{user_id}", *chunk_ids)
+            pipe.hdel(f"rag:minhash:chunk_docs:{user_id}", *chunk_ids)
+        pipe.delete(f"rag:minhash:doc:{doc_id}")
+        pipe.execute()
+        self.remove_references(user_id, self.references(user_id, [doc_id]))
+
+    def chunk_documents(self, user_id: int, chunk_ids: Sequence[str]) -> dict[str, str]:
+        if not chunk_ids:
+            return {}
+        documents = self.redis.hmget(f"rag:minhash:chunk_docs:{user_id}", list(chunk_ids))
+        return {chunk_id: doc_id.decode() for chunk_id, doc_id in zip(chunk_ids, documents) if doc_id is not None}
+
+    @staticmethod
+    def _reference_field(reference: ChunkReference) -> str:
+        return f"{reference.document_id}\t{reference.ordinal}"
+
+    def add_references(self, user_id: int, references: Sequence[ChunkReference]) -> None:
+        if not references:
+            return
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.hset(
+            f"rag:minhash:refs:{user_id}",
+            mapping={self._reference_field(reference): json.dumps(asdict(reference)) for reference in references},
+        )
+        for reference in references:
+            field = self._reference_field(reference)
+            pipe.sadd(f"rag:minhash:refs:doc:{reference.document_id}", field)
+            pipe.sadd(f"rag:minhash:refs:to:{reference.canonical_document_id}", field)
+        pipe.execute()
+
+    def _load_references(self, user_id: int, fields: Iterable[bytes]) -> list[ChunkReference]:
+        fields = sorted(set(fields))
+        if not fields:
+            return []
+        rows = self.redis.hmget(f"rag:minhash:refs:{user_id}", fields)
+        return [ChunkReference(**json.loads(row)) for row in rows if row is not None]
+
+    def references(self, user_id: int, document_ids: Sequence[str]) -> list[ChunkReference]:
+        pipe = self.redis.pipeline(transaction=False)
+        for doc_id in document_ids:
+            pipe.smembers(f"rag:minhash:refs:doc:{doc_id}")
+        return self._load_references(user_id, set().union(*pipe.execute()))
+
+    def references_to(self, user_id: int, doc_id: str) -> list[ChunkReference]:
+        references = self._load_references(user_id, self.redis.smembers(f"rag:minhash:refs:to:{doc_id}"))
+        return [reference for reference in references if reference.canonical_document_id == doc_id]
+
+    def remove_references(self, user_id: int, references: Sequence[ChunkReference]) -> None:
+        if not references:
+            return
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.hdel(f"rag:minhash:refs:{user_id}", *{self._reference_field(reference) for reference in references})
+        for reference in references:
+            field = self._reference_field(reference)
+            pipe.srem(f"rag:minhash:refs:doc:{reference.document_id}", field)
+            pipe.srem(f"rag:minhash:refs:to:{reference.canonical_document_id}", field)
+        pipe.execute()
+
+
+class SQLiteSignatureIndex(SignatureIndex):
+    """Signatures and band buckets in SQLite tables next to the local vector store."""
+
+    def __init__(self, path: Optional[str] = None):
+        directory = Path(path or env.get("RAG_LOCAL_STORE_PATH", "local_store"))
+        directory.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(directory / "signatures.sqlite3", check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS signatures (
+                chunk_id TEXT PRIMARY KEY,
+                user_id INTEGER NOT NULL,
+                document_id TEXT NOT NULL,
+                signature BLOB NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS signatures_document ON signatures(user_id, document_id);
+            CREATE TABLE IF NOT EXISTS buckets (
+                user_id INTEGER NOT NULL,
+                band INTEGER NOT NULL,
+                key INTEGER NOT NULL,
+                chunk_id TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS buckets_key ON buckets(user_id, band, key);
+            CREATE INDEX IF NOT EXISTS buckets_chunk ON buckets(chunk_id);
+            CREATE TABLE IF NOT EXISTS chunk_references (
+                user_id INTEGER NOT NULL,
+                document_id TEXT NOT NULL,
+                ordinal INTEGER NOT NULL,
+                start_offset INTEGER,
+                end_offset INTEGER,
+                canonical_id TEXT NOT NULL,
+                canonical_document_id TEXT NOT NULL,
+                PRIMARY KEY (document_id, ordinal)
+            );
+            CREATE INDEX IF NOT EXISTS chunk_references_canonical
+                ON chunk_references(user_id, canonical_document_id);
+            """
+        )
+
+    def close(self) -> None:
+        self.db.close()
+
+    def candidates(self, user_id: int, signatures: Sequence[np.ndarray]) -> list[dict[str, np.ndarray]]:
+        found = []
+        for signature in signatures:
+            keys = band_keys(signature)
+            clauses = " OR ".join("(b.band = ? AND b.key = ?)" for _ in keys)
+            rows = self.db.execute(
+                "SELECT DISTINCT s.chunk_id, s.signature FROM buckets b JOIN signatures s ON s.chunk_id = b.chunk_id "
+                f"WHERE b.user_id = ? AND ({clauses})",
+                (user_id, *(item for pair in enumerate(keys) for item in pair)),
+            )
+            found.append({chunk_id: np.frombuffer(blob, dtype=np.uint32) for chunk_id, blob in rows})
+        return found
+
+    def add(self, user_id: int, doc_id: str, entries: Sequence[tuple[str, np.ndarray]]) -> None:
+        self.db.execute("BEGIN")
+        try:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO signatures (chunk_id, user_id, document_id, signature) VALUES (?, ?, ?, ?)",
+                [(chunk_id, user_id, doc_id, signature.tobytes()) for chunk_id, signature in entries],
+            )
+            self.db.executemany(
+                "INSERT INTO buckets (user_id, band, key, chunk_id) VALUES (?, ?, ?, ?)",
+                [
+                    (user_id, band, key, chunk_id)
+                    for chunk_id, signature in entries
+                    for band, key in enumerate(band_keys(signature))
+                ],
+            )
+            self.db.execute("COMMIT")
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+
+    def forget_document(self, user_id: int, doc_id: str) -> None:
+        self.db.execute("BEGIN")
+        try:
+            self.db.execute(
+                "DELETE FROM buckets WHERE chunk_id IN "
+                "(SELECT chunk_id FROM signatures WHERE user_id = ? AND document_id = ?)",
+                (user_id, doc_id),
+            )
+            self.db.execute("DELETE FROM signatures WHERE user_id = ? AND document_id = ?", (user_id, doc_id))
+            self.db.execute("DELETE FROM chunk_references WHERE user_id = ? AND document_id = ?", (user_id, doc_id))
+            self.db.execute("COMMIT")
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+
+    def chunk_documents(self, user_id: int, chunk_ids: Sequence[str]) -> dict[str, str]:
+        if not chunk_ids:
+            return {}
+        rows = self.db.execute(
+            f"SELECT chunk_id, document_id FROM signatures "
+            f"WHERE user_id = ? AND chunk_id IN ({', '.join('?' for _ in chunk_ids)})",
+            (user_id, *chunk_ids),
+        )
+        return dict(rows.fetchall())
+
+    def add_references(self, user_id: int, references: Sequence[ChunkReference]) -> None:
+        self.db.executemany(
+            "INSERT OR REPLACE INTO chunk_references "
+            "(user_id, document_id, ordinal, start_offset, end_offset, canonical_id, canonical_document_id) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(user_id, *astuple(reference)) for reference in references],
+        )
+
+    def _select_references(self, where: str, params: tuple) -> list[ChunkReference]:
+        rows = self.db.execute(
+            "SELECT document_id, ordinal, start_offset, end_offset, canonical_id, canonical_document_id "
+            f"FROM chunk_references WHERE {where} ORDER BY document_id, ordinal",
+            params,
+        )
+        return [ChunkReference(*row) for row in rows]
+
+    def references(self, user_id: int, document_ids: Sequence[str]) -> list[ChunkReference]:
+        if not document_ids:
+            return []
+        return self._select_references(
+            f"user_id = ? AND document_id IN ({', '.join('?' for _ in document_ids)})", (user_id, *document_ids)
+        )
+
+    def references_to(self, user_id: int, doc_id: str) -> list[ChunkReference]:
+        return self._select_references("user_id = ? AND canonical_document_id = ?", (user_id, doc_id))
+
+    def remove_references(self, user_id: int, references: Sequence[ChunkReference]) -> None:
+        self.db.executemany(
+            "DELETE FROM chunk_references WHERE user_id = ? AND document_id = ? AND ordinal = ?",
+            [(user_id, reference.document_id, reference.ordinal) for reference in references],
+        )
+
+
+def get_signature_index(backend: Optional[str] = None) -> Optional[SignatureIndex]:
+    """Signature index selected by RAG_DEDUP_INDEX, or None when near-duplicate filtering is off."""
+    backend = backend or DEDUP_INDEX_BACKEND
+    if backend == "off":
+        return None
+    if backend == "redis":
+        return RedisSignatureIndex()
+    if backend == "sqlite":
+        return SQLiteSignatureIndex()
+    raise ValueError(f"Unknown dedup index backend: {backend}")
+
+
+class ReferenceScope:
+    """
+    A search's document filter, widened to the documents holding the
+    canonical copies of chunks its documents skipped as near-duplicates, and
+    the mapping of those canonical hits back to the skipped chunks.
+    """
+
+    def __init__(self, document_ids: Optional[Sequence[str]], references: Sequence[ChunkReference] = ()):
+        self.document_ids = document_ids
+        self.references: dict[str, ChunkReference] = {}
+        for reference in references:
+            if reference.canonical_document_id not in document_ids:
+                self.references.setdefault(reference.canonical_id, reference)
+        canonical_documents = {reference.canonical_document_id for reference in self.references.values()}
+        self.search_ids = [*document_ids, *sorted(canonical_documents)] if self.references else document_ids
+
+    @property
+    def widened(self) -> bool:
+        return bool(self.references)
+
+    def window(self, limit: int, offset: int) -> tuple[int, int]:
+        """
+        Store limit and offset to query for a page. resolve() drops hits from
+        canonical documents that no reference points at, so a widened search
+        ranks twice the results up to the page and slices after resolving.
+        """
+        return ((limit + offset) * 2, 0) if self.widened else (limit, offset)
+
+    def resolve(self, hits: list[dict], limit: int, offset: int) -> list[dict]:
+        """The page of hits within the filter, canonical chunks standing in for their references."""
+        if not self.widened:
+            return hits
+        wanted = set(self.document_ids)
+        resolved = []
+        for hit in hits:
+            if hit["document_id"] in wanted:
+                resolved.append(hit)
+            elif (reference := self.references.get(hit["_id"])) is not None:
+                resolved.append({
+                    **hit,
+                    "_id": reference.chunk_id,
+                    "document_id": reference.document_id,
+                    "ordinal": reference.ordinal,
+                    "start_offset": reference.start_offset,
+                    "end_offset": reference.end_offset,
+                })
+        return resolved[offset:offset + limit]
+
+
+@lru_cache(maxsize=1)
+def search_signature_index() -> Optional[SignatureIndex]:
+    """The signature index searches read references from, opened once per process and never closed."""
+    return get_signature_index()
+
+
+def reference_scope(user_id: int, document_ids: Optional[Sequence[str]]) -> ReferenceScope:
+    """
+    Scope of a search restricted to document_ids. Unrestricted searches, and
+    any search while the index is off or unreachable, are not widened.
+    """
+    index = search_signature_index() if document_ids else None
+    if index is None:
+        return ReferenceScope(document_ids)
+    try:
+        return ReferenceScope(list(document_ids), index.references(user_id, document_ids))
+    except Exception:
+        logger.warning(f"Could not load chunk references for user {user_id}", exc_info=True)
+        return ReferenceScope(document_ids)
+
+
+def forget_document_signatures(user_id: int, doc_id: str) -> None:
+    """Drop a deleted document's signatures so new uploads are not matched against chunks that are gone."""
+    index = get_signature_index()
+    if index is not None:
+        with index:
+            index.forget_document(user_id, doc_id)
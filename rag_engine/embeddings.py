@@ -1,22 +1,245 @@
+import asyncio
 import os
 import json
+import socket
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPConnection, HTTPException, HTTPSConnection
+from urllib.parse import urlsplit
 from urllib.request import Request, urlopen
 from urllib.error import URLError, HTTPError
 
+import httpx
+from prometheus_client import Counter
+
+from . import deadline
+from .deadline import LatencyWindow
+from .timings import stage
+
 OLLAMA_URL = os.environ.get("OLLAMA_URL", "http://localhost:11434")
 OLLAMA_EMBED_MODEL = os.environ.get("OLLAMA_EMBED_MODEL", "nomic-embed-text:latest")
+EMBED_TIMEOUT = float(os.environ.get("RAG_EMBED_TIMEOUT", 30))
+# Send a second, identical query-embedding request once the first has taken
+# longer than this percentile of recent ones; the first answer wins.
+EMBED_HEDGE = os.environ.get("RAG_EMBED_HEDGE", "off") == "on"
+EMBED_HEDGE_PERCENTILE = float(os.environ.get("RAG_EMBED_HEDGE_PERCENTILE", 95))
+
+# One pooled async HTTP client per event loop (a single one per ASGI worker).
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+_hedge_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="embed-hedge")
+embed_latency = LatencyWindow()
+embed_hedges = Counter(
+    "rag_embed_hedges_total",
+    "Hedged query-embedding requests, by which request answered first.",
+    ["winner"],
+)
+
+
+def _hedge_delay():
+    return embed_latency.percentile(EMBED_HEDGE_PERCENTILE) if EMBED_HEDGE else None
+
+
+class _EmbeddingRequest:
+    """
+    One query-embedding request to Ollama, which another thread may abort:
+    closing its socket unblocks the thread waiting on the answer. Requests
+    that time out or are aborted still record their latency, as they tell
+    how slow the slow ones are.
+    """
+
+    def __init__(self, text, timeout):
+        url = urlsplit(OLLAMA_URL)
+        connection_class = HTTPSConnection if url.scheme == "https" else HTTPConnection
+        self.connection = connection_class(url.netloc, timeout=timeout)
+        self.path = f"{url.path.rstrip('/')}/api/embeddings"
+        self.body = json.dumps({"model": OLLAMA_EMBED_MODEL, "prompt": text}).encode("utf-8")
+        self.sent = False
+        self.aborted = False
+        self._lock = threading.Lock()
+
+    def send(self):
+        started = time.monotonic()
+        try:
+            with self._lock:
+                if self.aborted:
+                    raise ConnectionAbortedError("Embedding request aborted.")
+                self.connection.connect()
+                self.sent = True
+            self.connection.request("POST", self.path, body=self.body, headers={"Content-Type": "application/json"})
+            response = self.connection.getresponse()
+            if response.status >= 400:
+                raise HTTPException(f"Ollama answered {response.status}")
+            data = json.loads(response.read().decode("utf-8"))
+        except (OSError, HTTPException, ValueError) as exc:
+            if isinstance(exc, TimeoutError) or self.aborted and self.sent:
+                embed_latency.observe(time.monotonic() - started)
+            raise RuntimeError("Failed to fetch embeddings from Ollama.") from exc
+        finally:
+            self.connection.close()
+        embed_latency.observe(time.monotonic() - started)
+        return data["embedding"]
+
+    def abort(self):
+        with self._lock:
+            self.aborted = True
+            sock = self.connection.sock
+            if sock is not None:
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+
+def _post_embedding(text, timeout):
+    return _EmbeddingRequest(text, timeout).send()
+
 
 def embed(text):
-    payload = json.dumps({"model": OLLAMA_EMBED_MODEL, "prompt": text}).encode("utf-8")
+    """
+    Embedding of a text. The request timeout is cut to the current deadline;
+    with RAG_EMBED_HEDGE=on a slow request is hedged with a second one.
+    """
+    timeout = deadline.timeout(EMBED_TIMEOUT, "embedding")
+    try:
+        with stage("embed"):
+            return _hedged_embed(text, timeout)
+    except RuntimeError:
+        deadline.check("embedding")
+        raise
+
+
+def _hedged_embed(text, timeout):
+    """
+    The primary request runs on the calling thread; a pool thread sends the
+    hedge once the primary has taken `delay`. Whichever answers first aborts
+    the other.
+    """
+    delay = _hedge_delay()
+    if delay is None or delay >= timeout:
+        return _post_embedding(text, timeout)
+
+    primary = _EmbeddingRequest(text, timeout)
+    hedge = _EmbeddingRequest(text, timeout - delay)
+    finished = threading.Event()
+
+    def send_hedge():
+        if finished.wait(delay):
+            return None
+        embedding = hedge.send()
+        primary.abort()
+        return embedding
+
+    hedged = _hedge_pool.submit(send_hedge)
+    try:
+        embedding = primary.send()
+    except RuntimeError:
+        # Aborted because the hedge answered, or failed: the hedge may still answer.
+        finished.set()
+        try:
+            embedding = hedged.result()
+        except RuntimeError:
+            embedding = None
+        if embedding is None:
+            raise
+        embed_hedges.labels(winner="hedge").inc()
+        return embedding
+    finished.set()
+    hedge.abort()
+    if hedge.sent:
+        embed_hedges.labels(winner="first").inc()
+    return embedding
+
+
+def embed_many(texts):
+    """Embed several texts with a single request to Ollama's batch endpoint."""
+    if not texts:
+        return []
+    payload = json.dumps({"model": OLLAMA_EMBED_MODEL, "input": list(texts)}).encode("utf-8")
     request = Request(
-        f"{OLLAMA_URL}/api/embeddings",
+        f"{OLLAMA_URL}/api/embed",
         data=payload,
         headers={"Content-Type": "application/json"},
         method="POST",
     )
     try:
-        with urlopen(request, timeout=30) as response:
+        with stage("embed_batch"), urlopen(request, timeout=deadline.timeout(EMBED_TIMEOUT, "embedding")) as response:
             data = json.loads(response.read().decode("utf-8"))
-    except (HTTPError, URLError) as exc:
+    except (HTTPError, URLError, TimeoutError) as exc:
+        raise RuntimeError("Failed to fetch embeddings from Ollama.") from exc
+    return data["embeddings"]
+
+
+def _async_client() -> httpx.AsyncClient:
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = httpx.AsyncClient(base_url=OLLAMA_URL, timeout=EMBED_TIMEOUT)
+    return client
+
+
+async def _apost(path, payload):
+    timeout = deadline.timeout(EMBED_TIMEOUT, "embedding")
+    try:
+        response = await _async_client().post(path, json=payload, timeout=timeout)
+        response.raise_for_status()
+    except httpx.HTTPError as exc:
+        deadline.check("embedding")
         raise RuntimeError("Failed to fetch embeddings from Ollama.") from exc
+    return response.json()
+
+
+async def _aembed_once(payload):
+    started = time.monotonic()
+    try:
+        data = await _apost("/api/embeddings", payload)
+    except asyncio.CancelledError:
+        # A hedged-away or timed-out request still tells how slow the slow ones are.
+        embed_latency.observe(time.monotonic() - started)
+        raise
+    except RuntimeError as exc:
+        if isinstance(exc.__cause__, httpx.TimeoutException):
+            embed_latency.observe(time.monotonic() - started)
+        raise
+    embed_latency.observe(time.monotonic() - started)
     return data["embedding"]
+
+
+async def aembed(text):
+    """Async embed(): awaits Ollama instead of blocking the calling thread."""
+    with stage("embed"):
+        return await _ahedged_embed({"model": OLLAMA_EMBED_MODEL, "prompt": text})
+
+
+async def _ahedged_embed(payload):
+    delay = _hedge_delay()
+    if delay is None or delay >= deadline.timeout(EMBED_TIMEOUT, "embedding"):
+        return await _aembed_once(payload)
+
+    primary = asyncio.ensure_future(_aembed_once(payload))
+    done, _ = await asyncio.wait({primary}, timeout=delay)
+    if done:
+        return primary.result()
+    hedge = asyncio.ensure_future(_aembed_once(payload))
+    pending = {primary, hedge}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    embed_hedges.labels(winner="hedge" if task is hedge else "first").inc()
+                    return task.result()
+        return primary.result()
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def aembed_many(texts):
+    """Async embed_many()."""
+    if not texts:
+        return []
+    with stage("embed_batch"):
+        data = await _apost("/api/embed", {"model": OLLAMA_EMBED_MODEL, "input": list(texts)})
+    return data["embeddings"]
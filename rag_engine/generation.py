@@ -0,0 +1,92 @@
+import asyncio
+import os
+import weakref
+from functools import lru_cache
+from typing import AsyncIterator, Optional
+
+from openai import APITimeoutError, AsyncOpenAI, OpenAI
+
+from . import deadline
+from .timings import stage
+
+env = os.environ
+
+# Any OpenAI-compatible endpoint (OpenAI, vLLM, Ollama's /v1, ...).
+OPENAI_BASE_URL = env.get("OPENAI_BASE_URL") or "https://api.openai.com/v1"
+OPENAI_MODEL = env.get("OPENAI_MODEL", "gpt-4o-mini")
+GENERATION_MAX_TOKENS = int(env.get("RAG_GENERATION_MAX_TOKENS", 512))
+GENERATION_TIMEOUT = float(env.get("RAG_GENERATION_TIMEOUT", 60))
+
+# One async client per event loop (a single one per ASGI worker); its connection pool belongs to that loop.
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncOpenAI]" = weakref.WeakKeyDictionary()
+
+
+@lru_cache(maxsize=1)
+def get_client() -> OpenAI:
+    return OpenAI(base_url=OPENAI_BASE_URL, timeout=GENERATION_TIMEOUT)
+
+
+def get_async_client() -> AsyncOpenAI:
+    """The running event loop's async client."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = AsyncOpenAI(base_url=OPENAI_BASE_URL, timeout=GENERATION_TIMEOUT)
+    return client
+
+
+def _messages(prompt: str) -> list[dict]:
+    return [{"role": "user", "content": prompt}]
+
+
+def generate(prompt: str) -> str:
+    """Complete a prompt and return the whole answer, within the current deadline."""
+    try:
+        with stage("generation"):
+            response = get_client().chat.completions.create(
+                model=OPENAI_MODEL,
+                messages=_messages(prompt),
+                max_tokens=GENERATION_MAX_TOKENS,
+                timeout=deadline.timeout(GENERATION_TIMEOUT, "generation"),
+            )
+    except APITimeoutError:
+        deadline.check("generation")
+        raise
+    return response.choices[0].message.content or ""
+
+
+async def agenerate(prompt: str) -> str:
+    """Async generate."""
+    try:
+        with stage("generation"):
+            response = await get_async_client().chat.completions.create(
+                model=OPENAI_MODEL,
+                messages=_messages(prompt),
+                max_tokens=GENERATION_MAX_TOKENS,
+                timeout=deadline.timeout(GENERATION_TIMEOUT, "generation"),
+            )
+    except APITimeoutError:
+        deadline.check("generation")
+        raise
+    return response.choices[0].message.content or ""
+
+
+async def stream_generate(prompt: str, timeout: Optional[float] = None) -> AsyncIterator[str]:
+    """
+    Complete a prompt, yielding answer text as the model produces it.
+
+    Args:
+        prompt: Prompt text
+        timeout: Longest wait for the response to start and between chunks;
+            defaults to RAG_GENERATION_TIMEOUT
+    """
+    stream = await get_async_client().chat.completions.create(
+        model=OPENAI_MODEL,
+        messages=_messages(prompt),
+        max_tokens=GENERATION_MAX_TOKENS,
+        stream=True,
+        timeout=timeout or GENERATION_TIMEOUT,
+    )
+    async for event in stream:
+        if event.choices and event.choices[0].delta.content:
+            yield event.choices[0].delta.content
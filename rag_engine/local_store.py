@@ -0,0 +1,355 @@
+import os
+import re
+import sqlite3
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, Sequence, Union
+
+import numpy as np
+
+from .chunking import Chunk
+from .embeddings import embed_many
+from .storage import STORE_DOCUMENT_TEXT, read_document_text
+from .vector_store import VectorStore, chunk_records
+from .vectors import normalize, top_k_indices
+
+env = os.environ
+
+_FTS_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS documents (
+    id TEXT PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    filename TEXT,
+    bucket TEXT,
+    processed INTEGER NOT NULL DEFAULT 0,
+    text TEXT,
+    storage_path TEXT,
+    created_at TEXT,
+    vector BLOB
+);
+CREATE INDEX IF NOT EXISTS documents_user ON documents(user_id);
+CREATE TABLE IF NOT EXISTS chunks (
+    row INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    document_id TEXT NOT NULL,
+    user_id INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    ordinal INTEGER,
+    start_offset INTEGER,
+    end_offset INTEGER
+);
+CREATE INDEX IF NOT EXISTS chunks_user_document ON chunks(user_id, document_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(text, content='chunks', content_rowid='row');
+CREATE TRIGGER IF NOT EXISTS chunks_ai AFTER INSERT ON chunks BEGIN
+    INSERT INTO chunks_fts(rowid, text) VALUES (new.row, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS chunks_ad AFTER DELETE ON chunks BEGIN
+    INSERT INTO chunks_fts(chunks_fts, rowid, text) VALUES ('delete', old.row, old.text);
+END;
+"""
+POSITION_COLUMNS = ("ordinal", "start_offset", "end_offset")
+CHUNK_COLUMNS = "c.row, c.id, c.document_id, c.user_id, c.text, c.ordinal, c.start_offset, c.end_offset"
+
+
+def _fts_query(query: str) -> str:
+    # OR of quoted terms, like Weaviate's default BM25 operator; quoting keeps
+    # user input from being parsed as FTS5 syntax.
+    return " OR ".join(f'"{token}"' for token in _FTS_TOKEN_RE.findall(query))
+
+
+class LocalVectorStore(VectorStore):
+    """
+    Embedded single-node backend: SQLite FTS5 for keyword search and a
+    memory-mapped float32 vector file for semantic search.
+
+    Chunk vectors are stored normalized, one row per chunk, at the row number
+    recorded in the chunks table. Appends happen inside SQLite's write
+    transaction, which serializes writers across processes. The committed
+    row count is kept in the meta table: a writer first truncates the file
+    to it, dropping whatever a failed or interrupted append left behind, so
+    new rows always land at the offsets it records. Rows of deleted chunks
+    are left in the file as unused space.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = Path(path or env.get("RAG_LOCAL_STORE_PATH", "local_store"))
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.vectors_path = self.path / "vectors.f32"
+        self.db = sqlite3.connect(self.path / "index.sqlite3", check_same_thread=False, isolation_level=None)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SCHEMA)
+        self._migrate()
+        self._matrix = None
+
+    def _migrate(self) -> None:
+        """Add the chunk position columns to a store created before they existed."""
+        columns = {row["name"] for row in self.db.execute("PRAGMA table_info(chunks)")}
+        for column in POSITION_COLUMNS:
+            if column not in columns:
+                self.db.execute(f"ALTER TABLE chunks ADD COLUMN {column} INTEGER")
+        self.db.execute("CREATE INDEX IF NOT EXISTS chunks_document_ordinal ON chunks(document_id, ordinal)")
+        # Stores from before the row count was tracked: every row past the
+        # last referenced one is unused.
+        self.db.execute(
+            "INSERT OR IGNORE INTO meta (key, value) SELECT 'rows', COALESCE(MAX(row) + 1, 0) FROM chunks"
+        )
+
+    def close(self) -> None:
+        self._matrix = None
+        self.db.close()
+
+    def _dimension(self) -> Optional[int]:
+        row = self.db.execute("SELECT value FROM meta WHERE key = 'dimension'").fetchone()
+        return int(row["value"]) if row else None
+
+    def _rows(self) -> int:
+        """Number of vector rows committed to the file."""
+        return int(self.db.execute("SELECT value FROM meta WHERE key = 'rows'").fetchone()["value"])
+
+    def _vectors(self, rows_needed: int) -> np.ndarray:
+        """Memory map of the vector file, remapped when it has grown past the cached view."""
+        if self._matrix is None or len(self._matrix) < rows_needed:
+            dimension = self._dimension()
+            rows = self._rows()
+            self._matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(rows, dimension))
+        return self._matrix
+
+    def create_document(
+            self,
+            doc_id: str,
+            user_id: int,
+            filename: str,
+            bucket: str,
+            processed: bool,
+            text: str,
+            storage_path: str = "",
+    ) -> None:
+        self.db.execute(
+            "INSERT INTO documents (id, user_id, filename, bucket, processed, text, storage_path, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                doc_id, user_id, filename, bucket, int(processed),
+                text if STORE_DOCUMENT_TEXT else "", storage_path,
+                datetime.now(timezone.utc).isoformat(),
+            ),
+        )
+
+    def update_document(self, doc_id: str, data: dict, vector: Optional[list[float]] = None) -> None:
+        columns = {"filename", "bucket", "processed", "storage_path"} | ({"text"} if STORE_DOCUMENT_TEXT else set())
+        data = {key: value for key, value in data.items() if key in columns}
+        if vector is not None:
+            data["vector"] = np.asarray(vector, dtype=np.float32).tobytes()
+        if not data:
+            return
+        assignments = ", ".join(f"{key} = ?" for key in data)
+        self.db.execute(f"UPDATE documents SET {assignments} WHERE id = ?", (*data.values(), doc_id))
+
+    def get_document(self, doc_id: str, include_text: bool = False) -> Optional[dict]:
+        row = self.db.execute(
+            "SELECT id, user_id, filename, bucket, processed, text, storage_path, created_at "
+            "FROM documents WHERE id = ?",
+            (doc_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        document = {
+            "_id": row["id"],
+            "user_id": row["user_id"],
+            "filename": row["filename"],
+            "bucket": row["bucket"],
+            "processed": bool(row["processed"]),
+            "created_at": row["created_at"],
+            "storage_path": row["storage_path"],
+        }
+        if include_text:
+            document["text"] = row["text"] or read_document_text(row["bucket"], row["storage_path"])
+        return document
+
+    def store_chunks(
+            self,
+            chunks: Sequence[Union[str, Chunk]],
+            doc_id: str,
+            user_id: int,
+            start_index: int = 0,
+            ordinals: Optional[Sequence[int]] = None,
+    ) -> list[list[float]]:
+        records = chunk_records(chunks, doc_id, user_id, start_index, ordinals)
+        vectors = embed_many([record["text"] for record in records])
+        if not vectors:
+            return vectors
+        matrix = normalize(np.asarray(vectors, dtype=np.float32))
+
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            dimension = self._dimension()
+            if dimension is None:
+                dimension = matrix.shape[1]
+                self.db.execute("INSERT INTO meta (key, value) VALUES ('dimension', ?)", (str(dimension),))
+            elif dimension != matrix.shape[1]:
+                raise ValueError(f"Vector dimension {matrix.shape[1]} does not match the store's {dimension}.")
+
+            # Chunks re-stored by a retried ingestion get a fresh row.
+            self.db.executemany("DELETE FROM chunks WHERE id = ?", [(record["_id"],) for record in records])
+            first_row = self._rows()
+            with open(self.vectors_path, "ab") as handle:
+                handle.truncate(first_row * dimension * 4)
+                handle.write(matrix.tobytes())
+                handle.flush()
+                os.fsync(handle.fileno())
+            self.db.execute("UPDATE meta SET value = ? WHERE key = 'rows'", (str(first_row + len(records)),))
+            self.db.executemany(
+                "INSERT INTO chunks (row, id, document_id, user_id, text, ordinal, start_offset, end_offset) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        first_row + offset, record["_id"], doc_id, user_id, record["text"],
+                        record["ordinal"], record["start_offset"], record["end_offset"],
+                    )
+                    for offset, record in enumerate(records)
+                ],
+            )
+            self.db.execute("COMMIT")
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+        return vectors
+
+    def delete_chunks(self, doc_id: str) -> int:
+        return self.db.execute("DELETE FROM chunks WHERE document_id = ?", (doc_id,)).rowcount
+
+    def delete_document(self, doc_id: str) -> int:
+        deleted = self.delete_chunks(doc_id)
+        self.db.execute("DELETE FROM documents WHERE id = ?", (doc_id,))
+        return deleted
+
+    @staticmethod
+    def _to_result(row: sqlite3.Row, score: Optional[float] = None) -> dict:
+        return {
+            "_id": row["id"],
+            "text": row["text"],
+            "document_id": row["document_id"],
+            "user_id": row["user_id"],
+            "ordinal": row["ordinal"],
+            "start_offset": row["start_offset"],
+            "end_offset": row["end_offset"],
+            "score": score,
+        }
+
+    def iter_chunks(
+            self,
+            user_id: Optional[int] = None,
+            page_size: int = 500,
+            include_vector: bool = False,
+    ) -> Iterator[dict]:
+        where, params = ("WHERE c.user_id = ?", (user_id,)) if user_id is not None else ("", ())
+        cursor = self.db.execute(f"SELECT {CHUNK_COLUMNS} FROM chunks c {where} ORDER BY c.row", params)
+        while True:
+            rows = cursor.fetchmany(page_size)
+            if not rows:
+                return
+            matrix = self._vectors(rows[-1]["row"] + 1) if include_vector else None
+            for row in rows:
+                chunk = self._to_result(row)
+                del chunk["score"]
+                if include_vector:
+                    chunk["vector"] = matrix[row["row"]].tolist()
+                yield chunk
+
+    def fetch_chunks(self, user_id: int, ordinals: dict[str, Iterable[int]]) -> list[dict]:
+        clauses, params = [], [user_id]
+        for doc_id, wanted in ordinals.items():
+            wanted = list(wanted)
+            if wanted:
+                clauses.append(f"(c.document_id = ? AND c.ordinal IN ({', '.join('?' for _ in wanted)}))")
+                params += [doc_id, *wanted]
+        if not clauses:
+            return []
+        rows = self.db.execute(
+            f"SELECT {CHUNK_COLUMNS} FROM chunks c WHERE c.user_id = ? AND ({' OR '.join(clauses)})", params
+        )
+        return [self._to_result(row) for row in rows]
+
+    @staticmethod
+    def _chunk_where(user_id: int, document_ids: Optional[list[str]] = None) -> tuple[str, tuple]:
+        where, params = "c.user_id = ?", (user_id,)
+        if document_ids:
+            where += f" AND c.document_id IN ({', '.join('?' for _ in document_ids)})"
+            params += tuple(document_ids)
+        return where, params
+
+    def near_vector(
+            self,
+            vector: list[float],
+            user_id: int,
+            limit: int = 5,
+            document_ids: Optional[list[str]] = None,
+            offset: int = 0,
+    ) -> list[dict]:
+        where, params = self._chunk_where(user_id, document_ids)
+        rows = np.fromiter(
+            (row[0] for row in self.db.execute(f"SELECT c.row FROM chunks c WHERE {where}", params)),
+            dtype=np.int64,
+        )
+        if not len(rows):
+            return []
+        query = normalize(np.asarray(vector, dtype=np.float32))
+        scores = self._vectors(int(rows.max()) + 1)[rows] @ query
+        best = top_k_indices(scores, limit + offset)[offset:]
+        if not len(best):
+            return []
+
+        wanted = {int(rows[i]): float(scores[i]) for i in best}
+        details = {
+            row["row"]: row
+            for row in self.db.execute(
+                f"SELECT {CHUNK_COLUMNS} FROM chunks c WHERE c.row IN ({', '.join('?' for _ in wanted)})",
+                tuple(wanted),
+            )
+        }
+        return [self._to_result(details[row], 1.0 - similarity) for row, similarity in wanted.items() if row in details]
+
+    def near_vector_documents(
+            self,
+            vector: list[float],
+            user_id: int,
+            limit: int = 10,
+            document_ids: Optional[list[str]] = None,
+    ) -> list[dict]:
+        where, params = "user_id = ? AND vector IS NOT NULL", (user_id,)
+        if document_ids:
+            where += f" AND id IN ({', '.join('?' for _ in document_ids)})"
+            params += tuple(document_ids)
+        rows = self.db.execute(f"SELECT id, vector FROM documents WHERE {where}", params).fetchall()
+        if not rows:
+            return []
+        matrix = normalize(np.stack([np.frombuffer(row["vector"], dtype=np.float32) for row in rows]))
+        scores = matrix @ normalize(np.asarray(vector, dtype=np.float32))
+        return [
+            {"document_id": rows[i]["id"], "score": 1.0 - float(scores[i])}
+            for i in top_k_indices(scores, limit)
+        ]
+
+    def bm25(
+            self,
+            query: str,
+            user_id: int,
+            limit: int = 5,
+            document_ids: Optional[list[str]] = None,
+            offset: int = 0,
+    ) -> list[dict]:
+        match = _fts_query(query)
+        if not match:
+            return []
+        where, params = self._chunk_where(user_id, document_ids)
+        rows = self.db.execute(
+            f"SELECT {CHUNK_COLUMNS}, bm25(chunks_fts) AS rank "
+            "FROM chunks_fts JOIN chunks c ON c.row = chunks_fts.rowid "
+            f"WHERE chunks_fts MATCH ? AND {where} ORDER BY rank LIMIT ? OFFSET ?",
+            (match, *params, limit, offset),
+        )
+        # FTS5's bm25() is lower-is-better; negate it to match the other backends.
+        return [self._to_result(row, -row["rank"]) for row in rows]
@@ -0,0 +1,251 @@
+import json
+import re
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from weaviate.classes.data import DataObject
+from weaviate.collections.classes.filters import Filter
+
+from rag_engine.chunking import chunk_text
+from rag_engine.embeddings import embed_many
+from rag_engine.storage import read_document_text
+from rag_engine.vector_store import chunk_records
+from rag_engine.vectors import pool_vectors
+from rag_engine.weaviate_client import WeaviateClient, collection_name, versioned_name
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the live chunks and documents collections into new versioned "
+        "collections, optionally re-embedding or re-chunking, then switch the "
+        "WEAVIATE_INDEX / WEAVIATE_DOCUMENTS_INDEX aliases to them. Search keeps "
+        "serving from the current collections until the swap. Progress is "
+        "checkpointed, so an interrupted run continues with --resume. Documents "
+        "uploaded while the copy runs land in the old collections; re-run with "
+        "--resume before the swap (or pause ingestion) to pick them up."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--target-version", type=int, help="Target version number (default: current + 1)")
+        parser.add_argument("--reembed", action="store_true", help="Re-embed chunk texts with OLLAMA_EMBED_MODEL")
+        parser.add_argument(
+            "--rechunk",
+            action="store_true",
+            help="Rebuild chunks from stored documents with the current RAG_CHUNK_* settings (implies --reembed)",
+        )
+        parser.add_argument("--batch-size", type=int, default=200)
+        parser.add_argument("--max-rate", type=float, default=0, help="Throughput cap in objects/s (0 = unlimited)")
+        parser.add_argument("--checkpoint", help="Checkpoint file (default: MEDIA_ROOT/reindex_<target>.json)")
+        parser.add_argument("--resume", action="store_true", help="Continue from the checkpoint file")
+        parser.add_argument("--no-swap", action="store_true", help="Copy only; leave the aliases unchanged")
+        parser.add_argument(
+            "--replace-legacy",
+            action="store_true",
+            help="Allow deleting a source that is a plain collection (not an alias) so the alias can take its name",
+        )
+
+    def handle(self, *args, **options):
+        self.batch_size = options["batch_size"]
+        self.max_rate = options["max_rate"]
+        self.reembed = options["reembed"] or options["rechunk"]
+
+        with WeaviateClient() as client:
+            self.client = client
+            chunks_alias = collection_name(client.chunks_index)
+            documents_alias = collection_name(client.documents_index)
+            source_chunks = self._resolve(chunks_alias)
+            source_documents = self._resolve(documents_alias)
+            version = options["target_version"] or self._current_version(source_chunks) + 1
+            target_chunks = versioned_name(client.chunks_index, version)
+            target_documents = versioned_name(client.documents_index, version)
+
+            checkpoint_path = Path(
+                options["checkpoint"] or Path(settings.MEDIA_ROOT) / f"reindex_{target_chunks}.json"
+            )
+            self.checkpoint_path = checkpoint_path
+            if options["resume"] and checkpoint_path.exists():
+                self.checkpoint = json.loads(checkpoint_path.read_text())
+            elif not options["resume"] and checkpoint_path.exists():
+                raise CommandError(f"Checkpoint {checkpoint_path} exists; pass --resume or remove it.")
+            else:
+                self.checkpoint = {"phase": "chunks", "after": None, "copied": 0}
+
+            for name, create in (
+                    (target_chunks, client.create_chunks_collection),
+                    (target_documents, client.create_documents_collection),
+            ):
+                if not client.client.collections.exists(name):
+                    create(name)
+
+            self.stdout.write(f"Reindexing {source_chunks} -> {target_chunks}, {source_documents} -> {target_documents}")
+            source = client.client.collections.get(source_chunks)
+            target = client.client.collections.get(target_chunks)
+            source_docs = client.client.collections.get(source_documents)
+            target_docs = client.client.collections.get(target_documents)
+
+            if options["rechunk"]:
+                if self.checkpoint["phase"] == "chunks":
+                    self._rechunk(source_docs, target, target_docs)
+            else:
+                if self.checkpoint["phase"] == "chunks":
+                    self._copy_chunks(source, target)
+                if self.checkpoint["phase"] == "documents":
+                    self._copy_documents(source_docs, target_docs, target)
+
+            if options["no_swap"]:
+                self.stdout.write(self.style.SUCCESS("Copy finished; aliases left unchanged (--no-swap)."))
+                return
+
+            self._swap(chunks_alias, source_chunks, target_chunks, options["replace_legacy"])
+            self._swap(documents_alias, source_documents, target_documents, options["replace_legacy"])
+            checkpoint_path.unlink(missing_ok=True)
+            self.stdout.write(self.style.SUCCESS(f"Aliases now point at {target_chunks} and {target_documents}."))
+
+    def _resolve(self, alias: str) -> str:
+        found = self.client.client.alias.get(alias_name=alias)
+        return found.collection if found else alias
+
+    @staticmethod
+    def _current_version(name: str) -> int:
+        match = re.search(r"_v(\d+)$", name)
+        return int(match.group(1)) if match else 1
+
+    def _save_checkpoint(self, **changes) -> None:
+        self.checkpoint.update(changes)
+        self.checkpoint_path.parent.mkdir(parents=True, exist_ok=True)
+        self.checkpoint_path.write_text(json.dumps(self.checkpoint))
+
+    def _throttle(self, started: float, copied: int) -> None:
+        if self.max_rate:
+            ahead = copied / self.max_rate - (time.monotonic() - started)
+            if ahead > 0:
+                time.sleep(ahead)
+
+    def _report(self, label: str, started: float, copied: int, total: int) -> None:
+        elapsed = max(time.monotonic() - started, 1e-6)
+        rate = copied / elapsed
+        target = f" (target {self.max_rate:.0f}/s)" if self.max_rate else ""
+        self.stdout.write(f"{label}: {self.checkpoint['copied']}/{total} objects, {rate:.0f}/s{target}")
+
+    def _insert(self, collection, objects: list[DataObject]) -> None:
+        result = collection.data.insert_many(objects)
+        if result.has_errors:
+            raise CommandError(f"Failed to write {len(result.errors)} objects: {next(iter(result.errors.values()))}")
+
+    def _copy_chunks(self, source, target) -> None:
+        total = source.aggregate.over_all(total_count=True).total_count
+        started = time.monotonic()
+        copied = 0
+        batch = []
+        for item in source.iterator(
+                include_vector=not self.reembed,
+                after=self.checkpoint["after"],
+                cache_size=self.batch_size,
+        ):
+            batch.append(item)
+            if len(batch) >= self.batch_size:
+                copied += self._write_chunk_batch(target, batch)
+                self._report("chunks", started, copied, total)
+                self._throttle(started, copied)
+                batch = []
+        if batch:
+            copied += self._write_chunk_batch(target, batch)
+            self._report("chunks", started, copied, total)
+        self._save_checkpoint(phase="documents", after=None, copied=0)
+
+    def _write_chunk_batch(self, target, batch) -> int:
+        text_key = self.client.text_key
+        if self.reembed:
+            vectors = embed_many([item.properties.get(text_key) or "" for item in batch])
+        else:
+            vectors = [(item.vector or {}).get("default") for item in batch]
+        self._insert(target, [
+            DataObject(properties=item.properties, uuid=item.uuid, vector=vector)
+            for item, vector in zip(batch, vectors)
+        ])
+        self._save_checkpoint(after=str(batch[-1].uuid), copied=self.checkpoint["copied"] + len(batch))
+        return len(batch)
+
+    def _document_vector(self, target_chunks, document_id: str):
+        response = target_chunks.query.fetch_objects(
+            filters=Filter.by_property("document_id").equal(document_id),
+            include_vector=True,
+            return_properties=[self.client.text_key],
+            limit=10000,
+        )
+        vectors = [(item.vector or {}).get("default") for item in response.objects]
+        weights = [len(item.properties.get(self.client.text_key) or "") or 1 for item in response.objects]
+        return pool_vectors(vectors, weights=weights)
+
+    def _copy_documents(self, source_docs, target_docs, target_chunks) -> None:
+        total = source_docs.aggregate.over_all(total_count=True).total_count
+        started = time.monotonic()
+        copied = 0
+        batch = []
+        for item in source_docs.iterator(
+                include_vector=not self.reembed,
+                after=self.checkpoint["after"],
+                cache_size=self.batch_size,
+        ):
+            if self.reembed:
+                vector = self._document_vector(target_chunks, str(item.uuid))
+            else:
+                vector = (item.vector or {}).get("default")
+            batch.append(DataObject(properties=item.properties, uuid=item.uuid, vector=vector))
+            if len(batch) >= self.batch_size:
+                copied += self._write_document_batch(target_docs, batch)
+                self._report("documents", started, copied, total)
+                self._throttle(started, copied)
+                batch = []
+        if batch:
+            copied += self._write_document_batch(target_docs, batch)
+            self._report("documents", started, copied, total)
+        self._save_checkpoint(phase="done", after=None)
+
+    def _write_document_batch(self, target_docs, batch) -> int:
+        self._insert(target_docs, batch)
+        self._save_checkpoint(after=str(batch[-1].uuid), copied=self.checkpoint["copied"] + len(batch))
+        return len(batch)
+
+    def _rechunk(self, source_docs, target_chunks, target_docs) -> None:
+        """Rebuild every document's chunks from storage; checkpointed per document."""
+        text_key = self.client.text_key
+        total = source_docs.aggregate.over_all(total_count=True).total_count
+        started = time.monotonic()
+        copied = 0
+        for item in source_docs.iterator(after=self.checkpoint["after"], cache_size=self.batch_size):
+            props = item.properties
+            document_id = str(item.uuid)
+            text = props.get(text_key) or read_document_text(props.get("bucket"), props.get("storage_path"))
+            chunks = chunk_text(text)
+            vectors = []
+            for offset in range(0, len(chunks), self.batch_size):
+                batch = chunks[offset:offset + self.batch_size]
+                records = chunk_records(batch, document_id, props.get("user_id"), start_index=offset)
+                batch_vectors = embed_many([record["text"] for record in records])
+                vectors.extend(batch_vectors)
+                self._insert(target_chunks, [
+                    self.client.chunk_object(record, vector) for record, vector in zip(records, batch_vectors)
+                ])
+                copied += len(records)
+                self._throttle(started, copied)
+            document_vector = pool_vectors(vectors, weights=[len(chunk.text) for chunk in chunks])
+            self._insert(target_docs, [DataObject(properties=props, uuid=item.uuid, vector=document_vector)])
+            self._save_checkpoint(after=document_id, copied=self.checkpoint["copied"] + 1)
+            self._report("documents rechunked", started, self.checkpoint["copied"], total)
+        self._save_checkpoint(phase="done", after=None)
+
+    def _swap(self, alias: str, source: str, target: str, replace_legacy: bool) -> None:
+        aliases = self.client.client.alias
+        if aliases.exists(alias_name=alias):
+            aliases.update(alias_name=alias, new_target_collection=target)
+            return
+        if not replace_legacy:
+            raise CommandError(
+                f"{source} is a plain collection, not an alias. Re-run with --resume --replace-legacy "
+                f"to delete it and create the alias {alias} -> {target} (a one-time cutover)."
+            )
+        self.client.client.collections.delete(source)
+        aliases.create(alias_name=alias, target_collection=target)
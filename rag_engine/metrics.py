@@ -0,0 +1,55 @@
+"""
+Prometheus endpoint for the metrics defined with prometheus_client next to
+the code they measure.
+
+Under several worker processes set PROMETHEUS_MULTIPROC_DIR to a directory
+the workers share, emptied before they start: every process then writes its
+values there and a scrape of any worker returns the totals of all of them.
+Gauges use the "livesum" mode, which sums processes that have not been
+marked dead.
+
+Scrapes must come from an address in METRICS_ALLOWED_IPS (addresses or
+networks, comma-separated; loopback only by default) and, when
+METRICS_TOKEN is set, send it as "Authorization: Bearer <token>".
+"""
+
+import hmac
+import ipaddress
+import os
+
+from django.http import HttpResponse, HttpResponseForbidden
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, generate_latest, multiprocess
+
+env = os.environ
+
+METRICS_TOKEN = env.get("METRICS_TOKEN", "")
+METRICS_ALLOWED_IPS = [
+    ipaddress.ip_network(network.strip(), strict=False)
+    for network in env.get("METRICS_ALLOWED_IPS", "127.0.0.1,::1").split(",")
+    if network.strip()
+]
+
+
+def scrape_allowed(request) -> bool:
+    """Whether the client address is allowed and the request carries the metrics token, if one is set."""
+    try:
+        address = ipaddress.ip_address(request.META.get("REMOTE_ADDR", ""))
+    except ValueError:
+        return False
+    if not any(address in network for network in METRICS_ALLOWED_IPS):
+        return False
+    if METRICS_TOKEN:
+        return hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {METRICS_TOKEN}")
+    return True
+
+
+def metrics_view(request):
+    """Every metric, summed over the workers in multiprocess mode, for a Prometheus scrape."""
+    if not scrape_allowed(request):
+        return HttpResponseForbidden()
+    if env.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
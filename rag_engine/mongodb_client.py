@@ -1,15 +1,29 @@
 import os
 from datetime import datetime
+from typing import Iterable, Iterator, Optional, Sequence, Union
 from uuid import uuid4
 
-from pymongo import MongoClient
+import numpy as np
+from pymongo import ASCENDING, MongoClient, ReplaceOne, TEXT
+from pymongo.errors import BulkWriteError
 
-from .embeddings import embed
+from .embeddings import embed, embed_many
+from .storage import STORE_DOCUMENT_TEXT, read_document_text
+from .chunking import Chunk
+from .vector_store import VectorStore, chunk_records
+from .vectors import normalize, top_k_indices
 
 env = os.environ
 
+# Rows scored per NumPy matmul during brute-force vector search.
+SCAN_BLOCK_SIZE = int(env.get("MONGO_SCAN_BLOCK_SIZE", 2048))
+DUPLICATE_KEY_ERROR = 11000
+CHUNK_FIELDS = {"text": 1, "document_id": 1, "user_id": 1, "ordinal": 1, "start_offset": 1, "end_offset": 1}
+
+
+class MongoDBClient(MongoClient, VectorStore):
+    _indexes_ready = False
 
-class MongoDBClient(MongoClient):
     def __init__(self):
         uri = env.get("MONGO_URI", "mongodb://localhost:27017")
         db_name = env.get("MONGO_DB", "ragdb")
@@ -17,18 +31,26 @@ class MongoDBClient(MongoClient):
         self.db = self[db_name]
         self.documents = self.db["documents"]
         self.chunks = self.db["chunks"]
+        if not MongoDBClient._indexes_ready:
+            self._ensure_indexes()
+            MongoDBClient._indexes_ready = True
 
-    @staticmethod
-    def chunk_text(text: str, size=800, overlap=150) -> list[str]:
-        chunks = []
-        start = 0
-        while start < len(text):
-            end = start + size
-            chunks.append(text[start:end])
-            start = end - overlap
-        return chunks
-
-    def create_document(self, doc_id: str, user_id: int, filename: str, bucket: str, processed: bool, text: str) -> None:
+    def _ensure_indexes(self) -> None:
+        self.chunks.create_index([("user_id", ASCENDING), ("document_id", ASCENDING)])
+        self.chunks.create_index([("document_id", ASCENDING), ("ordinal", ASCENDING)])
+        self.chunks.create_index([("text", TEXT)], default_language="none")
+        self.documents.create_index([("user_id", ASCENDING), ("created_at", ASCENDING)])
+
+    def create_document(
+            self,
+            doc_id: str,
+            user_id: int,
+            filename: str,
+            bucket: str,
+            processed: bool,
+            text: str,
+            storage_path: str = "",
+    ) -> None:
         self.documents.insert_one(
             {
                 "_id": doc_id,
@@ -36,15 +58,61 @@ class MongoDBClient(MongoClient):
                 "filename": filename,
                 "bucket": bucket,
                 "processed": processed,
-                "text": text,
+                "text": text if STORE_DOCUMENT_TEXT else "",
+                "storage_path": storage_path,
                 "created_at": datetime.utcnow(),
             }
         )
 
-    def update_document(self, doc_id: str, data: dict) -> None:
+    def update_document(self, doc_id: str, data: dict, vector: Optional[list[float]] = None) -> None:
+        if not STORE_DOCUMENT_TEXT:
+            data = {key: value for key, value in data.items() if key != "text"}
+        if vector is not None:
+            data = {**data, "vector": vector}
         self.documents.update_one({"_id": doc_id}, {"$set": data})
 
-    def store_chunk(self, text: str, doc_id: str, user_id: int) -> None:
+    def get_document(self, doc_id: str, include_text: bool = False) -> Optional[dict]:
+        projection = {"vector": 0} if include_text and STORE_DOCUMENT_TEXT else {"vector": 0, "text": 0}
+        document = self.documents.find_one({"_id": doc_id}, projection)
+        if document is not None and include_text and not document.get("text"):
+            document["text"] = read_document_text(document["bucket"], document["storage_path"])
+        return document
+
+    def delete_chunks(self, doc_id: str) -> int:
+        return self.chunks.delete_many({"document_id": doc_id}).deleted_count
+
+    def delete_document(self, doc_id: str) -> int:
+        deleted = self.delete_chunks(doc_id)
+        self.documents.delete_one({"_id": doc_id})
+        return deleted
+
+    def store_chunks(
+            self,
+            chunks: Sequence[Union[str, Chunk]],
+            doc_id: str,
+            user_id: int,
+            start_index: int = 0,
+            ordinals: Optional[Sequence[int]] = None,
+    ) -> list[list[float]]:
+        records = chunk_records(chunks, doc_id, user_id, start_index, ordinals)
+        vectors = embed_many([record["text"] for record in records])
+        for record, vector in zip(records, vectors):
+            record["vector"] = vector
+        try:
+            self.chunks.insert_many(records, ordered=False)
+        except BulkWriteError as exc:
+            # A retried ingestion re-inserts chunks that already exist; overwrite those.
+            errors = exc.details.get("writeErrors", [])
+            if any(error.get("code") != DUPLICATE_KEY_ERROR for error in errors):
+                raise
+            self.chunks.bulk_write(
+                [ReplaceOne({"_id": records[error["index"]]["_id"]}, records[error["index"]], upsert=True)
+                 for error in errors],
+                ordered=False,
+            )
+        return vectors
+
+    def store_chunk(self, text: str, doc_id: str, user_id: int) -> list[float]:
         vector = embed(text)
         self.chunks.insert_one(
             {
@@ -55,6 +123,133 @@ class MongoDBClient(MongoClient):
                 "vector": vector,
             }
         )
+        return vector
 
     def find_chunks_by_user(self, user_id: int, limit=5) -> list[dict]:
-        return list(self.chunks.find({"user_id": user_id}).limit(limit))
+        return list(self.chunks.find({"user_id": user_id}, {"vector": 0}).limit(limit))
+
+    def iter_chunks(
+            self,
+            user_id: Optional[int] = None,
+            page_size: int = 500,
+            include_vector: bool = False,
+    ) -> Iterator[dict]:
+        """Stream chunks through a server-side cursor fetching `page_size` documents per batch."""
+        query = {} if user_id is None else {"user_id": user_id}
+        projection = None if include_vector else {"vector": 0}
+        yield from self.chunks.find(query, projection, batch_size=page_size).sort("_id", 1)
+
+    def fetch_chunks(self, user_id: int, ordinals: dict[str, Iterable[int]]) -> list[dict]:
+        clauses = [
+            {"document_id": doc_id, "ordinal": {"$in": list(wanted)}}
+            for doc_id, wanted in ordinals.items() if wanted
+        ]
+        if not clauses:
+            return []
+        return [
+            self._to_result(record, None)
+            for record in self.chunks.find({"user_id": user_id, "$or": clauses}, CHUNK_FIELDS)
+        ]
+
+    @staticmethod
+    def _chunk_query(user_id: int, document_ids: Optional[list[str]] = None) -> dict:
+        query = {"user_id": user_id}
+        if document_ids:
+            query["document_id"] = {"$in": list(document_ids)}
+        return query
+
+    @staticmethod
+    def _to_result(record: dict, score: float) -> dict:
+        return {
+            "_id": record["_id"],
+            "text": record.get("text"),
+            "document_id": record.get("document_id"),
+            "user_id": record.get("user_id"),
+            "ordinal": record.get("ordinal"),
+            "start_offset": record.get("start_offset"),
+            "end_offset": record.get("end_offset"),
+            "score": score,
+        }
+
+    def near_vector(
+            self,
+            vector: list[float],
+            user_id: int,
+            limit: int = 5,
+            document_ids: Optional[list[str]] = None,
+            offset: int = 0,
+    ) -> list[dict]:
+        """
+        Brute-force cosine search over the user's chunks.
+
+        The (user_id, document_id) index narrows the scan; vectors stream in
+        blocks through a projected cursor and each block is scored with one
+        matmul, keeping only a running top-k in memory.
+        """
+        wanted = limit + offset
+        query_vector = normalize(np.asarray(vector, dtype=np.float32))
+        cursor = self.chunks.find(
+            self._chunk_query(user_id, document_ids),
+            {**CHUNK_FIELDS, "vector": 1},
+            batch_size=SCAN_BLOCK_SIZE,
+        )
+
+        best: list[tuple[float, dict]] = []
+        block: list[dict] = []
+
+        def score_block():
+            matrix = normalize(np.asarray([record.pop("vector") for record in block], dtype=np.float32))
+            scores = matrix @ query_vector
+            best.extend((float(scores[i]), block[i]) for i in top_k_indices(scores, wanted))
+            best.sort(key=lambda item: item[0], reverse=True)
+            del best[wanted:]
+
+        for record in cursor:
+            block.append(record)
+            if len(block) >= SCAN_BLOCK_SIZE:
+                score_block()
+                block = []
+        if block:
+            score_block()
+
+        return [self._to_result(record, 1.0 - similarity) for similarity, record in best[offset:]]
+
+    def near_vector_documents(
+            self,
+            vector: list[float],
+            user_id: int,
+            limit: int = 10,
+            document_ids: Optional[list[str]] = None,
+    ) -> list[dict]:
+        query = {"user_id": user_id, "vector": {"$exists": True}}
+        if document_ids:
+            query["_id"] = {"$in": list(document_ids)}
+        records = list(self.documents.find(query, {"vector": 1}))
+        if not records:
+            return []
+        matrix = normalize(np.asarray([record["vector"] for record in records], dtype=np.float32))
+        scores = matrix @ normalize(np.asarray(vector, dtype=np.float32))
+        return [
+            {"document_id": records[i]["_id"], "score": 1.0 - float(scores[i])}
+            for i in top_k_indices(scores, limit)
+        ]
+
+    def bm25(
+            self,
+            query: str,
+            user_id: int,
+            limit: int = 5,
+            document_ids: Optional[list[str]] = None,
+            offset: int = 0,
+    ) -> list[dict]:
+        """Keyword search through the text index, ranked by MongoDB's textScore."""
+        cursor = (
+            self.chunks.find(
+                {**self._chunk_query(user_id, document_ids), "$text": {"$search": query}},
+                {**CHUNK_FIELDS, "score": {"$meta": "textScore"}},
+            )
+            .sort([("score", {"$meta": "textScore"})])
+            .skip(offset)
+            .limit(limit)
+        )
+        return [self._to_result(record, record["score"]) for record in cursor]
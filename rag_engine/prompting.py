@@ -1,9 +1,16 @@
-def build_prompt(retrieve_chunks, question):
-    context = "\n".join([c.text for c in retrieve_chunks])
-    return f"""
+import os
+from dataclasses import dataclass, field
+from typing import Any, Optional, Sequence, Union
+
+from .chunking import DEFAULT_CHUNK_OVERLAP, Chunk, count_tokens, merge_chunks
+
+# Upper bound on the tokens of a packed prompt (template + context + question).
+PROMPT_TOKEN_BUDGET = int(os.environ.get("RAG_PROMPT_TOKEN_BUDGET", 3000))
+
+PROMPT_TEMPLATE = """
 You are a company assistant.
 Use only the context.
-
+{history}
 Context:
 {context}
 
@@ -11,13 +18,172 @@ Question:
 {question}
 """
 
+HISTORY_TEMPLATE = """
+Conversation so far:
+{history}
+"""
 
-def build_prompt_for_score(retrieve_chunks, question):
+CONTEXT_SEPARATOR = "\n\n"
 
-    score = [c.score for c in retrieve_chunks]
-    text = [c.text for c in retrieve_chunks]
-    d = dict(zip(score, text))
-    return f"""
-{question}
-{d}
-    """
\ No newline at end of file
+
+@dataclass
+class PackedPrompt:
+    """A prompt built within a token budget, with what went into it."""
+    prompt: str
+    tokens: int
+    budget: int
+    sources: list[str] = field(default_factory=list)  # document ids, in [n] citation order
+    used_chunks: int = 0
+    dropped_chunks: int = 0
+    dropped_history: int = 0
+
+
+def _get(chunk: Any, name: str, default=None):
+    """Read a field from a SearchResult or a result dict."""
+    if isinstance(chunk, dict):
+        return chunk.get("_id" if name == "id" else name, default)
+    return getattr(chunk, name, default)
+
+
+def _rank(chunks: Sequence[Any]) -> list[Any]:
+    """
+    Best chunks first. Semantic scores are distances (lower is better); keyword
+    and hybrid scores are relevance (higher is better). Ties keep input order.
+    """
+    def key(item):
+        position, chunk = item
+        score = _get(chunk, "score")
+        if score is None:
+            return (1, 0.0, position)
+        return (0, score if _get(chunk, "search_type") == "semantic" else -score, position)
+
+    return [chunk for _, chunk in sorted(enumerate(chunks), key=key)]
+
+
+def _subtract(start: int, end: int, spans: list[tuple[int, int]]) -> list[tuple[int, int]]:
+    """Parts of [start, end) not covered by any of spans."""
+    parts = [(start, end)]
+    for span_start, span_end in spans:
+        parts = [
+            piece
+            for part_start, part_end in parts
+            for piece in ((part_start, min(part_end, span_start)), (max(part_start, span_end), part_end))
+            if piece[0] < piece[1]
+        ]
+    return parts
+
+
+def _strip_text_overlap(text: str, others: list[str], max_overlap: int) -> str:
+    """Drop a prefix / suffix of text that repeats a suffix / prefix of a text already packed."""
+    for other in others:
+        for size in range(min(max_overlap, len(text), len(other)), 0, -1):
+            if other.endswith(text[:size]):
+                text = text[size:]
+                break
+        for size in range(min(max_overlap, len(text), len(other)), 0, -1):
+            if other.startswith(text[-size:]):
+                text = text[:-size]
+                break
+    return text
+
+
+def pack_prompt(
+        chunks: Sequence[Any],
+        question: str,
+        budget: int = PROMPT_TOKEN_BUDGET,
+        max_overlap: int = DEFAULT_CHUNK_OVERLAP * 2,
+        history: Union[str, Sequence[str]] = "",
+) -> PackedPrompt:
+    """
+    Build a prompt from retrieved chunks without exceeding a token budget.
+
+    Chunks are packed best-first. Text a chunk shares with a chunk of the same
+    document already packed (the chunking overlap) is trimmed: by character
+    offsets when the chunks have them, otherwise by matching prefix/suffix
+    text up to max_overlap characters. A chunk whose new text does not fit
+    is skipped and smaller ones are still tried. In the prompt, each
+    document's packed text appears once, in document order, under an [n]
+    marker; documents are ordered by their best chunk. Conversation history,
+    if any, is placed before the context and counts against the budget: its
+    oldest lines are dropped first until the prompt without context fits.
+
+    Args:
+        chunks: SearchResult objects or result dicts
+        question: User question
+        budget: Maximum tokens of the whole prompt
+        max_overlap: Longest prefix/suffix overlap trimmed for chunks without offsets
+        history: Earlier conversation as plain text, or as lines oldest first
+            (summary, then recent messages) that are trimmed to the budget
+
+    Returns:
+        PackedPrompt with the prompt text and its token count
+    """
+    lines = [history] if isinstance(history, str) else list(history)
+    lines = [line for line in lines if line]
+    dropped_history = 0
+    while True:
+        history = HISTORY_TEMPLATE.format(history="\n".join(lines)) if lines else ""
+        base_tokens = count_tokens(PROMPT_TEMPLATE.format(history=history, context="", question=question))
+        if base_tokens <= budget or not lines:
+            break
+        lines.pop(0)
+        dropped_history += 1
+    separator_tokens = count_tokens(CONTEXT_SEPARATOR)
+    remaining = budget - base_tokens
+
+    documents: dict[str, list[Chunk]] = {}  # packed pieces per document, in rank order of documents
+    loose: dict[str, list[str]] = {}  # packed texts of chunks without offsets
+    used = dropped = 0
+    for chunk in _rank(chunks):
+        document_id = str(_get(chunk, "document_id"))
+        text = _get(chunk, "text") or ""
+        start, end = _get(chunk, "start_offset"), _get(chunk, "end_offset")
+
+        if start is not None and end is not None:
+            spans = [(piece.start, piece.end) for piece in documents.get(document_id, [])]
+            pieces = [Chunk(text[s - start:e - start], s, e) for s, e in _subtract(start, end, spans)]
+        else:
+            text = _strip_text_overlap(text, loose.get(document_id, []), max_overlap)
+            pieces = [Chunk(text, -1, -1)] if text else []
+        if not pieces:
+            continue
+
+        cost = sum(count_tokens(piece.text) + separator_tokens for piece in pieces)
+        if document_id not in documents:
+            cost += count_tokens(f"[{len(documents) + 1}]\n") + separator_tokens
+        if cost > remaining:
+            dropped += 1
+            continue
+
+        remaining -= cost
+        used += 1
+        documents.setdefault(document_id, []).extend(pieces)
+        if start is None or end is None:
+            loose.setdefault(document_id, []).append(text)
+
+    blocks = []
+    for number, pieces in enumerate(documents.values(), start=1):
+        placed = merge_chunks(piece for piece in pieces if piece.start >= 0)
+        unplaced = [piece for piece in pieces if piece.start < 0]
+        body = CONTEXT_SEPARATOR.join(piece.text for piece in placed + unplaced)
+        blocks.append(f"[{number}]\n{body}")
+
+    prompt = PROMPT_TEMPLATE.format(history=history, context=CONTEXT_SEPARATOR.join(blocks), question=question)
+    return PackedPrompt(
+        prompt=prompt,
+        tokens=count_tokens(prompt),
+        budget=budget,
+        sources=list(documents),
+        used_chunks=used,
+        dropped_chunks=dropped,
+        dropped_history=dropped_history,
+    )
+
+
+def build_prompt(retrieve_chunks, question, budget: Optional[int] = None):
+    return pack_prompt(retrieve_chunks, question, budget or PROMPT_TOKEN_BUDGET).prompt
+
+
+def build_prompt_for_score(retrieve_chunks, question, budget: Optional[int] = None):
+    """Prompt with the best-scoring chunks first (see pack_prompt)."""
+    return build_prompt(retrieve_chunks, question, budget)
@@ -1,10 +1,35 @@
+import asyncio
+import contextvars
 import logging
-from typing import Literal, Optional
-from dataclasses import dataclass
-
-from weaviate.collections.classes.filters import Filter
-from .weaviate_client import WeaviateClient
-from .embeddings import embed
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, Literal, Optional
+from dataclasses import dataclass, replace
+
+from django.core.cache import cache
+
+from . import deadline
+from .chunking import Chunk, merge_chunks
+from .deadline import DeadlineExceeded
+from .dedup import reference_scope
+from .vector_store import AsyncVectorStore, get_async_vector_store, get_vector_store, group_by_document
+from .embeddings import embed_many
+from .cache import (
+    HYBRID_RANKING_TTL,
+    acorpus_generation,
+    aget_query_vector,
+    corpus_generation,
+    get_query_vector,
+    hybrid_ranking_key,
+)
+from .timings import stage
+
+# Upper bound on concurrent vector-store queries issued by search_many.
+SEARCH_MANY_WORKERS = int(os.environ.get("RAG_SEARCH_MANY_WORKERS", 8))
+# Default number of candidate documents for two-stage semantic search; 0 searches all chunks.
+CANDIDATE_DOCUMENTS = int(os.environ.get("RAG_CANDIDATE_DOCUMENTS", 0))
+# Chunks in the fused ranking that hybrid search pages through.
+HYBRID_WINDOW = int(os.environ.get("RAG_HYBRID_WINDOW", 200))
 
 
 @dataclass
@@ -16,6 +41,23 @@ class SearchResult:
     user_id: int
     score: float
     search_type: str  # "semantic", "keyword", "hybrid"
+    ordinal: Optional[int] = None
+    start_offset: Optional[int] = None
+    end_offset: Optional[int] = None
+
+    @classmethod
+    def from_hit(cls, hit: dict, score: float, search_type: str) -> "SearchResult":
+        return cls(
+            id=hit["_id"],
+            text=hit["text"],
+            document_id=hit["document_id"],
+            user_id=hit["user_id"],
+            score=score,
+            search_type=search_type,
+            ordinal=hit.get("ordinal"),
+            start_offset=hit.get("start_offset"),
+            end_offset=hit.get("end_offset"),
+        )
 
     def to_dict(self) -> dict:
         return {
@@ -25,6 +67,9 @@ class SearchResult:
             "user_id": self.user_id,
             "score": self.score,
             "search_type": self.search_type,
+            "ordinal": self.ordinal,
+            "start_offset": self.start_offset,
+            "end_offset": self.end_offset,
         }
 
 
@@ -38,11 +83,21 @@ class SearchRag:
     - hybrid: Combination of semantic and keyword with configurable weights
     """
 
-    def __init__(self):
-        self.client = WeaviateClient()
+    def __init__(self, client=None):
+        self.client = client or get_vector_store()
         self.logger = logging.getLogger(__name__)
         self.text_key = self.client.text_key
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+    def close(self):
+        self.client.close()
+
     def semantic_search(
             self,
             query: str,
@@ -50,81 +105,96 @@ class SearchRag:
             limit: int = 5,
             document_ids: Optional[list[str]] = None,
             min_score: Optional[float] = None,
+            vector: Optional[list[float]] = None,
+            offset: int = 0,
+            candidate_documents: Optional[int] = None,
     ) -> list[SearchResult]:
         """
         Perform semantic similarity search using vector embeddings.
 
+        With candidate_documents=D the search runs in two stages: the D
+        documents nearest to the query (by pooled document vector) are picked
+        first, and only their chunks are searched. Documents without a vector
+        yet (still processing) are not candidates; if no document has one the
+        search falls back to all chunks.
+
+        Chunks that documents in the filter skipped at ingestion as
+        near-duplicates are found through their canonical copies (see
+        rag_engine.dedup.ReferenceScope).
+
         Args:
             query: Search query
             user_id: User ID to filter results
             limit: Maximum number of results
             document_ids: Optional list of document IDs to search within
             min_score: Optional minimum similarity score (lower distance = higher similarity)
+            vector: Precomputed query embedding; skips the embedding call
+            offset: Number of top results to skip (pagination)
+            candidate_documents: Documents searched in two-stage mode;
+                defaults to RAG_CANDIDATE_DOCUMENTS, 0 searches all chunks
 
         Returns:
             List of SearchResult objects
         """
         try:
-            # Build filters
-            filters = Filter.by_property("user_id").equal(user_id)
-
-            # Add document ID filters if specified
-            if document_ids:
-                doc_filters = [
-                    Filter.by_property("document_id").equal(doc_id)
-                    for doc_id in document_ids
-                ]
-                if len(doc_filters) == 1:
-                    filters = filters & doc_filters[0]
-                else:
-                    combined = doc_filters[0]
-                    for f in doc_filters[1:]:
-                        combined = combined | f
-                    filters = filters & combined
+            if vector is None:
+                vector = get_query_vector(query)
+            document_ids = self._candidate_documents(vector, user_id, document_ids, candidate_documents)
 
-            # Perform vector search
-            response = self.client.chunks_collection.query.near_vector(
-                near_vector=embed(query),
-                limit=limit,
-                filters=filters,
-                return_metadata=["distance"],
-                return_properties=[self.text_key, "document_id", "user_id", "object_id"],
-            )
+            # Chunks skipped as near-duplicates resolve to their canonical copies.
+            scope = reference_scope(user_id, document_ids)
+            fetch_limit, fetch_offset = scope.window(limit, offset)
 
-            results = []
-            for obj in response.objects:
-                props = obj.properties or {}
-                distance = obj.metadata.distance if obj.metadata else None
-
-                # Filter by minimum score if specified
-                if min_score is not None and distance is not None:
-                    if distance > min_score:
-                        continue
-
-                results.append(SearchResult(
-                    id=props.get("object_id"),
-                    text=props.get(self.text_key),
-                    document_id=props.get("document_id"),
-                    user_id=props.get("user_id"),
-                    score=distance if distance is not None else 1.0,
-                    search_type="semantic"
-                ))
+            # Perform vector search
+            deadline.check("vector search")
+            with stage("vector_query"):
+                hits = self.client.near_vector(
+                    vector,
+                    user_id=user_id,
+                    limit=fetch_limit,
+                    document_ids=scope.search_ids,
+                    offset=fetch_offset,
+                )
+            results = self._semantic_results(scope.resolve(hits, limit, offset), min_score)
 
             self.logger.info(
                 f"Semantic search for user {user_id}: {len(results)} results"
             )
             return results
 
-        except Exception as e:
+        except DeadlineExceeded:
+            raise
+        except Exception:
             self.logger.error(f"Error in semantic search for user {user_id}", exc_info=True)
             return []
 
+    def _candidate_documents(
+            self,
+            vector: list[float],
+            user_id: int,
+            document_ids: Optional[list[str]],
+            candidate_documents: Optional[int],
+    ) -> Optional[list[str]]:
+        """The document filter narrowed to the candidates of a two-stage semantic search."""
+        if candidate_documents is None:
+            candidate_documents = CANDIDATE_DOCUMENTS
+        if candidate_documents:
+            deadline.check("document search")
+            with stage("document_query"):
+                candidates = self.client.near_vector_documents(
+                    vector, user_id, limit=candidate_documents, document_ids=document_ids
+                )
+            if candidates:
+                return [candidate["document_id"] for candidate in candidates]
+        return document_ids
+
     def keyword_search(
             self,
             query: str,
             user_id: int,
             limit: int = 5,
             document_ids: Optional[list[str]] = None,
+            offset: int = 0,
     ) -> list[SearchResult]:
         """
         Perform BM25 keyword-based text search.
@@ -134,90 +204,112 @@ class SearchRag:
             user_id: User ID to filter results
             limit: Maximum number of results
             document_ids: Optional list of document IDs to search within
+            offset: Number of top results to skip (pagination)
 
         Returns:
             List of SearchResult objects
         """
         try:
-            # Build filters
-            filters = Filter.by_property("user_id").equal(user_id)
-
-            # Add document ID filters if specified
-            if document_ids:
-                doc_filters = [
-                    Filter.by_property("document_id").equal(doc_id)
-                    for doc_id in document_ids
-                ]
-                if len(doc_filters) == 1:
-                    filters = filters & doc_filters[0]
-                else:
-                    combined = doc_filters[0]
-                    for f in doc_filters[1:]:
-                        combined = combined | f
-                    filters = filters & combined
+            scope = reference_scope(user_id, document_ids)
+            fetch_limit, fetch_offset = scope.window(limit, offset)
 
             # Perform BM25 keyword search
-            response = self.client.chunks_collection.query.bm25(
-                query=query,
-                limit=limit,
-                filters=filters,
-                return_metadata=["score"],
-                return_properties=[self.text_key, "document_id", "user_id", "object_id"],
-            )
-
-            results = []
-            for obj in response.objects:
-                props = obj.properties or {}
-                score = obj.metadata.score if obj.metadata else 0.0
-
-                results.append(SearchResult(
-                    id=props.get("object_id"),
-                    text=props.get(self.text_key),
-                    document_id=props.get("document_id"),
-                    user_id=props.get("user_id"),
-                    score=score,
-                    search_type="keyword"
-                ))
+            deadline.check("keyword search")
+            with stage("bm25"):
+                hits = self.client.bm25(
+                    query,
+                    user_id=user_id,
+                    limit=fetch_limit,
+                    document_ids=scope.search_ids,
+                    offset=fetch_offset,
+                )
+            results = self._keyword_results(scope.resolve(hits, limit, offset))
 
             self.logger.info(
                 f"Keyword search for user {user_id}: {len(results)} results"
             )
             return results
 
-        except Exception as e:
+        except DeadlineExceeded:
+            raise
+        except Exception:
             self.logger.error(f"Error in keyword search for user {user_id}", exc_info=True)
             return []
 
+    @staticmethod
+    def _semantic_results(hits: list[dict], min_score: Optional[float] = None) -> list[SearchResult]:
+        """Vector hits as results; a hit's score is its distance, so min_score is an upper bound."""
+        return [
+            SearchResult.from_hit(hit, hit["score"] if hit["score"] is not None else 1.0, "semantic")
+            for hit in hits
+            if min_score is None or hit["score"] is None or hit["score"] <= min_score
+        ]
+
+    @staticmethod
+    def _keyword_results(hits: list[dict]) -> list[SearchResult]:
+        return [
+            SearchResult.from_hit(hit, hit["score"] if hit["score"] is not None else 0.0, "keyword")
+            for hit in hits
+        ]
+
     def hybrid_search(
             self,
             query: str,
             user_id: int,
             limit: int = 5,
-            alpha: float = 0.5,
             document_ids: Optional[list[str]] = None,
-            fusion_type: Literal["weighted", "rrf"] = "weighted",
+            vector: Optional[list[float]] = None,
+            offset: int = 0,
     ) -> list[SearchResult]:
         """
-        Perform hybrid search combining semantic and keyword search.
+        Perform hybrid search combining semantic and keyword search with
+        Reciprocal Rank Fusion.
 
         Args:
             query: Search query
             user_id: User ID to filter results
             limit: Maximum number of results
-            alpha: Weight between semantic (1.0) and keyword (0.0) search.
-                   0.5 = equal weight. Only used if fusion_type="weighted"
             document_ids: Optional list of document IDs to search within
-            fusion_type: "weighted" or "rrf" (Reciprocal Rank Fusion)
+            vector: Precomputed query embedding; skips the embedding call
+            offset: Number of top fused results to skip (pagination). The
+                    first page fuses only the chunks it returns; the first
+                    deeper page extends that ranking to the top
+                    HYBRID_WINDOW chunks. The ranking is cached per query,
+                    user, corpus generation and document filter, so pages
+                    neither overlap nor reorder; results end at the window.
 
         Returns:
             List of SearchResult objects sorted by combined score
         """
         try:
-            return self._hybrid_rrf(query, user_id, limit, document_ids)
+            key = hybrid_ranking_key(query, user_id, corpus_generation(user_id), document_ids)
+            ranking = cache.get(key) or []
+            if self._extends_ranking(ranking, limit, offset):
+                if offset:
+                    fused = self._hybrid_rrf(query, user_id, HYBRID_WINDOW, document_ids, vector=vector)
+                    ranking = self._extend_ranking(ranking, fused)
+                else:
+                    ranking = self._hybrid_rrf(query, user_id, limit, document_ids, vector=vector)
+                cache.set(key, ranking, timeout=HYBRID_RANKING_TTL)
+            return ranking[offset:offset + limit]
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             self.logger.error(f"Error in hybrid search for user {user_id}, error: {e}", exc_info=True)
             return []
 
+    @staticmethod
+    def _extends_ranking(ranking: list[SearchResult], limit: int, offset: int) -> bool:
+        """Whether a page reaches past the cached ranking, which deeper pages only extend up to the window."""
+        return offset + limit > len(ranking) and (not offset or len(ranking) < HYBRID_WINDOW)
+
+    @staticmethod
+    def _extend_ranking(head: list[SearchResult], fused: list[SearchResult]) -> list[SearchResult]:
+        """The ranking earlier pages were cut from, followed by the fused results it does not hold yet."""
+        seen = {result.id for result in head}
+        extended = head + [result for result in fused if result.id not in seen]
+        return extended[:max(HYBRID_WINDOW, len(head))]
+
     def _hybrid_rrf(
             self,
             query: str,
@@ -225,6 +317,7 @@ class SearchRag:
             limit: int,
             document_ids: Optional[list[str]] = None,
             k: int = 60,
+            vector: Optional[list[float]] = None,
     ) -> list[SearchResult]:
         """
         Hybrid search using Reciprocal Rank Fusion (RRF).
@@ -238,6 +331,7 @@ class SearchRag:
             user_id=user_id,
             limit=limit * 2,
             document_ids=document_ids,
+            vector=vector,
         )
 
         keyword_results = self.keyword_search(
@@ -247,46 +341,135 @@ class SearchRag:
             document_ids=document_ids,
         )
 
-        # Build RRF scores
-        rrf_scores = {}
-
-        # Add semantic rankings
-        for rank, result in enumerate(semantic_results, start=1):
-            chunk_id = result.id
-            rrf_scores[chunk_id] = rrf_scores.get(chunk_id, 0) + (1 / (k + rank))
-
-        # Add keyword rankings
-        for rank, result in enumerate(keyword_results, start=1):
-            chunk_id = result.id
-            rrf_scores[chunk_id] = rrf_scores.get(chunk_id, 0) + (1 / (k + rank))
-
-        # Create unified results with RRF scores
-        all_results = {r.id: r for r in semantic_results + keyword_results}
-
-        results = []
-        for chunk_id, score in sorted(rrf_scores.items(), key=lambda x: x[1], reverse=True)[:limit]:
-            if chunk_id in all_results:
-                result = all_results[chunk_id]
-                results.append(SearchResult(
-                    id=result.id,
-                    text=result.text,
-                    document_id=result.document_id,
-                    user_id=result.user_id,
-                    score=score,
-                    search_type="hybrid"
-                ))
+        results = self._rrf_fuse(semantic_results, keyword_results, limit, k)
 
         self.logger.info(
             f"Hybrid search (RRF, k={k}) for user {user_id}: {len(results)} results"
         )
         return results
 
+    @staticmethod
+    def _rrf_fuse(
+            semantic_results: list[SearchResult],
+            keyword_results: list[SearchResult],
+            limit: int,
+            k: int = 60,
+    ) -> list[SearchResult]:
+        with stage("fusion"):
+            # Build RRF scores
+            rrf_scores = {}
+
+            # Add semantic rankings
+            for rank, result in enumerate(semantic_results, start=1):
+                chunk_id = result.id
+                rrf_scores[chunk_id] = rrf_scores.get(chunk_id, 0) + (1 / (k + rank))
+
+            # Add keyword rankings
+            for rank, result in enumerate(keyword_results, start=1):
+                chunk_id = result.id
+                rrf_scores[chunk_id] = rrf_scores.get(chunk_id, 0) + (1 / (k + rank))
+
+            # Create unified results with RRF scores
+            all_results = {r.id: r for r in semantic_results + keyword_results}
+
+            results = []
+            for chunk_id, score in sorted(rrf_scores.items(), key=lambda x: x[1], reverse=True)[:limit]:
+                if chunk_id in all_results:
+                    results.append(replace(all_results[chunk_id], score=score, search_type="hybrid"))
+            return results
+
+    def grouped_search(
+            self,
+            query: str,
+            user_id: int,
+            groups: int = 5,
+            per_group: int = 3,
+            strategy: Literal["semantic", "keyword", "hybrid"] = "semantic",
+            document_ids: Optional[list[str]] = None,
+            vector: Optional[list[float]] = None,
+            candidate_documents: Optional[int] = None,
+    ) -> list[dict]:
+        """
+        Top documents with their best chunks, so overlapping neighbours of one
+        document do not take every result slot.
+
+        Semantic search is grouped by the vector store (natively on Weaviate),
+        within the same two-stage candidates and near-duplicate references as
+        semantic_search. When the filter's documents skipped chunks whose
+        canonical copies live elsewhere, and for keyword and hybrid search,
+        results are collapsed from a candidate pool of three times
+        groups * per_group chunks instead.
+
+        Args:
+            query: Search query
+            user_id: User ID to filter results
+            groups: Maximum number of documents
+            per_group: Maximum number of chunks per document
+            strategy: Search strategy ("semantic", "keyword", "hybrid")
+            document_ids: Optional list of document IDs to search within
+            vector: Precomputed query embedding; skips the embedding call
+            candidate_documents: Documents searched in two-stage semantic mode;
+                defaults to RAG_CANDIDATE_DOCUMENTS, 0 searches all chunks
+
+        Returns:
+            List of {"document_id", "score", "results"} dictionaries, best document first
+        """
+        pool = groups * per_group * 3
+        if strategy == "semantic":
+            try:
+                vector = vector if vector is not None else get_query_vector(query)
+                document_ids = self._candidate_documents(vector, user_id, document_ids, candidate_documents)
+                scope = reference_scope(user_id, document_ids)
+                deadline.check("vector search")
+                if scope.widened:
+                    # Native groups would be keyed by the canonical documents: resolve first, then group.
+                    fetch_limit, _ = scope.window(pool, 0)
+                    with stage("vector_query"):
+                        hits = self.client.near_vector(
+                            vector, user_id=user_id, limit=fetch_limit, document_ids=scope.search_ids
+                        )
+                    candidates = [r.to_dict() for r in self._semantic_results(scope.resolve(hits, pool, 0))]
+                    grouped = group_by_document(candidates, groups, per_group)
+                else:
+                    with stage("grouped_vector_query"):
+                        grouped = self.client.near_vector_grouped(
+                            vector,
+                            user_id=user_id,
+                            groups=groups,
+                            per_group=per_group,
+                            document_ids=document_ids,
+                        )
+                    for group in grouped:
+                        group["chunks"] = [{**chunk, "search_type": "semantic"} for chunk in group["chunks"]]
+            except DeadlineExceeded:
+                raise
+            except Exception:
+                self.logger.error(f"Error in grouped semantic search for user {user_id}", exc_info=True)
+                return []
+        else:
+            candidates = self.search(
+                query, user_id, pool, strategy, document_ids=document_ids,
+                **({"vector": vector} if strategy == "hybrid" else {}),
+            )
+            grouped = group_by_document(candidates, groups, per_group)
+
+        self.logger.info(
+            f"Grouped {strategy} search for user {user_id}: {len(grouped)} documents"
+        )
+        return [
+            {"document_id": group["document_id"], "score": group["score"], "results": group["chunks"]}
+            for group in grouped
+        ]
+
     def search(
             self,
             query: str,
             user_id: int,
             limit: int = 5,
             strategy: Literal["semantic", "keyword", "hybrid"] = "semantic",
+            group_by_document: bool = False,
+            per_document: int = 3,
+            neighbors: int = 0,
             **kwargs
     ) -> list[dict]:
         """
@@ -295,15 +478,27 @@ class SearchRag:
         Args:
             query: Search query
             user_id: User ID to filter results
-            limit: Maximum number of results
+            limit: Maximum number of results (documents when grouping)
             strategy: Search strategy ("semantic", "keyword", "hybrid")
+            group_by_document: Return the top `limit` documents, each with its
+                best chunks, instead of a flat chunk list (see grouped_search)
+            per_document: Chunks kept per document when grouping
+            neighbors: Expand each result to a window of its N neighbouring
+                chunks on either side (see expand_neighbors)
             **kwargs: Additional parameters passed to the specific search method
-                - For hybrid: alpha (float), fusion_type (str)
-                - For all: document_ids (list[str]), min_score (float)
+                - For hybrid: vector (list[float])
+                - For all: document_ids (list[str]), min_score (float), offset (int)
 
         Returns:
             List of result dictionaries
         """
+        if group_by_document:
+            return self.grouped_search(
+                query, user_id, limit, per_document, strategy,
+                document_ids=kwargs.get("document_ids"), vector=kwargs.get("vector"),
+                candidate_documents=kwargs.get("candidate_documents"),
+            )
+
         if strategy == "semantic":
             results = self.semantic_search(query, user_id, limit, **kwargs)
         elif strategy == "keyword":
@@ -313,4 +508,348 @@ class SearchRag:
         else:
             raise ValueError(f"Unknown search strategy: {strategy}")
 
-        return [r.to_dict() for r in results]
\ No newline at end of file
+        results = [r.to_dict() for r in results]
+        if neighbors:
+            try:
+                deadline.check("neighbour expansion")
+                with stage("neighbour_expansion"):
+                    results = self.expand_neighbors(results, user_id, neighbors)
+            except DeadlineExceeded:
+                self.logger.info(f"Deadline reached, returning unexpanded results for user {user_id}")
+        return results
+
+    def expand_neighbors(self, results: list[dict], user_id: int, neighbors: int = 1) -> list[dict]:
+        """
+        Replace each result's text with a window of its neighbouring chunks.
+
+        All neighbours are fetched in one request. Windows are stitched by
+        character offset so chunk overlap appears once, and text already
+        returned in a better-ranked window of the same document is not
+        repeated: a hit inside an earlier window is dropped, and a window
+        touching an earlier one is trimmed at its edge. Results stored
+        without positions are returned unchanged.
+
+        Args:
+            results: Result dictionaries, best first
+            user_id: User ID the results belong to
+            neighbors: Chunks to add on each side of a hit
+
+        Returns:
+            Result dictionaries with "text", "start_offset" and "end_offset"
+            covering the window and "window" holding its first and last ordinal
+        """
+        wanted: dict[str, set[int]] = {}
+        for result in results:
+            if result.get("ordinal") is not None:
+                wanted.setdefault(result["document_id"], set()).update(
+                    range(max(0, result["ordinal"] - neighbors), result["ordinal"] + neighbors + 1)
+                )
+        if not wanted:
+            return results
+
+        chunks: dict[str, dict[int, dict]] = {}
+        for chunk in self.client.fetch_chunks(user_id, wanted):
+            chunks.setdefault(chunk["document_id"], {})[chunk["ordinal"]] = chunk
+
+        expanded = []
+        emitted: dict[str, list[tuple[int, int, Optional[int], Optional[int]]]] = {}
+        for result in results:
+            ordinal = result.get("ordinal")
+            if ordinal is None:
+                expanded.append(result)
+                continue
+            document_id = result["document_id"]
+            windows = emitted.setdefault(document_id, [])
+            if any(first <= ordinal <= last for first, last, _, _ in windows):
+                continue
+
+            available = chunks.get(document_id, {})
+            available.setdefault(ordinal, result)
+            taken = {o for first, last, _, _ in windows for o in range(first, last + 1)}
+            first = last = ordinal
+            while first - 1 >= ordinal - neighbors and first - 1 in available and first - 1 not in taken:
+                first -= 1
+            while last + 1 <= ordinal + neighbors and last + 1 in available and last + 1 not in taken:
+                last += 1
+            window = [available[o] for o in range(first, last + 1)]
+
+            if all(chunk.get("start_offset") is not None for chunk in window):
+                pieces = []
+                for chunk in window:
+                    start, end = chunk["start_offset"], chunk["end_offset"]
+                    # Clip text already returned in a neighbouring window.
+                    for _, _, other_start, other_end in windows:
+                        if other_start is None:
+                            continue
+                        if other_start <= start < other_end:
+                            start = other_end
+                        if other_start < end <= other_end:
+                            end = other_start
+                    if start < end:
+                        offset = chunk["start_offset"]
+                        pieces.append(Chunk(chunk["text"][start - offset:end - offset], start, end))
+                stitched = merge_chunks(pieces)
+                if not stitched:
+                    continue
+                # Gaps between stitched parts are separators the chunker stripped.
+                text = "\n\n".join(part.text for part in stitched)
+                start, end = stitched[0].start, stitched[-1].end
+            else:
+                text = "\n\n".join(chunk["text"] for chunk in window)
+                start = end = None
+
+            windows.append((first, last, start, end))
+            expanded.append({**result, "text": text, "start_offset": start, "end_offset": end, "window": [first, last]})
+        return expanded
+
+    def iter_results(
+            self,
+            query: str,
+            user_id: int,
+            strategy: Literal["semantic", "keyword", "hybrid"] = "semantic",
+            page_size: int = 100,
+            max_results: int = 1000,
+            offset: int = 0,
+            **kwargs
+    ) -> Iterator[dict]:
+        """
+        Yield results page by page for streaming large result sets.
+
+        The query embedding is cached, so only the first page pays for it.
+
+        Args:
+            query: Search query
+            user_id: User ID to filter results
+            strategy: Search strategy ("semantic", "keyword", "hybrid")
+            page_size: Results fetched from the store per request
+            max_results: Maximum number of results to yield
+            offset: Number of top results to skip
+            **kwargs: Additional parameters passed to search()
+
+        Returns:
+            Iterator of result dictionaries
+        """
+        end = offset + max_results
+        while offset < end:
+            page = self.search(query, user_id, min(page_size, end - offset), strategy, offset=offset, **kwargs)
+            yield from page
+            if len(page) < min(page_size, end - offset):
+                return
+            offset += len(page)
+
+    def search_many(
+            self,
+            queries: list[str],
+            user_id: int,
+            limit: int = 5,
+            strategy: Literal["semantic", "keyword", "hybrid"] = "semantic",
+            document_ids: Optional[list[str]] = None,
+    ) -> list[list[dict]]:
+        """
+        Run several queries with one batched embedding call and concurrent
+        vector / BM25 queries.
+
+        Args:
+            queries: Search queries
+            user_id: User ID to filter results
+            limit: Maximum number of results per query
+            strategy: Search strategy ("semantic", "keyword", "hybrid")
+            document_ids: Optional list of document IDs to search within
+
+        Returns:
+            One list of result dictionaries per query, in input order
+        """
+        if strategy not in ("semantic", "keyword", "hybrid"):
+            raise ValueError(f"Unknown search strategy: {strategy}")
+        if not queries:
+            return []
+
+        vectors = embed_many(queries) if strategy in ("semantic", "hybrid") else [None] * len(queries)
+        # Hybrid fuses over twice the limit from each side, like _hybrid_rrf.
+        fetch = limit * 2 if strategy == "hybrid" else limit
+
+        with ThreadPoolExecutor(max_workers=min(SEARCH_MANY_WORKERS, 2 * len(queries))) as pool:
+            def submit(fn, *args, **kwargs):
+                # Worker threads do not inherit context variables: each query
+                # runs in a copy of this one, so it sees the request deadline
+                # and records into its timings collector.
+                return pool.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+            semantic = [
+                submit(
+                    self.semantic_search, query, user_id, fetch, document_ids=document_ids, vector=vector
+                ) if strategy != "keyword" else None
+                for query, vector in zip(queries, vectors)
+            ]
+            keyword = [
+                submit(self.keyword_search, query, user_id, fetch, document_ids=document_ids)
+                if strategy != "semantic" else None
+                for query in queries
+            ]
+
+            results = []
+            for semantic_future, keyword_future in zip(semantic, keyword):
+                if strategy == "semantic":
+                    found = semantic_future.result()
+                elif strategy == "keyword":
+                    found = keyword_future.result()
+                else:
+                    found = self._rrf_fuse(semantic_future.result(), keyword_future.result(), limit)
+                results.append([r.to_dict() for r in found])
+
+        self.logger.info(
+            f"Batch {strategy} search for user {user_id}: {len(queries)} queries"
+        )
+        return results
+
+
+class AsyncSearchRag:
+    """
+    Async SearchRag for ASGI views: the query embedding and store queries are
+    awaited, so a worker serves other requests while they are in flight.
+
+    Uses the event loop's shared store (see get_async_vector_store) unless a
+    client is given; neither is closed here.
+    """
+
+    def __init__(self, client: Optional[AsyncVectorStore] = None):
+        self.client = client
+        self.logger = logging.getLogger(__name__)
+
+    async def _store(self) -> AsyncVectorStore:
+        if self.client is None:
+            self.client = await get_async_vector_store()
+        return self.client
+
+    async def semantic_search(
+            self,
+            query: str,
+            user_id: int,
+            limit: int = 5,
+            document_ids: Optional[list[str]] = None,
+            min_score: Optional[float] = None,
+            vector: Optional[list[float]] = None,
+            offset: int = 0,
+            candidate_documents: Optional[int] = None,
+    ) -> list[SearchResult]:
+        """Async SearchRag.semantic_search."""
+        try:
+            client = await self._store()
+            if vector is None:
+                vector = await aget_query_vector(query)
+            if candidate_documents is None:
+                candidate_documents = CANDIDATE_DOCUMENTS
+            if candidate_documents:
+                with stage("document_query"):
+                    candidates = await deadline.wait_for(client.near_vector_documents(
+                        vector, user_id, limit=candidate_documents, document_ids=document_ids
+                    ), "document search")
+                if candidates:
+                    document_ids = [candidate["document_id"] for candidate in candidates]
+
+            scope = await asyncio.to_thread(reference_scope, user_id, document_ids)
+            fetch_limit, fetch_offset = scope.window(limit, offset)
+            with stage("vector_query"):
+                hits = await deadline.wait_for(client.near_vector(
+                    vector, user_id=user_id, limit=fetch_limit, document_ids=scope.search_ids, offset=fetch_offset
+                ), "vector search")
+            results = SearchRag._semantic_results(scope.resolve(hits, limit, offset), min_score)
+            self.logger.info(f"Semantic search for user {user_id}: {len(results)} results")
+            return results
+        except DeadlineExceeded:
+            raise
+        except Exception:
+            self.logger.error(f"Error in semantic search for user {user_id}", exc_info=True)
+            return []
+
+    async def keyword_search(
+            self,
+            query: str,
+            user_id: int,
+            limit: int = 5,
+            document_ids: Optional[list[str]] = None,
+            offset: int = 0,
+    ) -> list[SearchResult]:
+        """Async SearchRag.keyword_search."""
+        try:
+            client = await self._store()
+            scope = await asyncio.to_thread(reference_scope, user_id, document_ids)
+            fetch_limit, fetch_offset = scope.window(limit, offset)
+            with stage("bm25"):
+                hits = await deadline.wait_for(
+                    client.bm25(
+                        query, user_id=user_id, limit=fetch_limit, document_ids=scope.search_ids, offset=fetch_offset
+                    ),
+                    "keyword search",
+                )
+            results = SearchRag._keyword_results(scope.resolve(hits, limit, offset))
+            self.logger.info(f"Keyword search for user {user_id}: {len(results)} results")
+            return results
+        except DeadlineExceeded:
+            raise
+        except Exception:
+            self.logger.error(f"Error in keyword search for user {user_id}", exc_info=True)
+            return []
+
+    async def hybrid_search(
+            self,
+            query: str,
+            user_id: int,
+            limit: int = 5,
+            document_ids: Optional[list[str]] = None,
+            vector: Optional[list[float]] = None,
+            offset: int = 0,
+            **kwargs
+    ) -> list[SearchResult]:
+        """Async SearchRag.hybrid_search (RRF); the semantic and keyword queries run concurrently."""
+        try:
+            key = hybrid_ranking_key(query, user_id, await acorpus_generation(user_id), document_ids)
+            ranking = await cache.aget(key) or []
+            if SearchRag._extends_ranking(ranking, limit, offset):
+                if offset:
+                    fused = await self._hybrid_rrf(query, user_id, HYBRID_WINDOW, document_ids, vector)
+                    ranking = SearchRag._extend_ranking(ranking, fused)
+                else:
+                    ranking = await self._hybrid_rrf(query, user_id, limit, document_ids, vector)
+                await cache.aset(key, ranking, timeout=HYBRID_RANKING_TTL)
+            results = ranking[offset:offset + limit]
+            self.logger.info(f"Hybrid search (RRF) for user {user_id}: {len(results)} results")
+            return results
+        except DeadlineExceeded:
+            raise
+        except Exception:
+            self.logger.error(f"Error in hybrid search for user {user_id}", exc_info=True)
+            return []
+
+    async def _hybrid_rrf(
+            self,
+            query: str,
+            user_id: int,
+            limit: int,
+            document_ids: Optional[list[str]] = None,
+            vector: Optional[list[float]] = None,
+    ) -> list[SearchResult]:
+        semantic_results, keyword_results = await asyncio.gather(
+            self.semantic_search(query, user_id, limit * 2, document_ids=document_ids, vector=vector),
+            self.keyword_search(query, user_id, limit * 2, document_ids=document_ids),
+        )
+        return SearchRag._rrf_fuse(semantic_results, keyword_results, limit)
+
+    async def search(
+            self,
+            query: str,
+            user_id: int,
+            limit: int = 5,
+            strategy: Literal["semantic", "keyword", "hybrid"] = "semantic",
+            **kwargs
+    ) -> list[dict]:
+        """Async SearchRag.search for flat result lists."""
+        if strategy == "semantic":
+            results = await self.semantic_search(query, user_id, limit, **kwargs)
+        elif strategy == "keyword":
+            results = await self.keyword_search(query, user_id, limit, **kwargs)
+        elif strategy == "hybrid":
+            results = await self.hybrid_search(query, user_id, limit, **kwargs)
+        else:
+            raise ValueError(f"Unknown search strategy: {strategy}")
+        return [r.to_dict() for r in results]
@@ -0,0 +1,23 @@
+import os
+from pathlib import Path
+
+env = os.environ
+
+# When false (the default) document objects in the vector store keep only
+# metadata and a storage pointer; the full text lives in document storage.
+STORE_DOCUMENT_TEXT = env.get("RAG_STORE_DOCUMENT_TEXT", "false").lower() in ("1", "true", "yes")
+
+
+def read_document_text(bucket: str, storage_path: str) -> str:
+    """Read a document's full text from the storage it was uploaded to."""
+    if bucket != "local":
+        raise ValueError(f"Unsupported storage bucket: {bucket}")
+    return Path(storage_path).read_text("utf-8")
+
+
+def delete_document_file(bucket: str, storage_path: str) -> None:
+    """Remove a document's stored file; a file that is already gone is not an error."""
+    if bucket != "local":
+        raise ValueError(f"Unsupported storage bucket: {bucket}")
+    if storage_path:
+        Path(storage_path).unlink(missing_ok=True)
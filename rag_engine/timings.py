@@ -0,0 +1,70 @@
+"""
+Latency of each stage of the search and chat pipeline.
+
+stage("vector_query") times a block into the rag_stage_seconds histogram
+and counts the block's exceptions in rag_stage_errors_total. Inside a
+collect() scope the same timings are also summed per stage, in
+milliseconds, into a dict a view returns for debug=timings. Like the
+deadline, the collector is a context variable: it follows awaits, asyncio
+tasks and asyncio.to_thread, but not plain thread pools.
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+from prometheus_client import Counter, Histogram
+
+stage_seconds = Histogram(
+    "rag_stage_seconds",
+    "Latency of search and chat pipeline stages, in seconds.",
+    ["stage"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+stage_errors = Counter("rag_stage_errors_total", "Pipeline stages that raised an exception.", ["stage"])
+
+_collected: ContextVar[Optional[dict[str, float]]] = ContextVar("rag_timings", default=None)
+
+
+def wants_timings(request) -> bool:
+    """Whether a request asked for per-stage timings (?debug=timings)."""
+    return request.GET.get("debug") == "timings"
+
+
+def record(name: str, seconds: float, timings: Optional[dict[str, float]] = None) -> None:
+    """Add a stage's duration to the histogram and to timings (default: the current collector)."""
+    stage_seconds.labels(stage=name).observe(seconds)
+    if timings is None:
+        timings = _collected.get()
+    if timings is not None:
+        timings[name] = round(timings.get(name, 0.0) + seconds * 1000, 3)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        stage_errors.labels(stage=name).inc()
+        raise
+    finally:
+        record(name, time.perf_counter() - started)
+
+
+@contextmanager
+def collect(timings: Optional[dict[str, float]] = None, enabled: bool = True) -> Iterator[Optional[dict[str, float]]]:
+    """
+    Collect the stage timings of the block into timings (a new dict unless
+    given, so that several scopes can fill one). Yields None when not enabled.
+    """
+    if not enabled:
+        yield None
+        return
+    timings = {} if timings is None else timings
+    token = _collected.set(timings)
+    try:
+        yield timings
+    finally:
+        _collected.reset(token)
@@ -0,0 +1,331 @@
+import asyncio
+import os
+import weakref
+from abc import ABC, abstractmethod
+from typing import Iterable, Iterator, Optional, Sequence, Union
+from uuid import NAMESPACE_URL, uuid5
+
+from .chunking import DEFAULT_CHUNK_OVERLAP, DEFAULT_CHUNK_SIZE, Chunk, get_chunker
+
+env = os.environ
+
+VECTOR_STORE_BACKEND = env.get("RAG_VECTOR_STORE", "weaviate")
+# Largest candidate pool the client-side group-by collapse may fetch.
+GROUP_BY_MAX_CANDIDATES = int(env.get("RAG_GROUP_BY_MAX_CANDIDATES", 1000))
+
+
+def chunk_uuid(document_id: str, index: int) -> str:
+    """
+    Deterministic id of a document's index-th chunk.
+
+    Re-running ingestion for a document (e.g. a Celery retry) overwrites the
+    same chunk objects instead of adding duplicates.
+    """
+    return str(uuid5(NAMESPACE_URL, f"{document_id}:{index}"))
+
+
+def chunk_records(
+        chunks: Sequence[Union[str, Chunk]],
+        doc_id: str,
+        user_id: int,
+        start_index: int = 0,
+        ordinals: Optional[Sequence[int]] = None,
+) -> list[dict]:
+    """
+    Fields stored for a batch of a document's chunks.
+
+    Each record carries the chunk's ordinal within the document (consecutive
+    from start_index unless ordinals are given) and, for Chunk objects, its
+    character offsets in the source text. Plain strings (legacy callers) get
+    no offsets.
+    """
+    if ordinals is None:
+        ordinals = range(start_index, start_index + len(chunks))
+    records = []
+    for ordinal, chunk in zip(ordinals, chunks):
+        text, start, end = (chunk, None, None) if isinstance(chunk, str) else (chunk.text, chunk.start, chunk.end)
+        records.append({
+            "_id": chunk_uuid(doc_id, ordinal),
+            "text": text,
+            "document_id": doc_id,
+            "user_id": user_id,
+            "ordinal": ordinal,
+            "start_offset": start,
+            "end_offset": end,
+        })
+    return records
+
+
+def group_by_document(hits: list[dict], groups: int, per_group: int) -> list[dict]:
+    """
+    Collapse best-first chunk hits into the top documents.
+
+    Args:
+        hits: Chunk result dicts, best first
+        groups: Maximum number of documents to return
+        per_group: Maximum number of chunks kept per document
+
+    Returns:
+        Dicts with "document_id", "score" (of the document's best chunk) and
+        "chunks", in the order each document first appears in hits
+    """
+    grouped = {}
+    for hit in hits:
+        group = grouped.get(hit["document_id"])
+        if group is None:
+            if len(grouped) >= groups:
+                continue
+            group = grouped[hit["document_id"]] = {
+                "document_id": hit["document_id"],
+                "score": hit["score"],
+                "chunks": [],
+            }
+        if len(group["chunks"]) < per_group:
+            group["chunks"].append(hit)
+    return list(grouped.values())
+
+
+class VectorStore(ABC):
+    """
+    Operations the ingestion pipeline and SearchRag need from a chunk store.
+
+    Search methods return plain dicts with "_id", "text", "document_id",
+    "user_id", "ordinal", "start_offset", "end_offset" and "score". For
+    near_vector the score is a cosine distance (lower is better), for bm25 a
+    relevance score (higher is better). Position fields are None for chunks
+    stored before they were recorded.
+    """
+
+    text_key = "text"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+    def close(self) -> None:
+        pass
+
+    @staticmethod
+    def chunk_text(text: str, size=DEFAULT_CHUNK_SIZE, overlap=DEFAULT_CHUNK_OVERLAP) -> list[str]:
+        return get_chunker(size, overlap).split_text(text)
+
+    @abstractmethod
+    def create_document(
+            self,
+            doc_id: str,
+            user_id: int,
+            filename: str,
+            bucket: str,
+            processed: bool,
+            text: str,
+            storage_path: str = "",
+    ) -> None:
+        ...
+
+    @abstractmethod
+    def update_document(self, doc_id: str, data: dict, vector: Optional[list[float]] = None) -> None:
+        ...
+
+    @abstractmethod
+    def get_document(self, doc_id: str, include_text: bool = False) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    def store_chunks(
+            self,
+            chunks: Sequence[Union[str, Chunk]],
+            doc_id: str,
+            user_id: int,
+            start_index: int = 0,
+            ordinals: Optional[Sequence[int]] = None,
+    ) -> list[list[float]]:
+        """Embed and store a batch of chunks (see chunk_records); returns their vectors in order."""
+
+    @abstractmethod
+    def delete_chunks(self, doc_id: str) -> int:
+        ...
+
+    @abstractmethod
+    def delete_document(self, doc_id: str) -> int:
+        ...
+
+    @abstractmethod
+    def fetch_chunks(self, user_id: int, ordinals: dict[str, Iterable[int]]) -> list[dict]:
+        """Chunks of the given documents at the given ordinals, in one request; scores are None."""
+
+    @abstractmethod
+    def iter_chunks(
+            self,
+            user_id: Optional[int] = None,
+            page_size: int = 500,
+            include_vector: bool = False,
+    ) -> Iterator[dict]:
+        ...
+
+    @abstractmethod
+    def near_vector(
+            self,
+            vector: list[float],
+            user_id: int,
+            limit: int = 5,
+            document_ids: Optional[list[str]] = None,
+            offset: int = 0,
+    ) -> list[dict]:
+        ...
+
+    @abstractmethod
+    def near_vector_documents(
+            self,
+            vector: list[float],
+            user_id: int,
+            limit: int = 10,
+            document_ids: Optional[list[str]] = None,
+    ) -> list[dict]:
+        """Nearest documents by pooled document vector: {"document_id", "score"} dicts, score a cosine distance."""
+
+    def near_vector_grouped(
+            self,
+            vector: list[float],
+            user_id: int,
+            groups: int = 5,
+            per_group: int = 3,
+            document_ids: Optional[list[str]] = None,
+    ) -> list[dict]:
+        """
+        Best per_group chunks of each of the top groups documents (see group_by_document).
+
+        This default collapses an over-fetched near_vector result, doubling the
+        candidate pool until enough documents are found, the store runs out of
+        chunks or GROUP_BY_MAX_CANDIDATES is reached. Backends with native
+        group-by override it.
+        """
+        fetch = min(groups * per_group * 2, GROUP_BY_MAX_CANDIDATES)
+        while True:
+            hits = self.near_vector(vector, user_id, limit=fetch, document_ids=document_ids)
+            grouped = group_by_document(hits, groups, per_group)
+            if len(grouped) >= groups or len(hits) < fetch or fetch >= GROUP_BY_MAX_CANDIDATES:
+                return grouped
+            fetch = min(fetch * 2, GROUP_BY_MAX_CANDIDATES)
+
+    @abstractmethod
+    def bm25(
+            self,
+            query: str,
+            user_id: int,
+            limit: int = 5,
+            document_ids: Optional[list[str]] = None,
+            offset: int = 0,
+    ) -> list[dict]:
+        ...
+
+
+class AsyncVectorStore(ABC):
+    """
+    Async counterpart of the VectorStore search operations, for ASGI views.
+
+    Results have the same shape as VectorStore's.
+    """
+
+    async def close(self) -> None:
+        pass
+
+    @abstractmethod
+    async def near_vector(
+            self,
+            vector: list[float],
+            user_id: int,
+            limit: int = 5,
+            document_ids: Optional[list[str]] = None,
+            offset: int = 0,
+    ) -> list[dict]:
+        ...
+
+    @abstractmethod
+    async def near_vector_documents(
+            self,
+            vector: list[float],
+            user_id: int,
+            limit: int = 10,
+            document_ids: Optional[list[str]] = None,
+    ) -> list[dict]:
+        ...
+
+    @abstractmethod
+    async def bm25(
+            self,
+            query: str,
+            user_id: int,
+            limit: int = 5,
+            document_ids: Optional[list[str]] = None,
+            offset: int = 0,
+    ) -> list[dict]:
+        ...
+
+    @abstractmethod
+    async def fetch_chunks(self, user_id: int, ordinals: dict[str, Iterable[int]]) -> list[dict]:
+        ...
+
+
+class ThreadedVectorStore(AsyncVectorStore):
+    """AsyncVectorStore over a thread-safe sync store whose driver has no async API (MongoDB, local)."""
+
+    def __init__(self, store: VectorStore):
+        self.store = store
+
+    async def close(self) -> None:
+        await asyncio.to_thread(self.store.close)
+
+    async def near_vector(self, vector, user_id, limit=5, document_ids=None, offset=0):
+        return await asyncio.to_thread(self.store.near_vector, vector, user_id, limit, document_ids, offset)
+
+    async def near_vector_documents(self, vector, user_id, limit=10, document_ids=None):
+        return await asyncio.to_thread(self.store.near_vector_documents, vector, user_id, limit, document_ids)
+
+    async def bm25(self, query, user_id, limit=5, document_ids=None, offset=0):
+        return await asyncio.to_thread(self.store.bm25, query, user_id, limit, document_ids, offset)
+
+    async def fetch_chunks(self, user_id, ordinals):
+        return await asyncio.to_thread(self.store.fetch_chunks, user_id, ordinals)
+
+
+# One connected async store per event loop (a single one per ASGI worker).
+_async_stores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncVectorStore]" = weakref.WeakKeyDictionary()
+
+
+async def get_async_vector_store(backend: Optional[str] = None) -> AsyncVectorStore:
+    """
+    Shared async store for the running event loop, selected like get_vector_store.
+
+    Weaviate uses its native async client; other backends run their sync
+    client in worker threads. Callers must not close the shared store.
+    """
+    loop = asyncio.get_running_loop()
+    store = _async_stores.get(loop)
+    if store is None:
+        backend = backend or VECTOR_STORE_BACKEND
+        if backend == "weaviate":
+            from .weaviate_client import AsyncWeaviateClient
+            store = AsyncWeaviateClient()
+            await store.connect()
+        else:
+            store = ThreadedVectorStore(await asyncio.to_thread(get_vector_store, backend))
+        _async_stores[loop] = store
+    return store
+
+
+def get_vector_store(backend: Optional[str] = None) -> VectorStore:
+    """Instantiate the vector store selected by RAG_VECTOR_STORE ("weaviate", "mongodb" or "local")."""
+    backend = backend or VECTOR_STORE_BACKEND
+    if backend == "weaviate":
+        from .weaviate_client import WeaviateClient
+        return WeaviateClient()
+    if backend == "mongodb":
+        from .mongodb_client import MongoDBClient
+        return MongoDBClient()
+    if backend == "local":
+        from .local_store import LocalVectorStore
+        return LocalVectorStore()
+    raise ValueError(f"Unknown vector store backend: {backend}")
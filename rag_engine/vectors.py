@@ -0,0 +1,41 @@
+from typing import Optional, Sequence
+
+import numpy as np
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalize a vector or each row of a matrix, leaving zero rows untouched."""
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def pool_vectors(
+        vectors: Sequence[Sequence[float]],
+        weights: Optional[Sequence[float]] = None,
+) -> Optional[list[float]]:
+    """
+    Pool chunk vectors into a single unit-length document vector.
+
+    Args:
+        vectors: Chunk embeddings, all with the same dimension
+        weights: Optional per-chunk weights (e.g. chunk length); plain mean if omitted
+
+    Returns:
+        The normalized (weighted) mean as a list, or None when there are no vectors
+    """
+    if not len(vectors):
+        return None
+    matrix = normalize(np.asarray(vectors, dtype=np.float32))
+    pooled = np.average(matrix, axis=0, weights=weights)
+    return normalize(pooled).tolist()
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first, without a full sort."""
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    if k < len(scores):
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
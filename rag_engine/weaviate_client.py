@@ -1,79 +1,191 @@
 import os
 from datetime import datetime, timezone
+from typing import Iterable, Iterator, Optional, Sequence, Union
 from uuid import uuid4, UUID
 
 import weaviate
-from weaviate.classes.config import Configure, DataType, Property
+from weaviate.classes.config import Configure, DataType, Property, Tokenization
 from weaviate.collections.classes.filters import Filter
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from .embeddings import embed
+from weaviate.collections.classes.grpc import GroupBy, Sort
+from weaviate.classes.data import DataObject
+from weaviate.classes.init import AdditionalConfig, Timeout
+from weaviate.exceptions import UnexpectedStatusCodeError
+from . import deadline
+from .embeddings import embed, embed_many
+from .storage import STORE_DOCUMENT_TEXT, read_document_text
+from .chunking import Chunk
+from .vector_store import AsyncVectorStore, VectorStore, chunk_records
 
 env = os.environ
 
+DELETE_MANY_LIMIT = int(env.get("WEAVIATE_QUERY_MAXIMUM_RESULTS", 10000))
+# Upper bound on a single search request. The async client cancels queries
+# at the request deadline; a sync client opened under a deadline caps its
+# query timeout at the time left.
+QUERY_TIMEOUT = int(env.get("WEAVIATE_QUERY_TIMEOUT", 30))
 
-class WeaviateClient:
-    def __init__(self):
+
+def additional_config(query_timeout: float = QUERY_TIMEOUT) -> AdditionalConfig:
+    return AdditionalConfig(timeout=Timeout(query=query_timeout))
+
+
+def collection_name(name: str) -> str:
+    """Weaviate stores collection and alias names with a capitalized first letter."""
+    return name[:1].upper() + name[1:]
+
+
+def versioned_name(name: str, version: int) -> str:
+    return f"{collection_name(name)}_v{version}"
+
+
+# Identifiers are matched and sorted whole; word tokenization would split them.
+ID_PROPERTIES = (
+    Property(name="object_id", data_type=DataType.TEXT, index_filterable=True, tokenization=Tokenization.FIELD),
+    Property(name="document_id", data_type=DataType.TEXT, index_filterable=True, tokenization=Tokenization.FIELD),
+)
+
+POSITION_PROPERTIES = (
+    Property(name="ordinal", data_type=DataType.INT, index_filterable=True),
+    Property(name="start_offset", data_type=DataType.INT),
+    Property(name="end_offset", data_type=DataType.INT),
+)
+
+
+class WeaviateChunkMapping:
+    """Collection names, filters and result mapping shared by the sync and async clients."""
+
+    def _configure(self) -> None:
         self.chunks_index = env.get("WEAVIATE_INDEX", "chunks")
         self.documents_index = env.get("WEAVIATE_DOCUMENTS_INDEX", "documents")
         self.text_key = env.get("WEAVIATE_TEXT_KEY", "text")
-        self.client = weaviate.connect_to_local(skip_init_checks=True)
+        self.chunk_properties = [
+            self.text_key, "document_id", "user_id", "object_id", "ordinal", "start_offset", "end_offset",
+        ]
+
+    def _chunk_filters(self, user_id: int, document_ids: Optional[list[str]] = None):
+        filters = Filter.by_property("user_id").equal(user_id)
+        if document_ids:
+            filters = filters & Filter.by_property("document_id").contains_any(document_ids)
+        return filters
+
+    @staticmethod
+    def _document_filters(user_id: int, document_ids: Optional[list[str]] = None):
+        filters = Filter.by_property("user_id").equal(user_id)
+        if document_ids:
+            filters = filters & Filter.by_id().contains_any([UUID(doc_id) for doc_id in document_ids])
+        return filters
+
+    @staticmethod
+    def _ordinal_filters(user_id: int, ordinals: dict[str, list[int]]):
+        per_document = [
+            Filter.by_property("document_id").equal(doc_id) & Filter.by_property("ordinal").contains_any(wanted)
+            for doc_id, wanted in ordinals.items()
+        ]
+        return Filter.by_property("user_id").equal(user_id) & Filter.any_of(per_document)
+
+    def _chunk_to_dict(self, item, include_vector: bool = False) -> dict:
+        props = item.properties or {}
+        chunk = {
+            "_id": props.get("object_id"),
+            "text": props.get(self.text_key),
+            "document_id": props.get("document_id"),
+            "user_id": props.get("user_id"),
+            "ordinal": props.get("ordinal"),
+            "start_offset": props.get("start_offset"),
+            "end_offset": props.get("end_offset"),
+        }
+        if include_vector:
+            chunk["vector"] = (item.vector or {}).get("default")
+        return chunk
+
+
+class WeaviateClient(WeaviateChunkMapping, VectorStore):
+    _positions_ready = False
+    _keyset_ready: Optional[bool] = None
+
+    def __init__(self):
+        self._configure()
+        self.client = weaviate.connect_to_local(
+            skip_init_checks=True,
+            additional_config=additional_config(deadline.timeout(QUERY_TIMEOUT, "vector search")),
+        )
         self._ensure_schema()
         self.chunks_collection = self.client.collections.get(self.chunks_index)
         self.documents_collection = self.client.collections.get(self.documents_index)
-
-    def __enter__(self):
-        return self
-
-    def __exit__(self, exc_type, exc_val, exc_tb):
-        self.close()
-        return False
+        if not WeaviateClient._positions_ready:
+            self._ensure_position_properties()
+            WeaviateClient._positions_ready = True
 
     def close(self):
         if hasattr(self, 'client') and self.client:
             self.client.close()
 
     def _ensure_schema(self) -> None:
-        if not self.client.collections.exists(self.chunks_index):
-            self.client.collections.create(
-                name=self.chunks_index,
-                vector_config=Configure.Vectors.self_provided(),
-                properties=[
-                    Property(name=self.text_key, data_type=DataType.TEXT),
-                    Property(name="object_id", data_type=DataType.TEXT, index_filterable=True),
-                    Property(name="document_id", data_type=DataType.TEXT, index_filterable=True),
-                    Property(name="user_id", data_type=DataType.INT, index_filterable=True),
-                ],
-            )
+        self._ensure_collection(self.chunks_index, self.create_chunks_collection)
+        self._ensure_collection(self.documents_index, self.create_documents_collection)
 
-        if not self.client.collections.exists(self.documents_index):
-            self.client.collections.create(
-                name=self.documents_index,
-                vector_config=Configure.Vectors.self_provided(),
-                properties=[
-                    Property(name=self.text_key, data_type=DataType.TEXT),
-                    Property(name="object_id", data_type=DataType.TEXT, index_filterable=True),
-                    Property(name="document_id", data_type=DataType.TEXT, index_filterable=True),
-                    Property(name="user_id", data_type=DataType.INT, index_filterable=True),
-                    Property(name="filename", data_type=DataType.TEXT),
-                    Property(name="bucket", data_type=DataType.TEXT),
-                    Property(name="processed", data_type=DataType.BOOL),
-                    Property(name="created_at", data_type=DataType.DATE),
-                    Property(name="doc_type", data_type=DataType.TEXT),
-                ],
-            )
+    def _ensure_collection(self, name: str, create) -> None:
+        """
+        Make sure `name` resolves to a collection.
 
-    @staticmethod
-    def chunk_text(text: str, size=800, overlap=150) -> list[str]:
+        New installs create a versioned collection (`<name>_v1`) behind an
+        alias called `name`, so a reindex can later switch the alias to a new
+        collection atomically (see the reindex_collection command).
+        """
+        if self.client.collections.exists(name) or self.client.alias.exists(alias_name=collection_name(name)):
+            return
+        target = versioned_name(name, 1)
+        create(target)
+        self.client.alias.create(alias_name=collection_name(name), target_collection=target)
 
-        return RecursiveCharacterTextSplitter(
-            chunk_size=size,
-            overlap=overlap,
-            separators=["\n\n", "\n", ". ", " ", ""]
-        ).split_text(text)
+    def _ensure_position_properties(self) -> None:
+        """Add the chunk position properties to a chunks collection created before they existed."""
+        existing = {prop.name for prop in self.chunks_collection.config.get().properties}
+        for prop in POSITION_PROPERTIES:
+            if prop.name not in existing:
+                self.chunks_collection.config.add_property(prop)
 
-    def create_document(self, doc_id: str, user_id: int, filename: str, bucket: str, processed: bool, text: str) -> None:
+    def create_chunks_collection(self, name: str) -> None:
+        self.client.collections.create(
+            name=name,
+            vector_config=Configure.Vectors.self_provided(),
+            properties=[
+                Property(name=self.text_key, data_type=DataType.TEXT),
+                *ID_PROPERTIES,
+                Property(name="user_id", data_type=DataType.INT, index_filterable=True),
+                *POSITION_PROPERTIES,
+            ],
+        )
+
+    def create_documents_collection(self, name: str) -> None:
+        self.client.collections.create(
+            name=name,
+            vector_config=Configure.Vectors.self_provided(),
+            properties=[
+                Property(name=self.text_key, data_type=DataType.TEXT),
+                *ID_PROPERTIES,
+                Property(name="user_id", data_type=DataType.INT, index_filterable=True),
+                Property(name="filename", data_type=DataType.TEXT),
+                Property(name="bucket", data_type=DataType.TEXT),
+                Property(name="processed", data_type=DataType.BOOL),
+                Property(name="created_at", data_type=DataType.DATE),
+                Property(name="doc_type", data_type=DataType.TEXT),
+                Property(name="storage_path", data_type=DataType.TEXT),
+            ],
+        )
+
+    def create_document(
+            self,
+            doc_id: str,
+            user_id: int,
+            filename: str,
+            bucket: str,
+            processed: bool,
+            text: str,
+            storage_path: str = "",
+    ) -> None:
         properties = {
-            self.text_key: text,
+            self.text_key: text if STORE_DOCUMENT_TEXT else "",
             "object_id": doc_id,
             "document_id": doc_id,
             "user_id": user_id,
@@ -82,32 +194,89 @@ class WeaviateClient:
             "processed": processed,
             "created_at": datetime.now(timezone.utc).isoformat(),
             "doc_type": "source",
+            "storage_path": storage_path,
         }
-        vector = embed(text) if text else None
+        # The document vector is pooled from its chunk vectors once they are
+        # embedded (see update_document), so nothing is embedded here.
         self.documents_collection.data.insert(
             properties=properties,
             uuid=doc_id,
-            vector=vector,
         )
 
 
-    def update_document(self, doc_id: str, data: dict) -> None:
+    def update_document(self, doc_id: str, data: dict, vector: Optional[list[float]] = None) -> None:
+        if not STORE_DOCUMENT_TEXT:
+            data = {key: value for key, value in data.items() if key != self.text_key}
         try:
             # Convert string to UUID object
             uuid_obj = UUID(doc_id)
-            existing = self.documents_collection.query.fetch_object_by_id(uuid_obj)
-            if existing is None:
-                print(f"Document {doc_id} not found")
-                return
-            self.documents_collection.data.update(uuid=uuid_obj, properties=data)
+            # A PATCH on a missing object answers 404, so no existence check is needed.
+            self.documents_collection.data.update(uuid=uuid_obj, properties=data, vector=vector)
             print(f"Successfully updated document {doc_id}")
         except ValueError as e:
             print(f"Invalid UUID format: {doc_id}, error: {e}")
+        except UnexpectedStatusCodeError as e:
+            if e.status_code == 404:
+                print(f"Document {doc_id} not found")
+            else:
+                print(f"Error updating document {doc_id}: {e}")
         except Exception as e:
             print(f"Error updating document {doc_id}: {e}")
 
-    def store_chunk(self, text: str, doc_id: str, user_id: int) -> None:
+    def get_document(self, doc_id: str, include_text: bool = False) -> Optional[dict]:
+        """
+        Fetch a document's metadata, reading its full text from storage only
+        when include_text is set.
+        """
+        obj = self.documents_collection.query.fetch_object_by_id(
+            UUID(doc_id),
+            return_properties=[
+                "document_id", "user_id", "filename", "bucket", "processed",
+                "created_at", "storage_path",
+            ] + ([self.text_key] if include_text and STORE_DOCUMENT_TEXT else []),
+        )
+        if obj is None:
+            return None
+        props = dict(obj.properties or {})
+        document = {
+            "_id": props.get("document_id"),
+            "user_id": props.get("user_id"),
+            "filename": props.get("filename"),
+            "bucket": props.get("bucket"),
+            "processed": props.get("processed"),
+            "created_at": props.get("created_at"),
+            "storage_path": props.get("storage_path"),
+        }
+        if include_text:
+            document["text"] = props.get(self.text_key) or read_document_text(
+                document["bucket"], document["storage_path"]
+            )
+        return document
+
+    def delete_chunks(self, doc_id: str) -> int:
+        """
+        Delete every chunk of a document with server-side delete_many calls.
+
+        Weaviate caps a single delete_many at QUERY_MAXIMUM_RESULTS matches, so
+        the call is only repeated for documents larger than that cap.
+        """
+        where = Filter.by_property("document_id").equal(doc_id)
+        deleted = 0
+        while True:
+            result = self.chunks_collection.data.delete_many(where=where)
+            deleted += result.successful
+            if result.matches < DELETE_MANY_LIMIT or result.successful == 0:
+                return deleted
+
+    def delete_document(self, doc_id: str) -> int:
+        """Delete a document object and all of its chunks; returns the number of chunks removed."""
+        deleted = self.delete_chunks(doc_id)
+        self.documents_collection.data.delete_by_id(UUID(doc_id))
+        return deleted
+
+    def store_chunk(self, text: str, doc_id: str, user_id: int) -> list[float]:
         chunk_id = str(uuid4())
+        vector = embed(text)
         self.chunks_collection.data.insert(
             properties={
                 self.text_key: text,
@@ -116,49 +285,301 @@ class WeaviateClient:
                 "user_id": user_id,
             },
             uuid=chunk_id,
-            vector=embed(text),
+            vector=vector,
         )
+        return vector
 
-    def similarity_search(self, query: str, user_id: int, limit: int = 5) -> list[dict]:
-        filters = Filter.by_property("user_id").equal(user_id)
+    def chunk_object(self, record: dict, vector: list[float]) -> DataObject:
+        """Weaviate object for a chunk record built by chunk_records."""
+        properties = {
+            self.text_key: record["text"],
+            "object_id": record["_id"],
+            "document_id": record["document_id"],
+            "user_id": record["user_id"],
+            "ordinal": record["ordinal"],
+        }
+        if record["start_offset"] is not None:
+            properties["start_offset"] = record["start_offset"]
+            properties["end_offset"] = record["end_offset"]
+        return DataObject(properties=properties, uuid=record["_id"], vector=vector)
+
+    def store_chunks(
+            self,
+            chunks: Sequence[Union[str, Chunk]],
+            doc_id: str,
+            user_id: int,
+            start_index: int = 0,
+            ordinals: Optional[Sequence[int]] = None,
+    ) -> list[list[float]]:
+        records = chunk_records(chunks, doc_id, user_id, start_index, ordinals)
+        vectors = embed_many([record["text"] for record in records])
+        objects = [self.chunk_object(record, vector) for record, vector in zip(records, vectors)]
+        result = self.chunks_collection.data.insert_many(objects)
+        if result.has_errors:
+            raise RuntimeError(f"Failed to store {len(result.errors)} chunks for document {doc_id}.")
+        return vectors
+
+    def near_vector(
+            self,
+            vector: list[float],
+            user_id: int,
+            limit: int = 5,
+            document_ids: Optional[list[str]] = None,
+            offset: int = 0,
+    ) -> list[dict]:
         response = self.chunks_collection.query.near_vector(
-            near_vector=embed(query),
+            near_vector=vector,
             limit=limit,
-            filters=filters,
+            offset=offset or None,
+            filters=self._chunk_filters(user_id, document_ids),
             return_metadata=["distance"],
-            return_properties=[self.text_key, "document_id", "user_id", "object_id"],
-        )
-        formatted = []
-        for obj in response.objects:
-            props = obj.properties or {}
-            formatted.append(
-                {
-                    "_id": props.get("object_id"),
-                    "text": props.get(self.text_key),
-                    "document_id": props.get("document_id"),
-                    "user_id": props.get("user_id"),
-                    "score": obj.metadata.distance if obj.metadata else None,
-                }
-            )
-        return formatted
+            return_properties=self.chunk_properties,
+        )
+        return [
+            {**self._chunk_to_dict(obj), "score": obj.metadata.distance if obj.metadata else None}
+            for obj in response.objects
+        ]
+
+    def near_vector_documents(
+            self,
+            vector: list[float],
+            user_id: int,
+            limit: int = 10,
+            document_ids: Optional[list[str]] = None,
+    ) -> list[dict]:
+        response = self.documents_collection.query.near_vector(
+            near_vector=vector,
+            limit=limit,
+            filters=self._document_filters(user_id, document_ids),
+            return_metadata=["distance"],
+            return_properties=["user_id"],
+        )
+        return [
+            {"document_id": str(obj.uuid), "score": obj.metadata.distance if obj.metadata else None}
+            for obj in response.objects
+        ]
+
+    def near_vector_grouped(
+            self,
+            vector: list[float],
+            user_id: int,
+            groups: int = 5,
+            per_group: int = 3,
+            document_ids: Optional[list[str]] = None,
+    ) -> list[dict]:
+        # Grouped server-side: only groups * per_group objects come back.
+        response = self.chunks_collection.query.near_vector(
+            near_vector=vector,
+            filters=self._chunk_filters(user_id, document_ids),
+            group_by=GroupBy(prop="document_id", objects_per_group=per_group, number_of_groups=groups),
+            return_metadata=["distance"],
+            return_properties=self.chunk_properties,
+        )
+        return [
+            {
+                "document_id": group.name,
+                "score": group.min_distance,
+                "chunks": [
+                    {**self._chunk_to_dict(obj), "score": obj.metadata.distance if obj.metadata else None}
+                    for obj in group.objects
+                ],
+            }
+            for group in sorted(response.groups.values(), key=lambda group: group.min_distance)
+        ]
+
+    def bm25(
+            self,
+            query: str,
+            user_id: int,
+            limit: int = 5,
+            document_ids: Optional[list[str]] = None,
+            offset: int = 0,
+    ) -> list[dict]:
+        response = self.chunks_collection.query.bm25(
+            query=query,
+            limit=limit,
+            offset=offset or None,
+            filters=self._chunk_filters(user_id, document_ids),
+            return_metadata=["score"],
+            return_properties=self.chunk_properties,
+        )
+        return [
+            {**self._chunk_to_dict(obj), "score": obj.metadata.score if obj.metadata else None}
+            for obj in response.objects
+        ]
+
+    def similarity_search(self, query: str, user_id: int, limit: int = 5) -> list[dict]:
+        return self.near_vector(embed(query), user_id, limit)
+
+    def fetch_chunks(self, user_id: int, ordinals: dict[str, Iterable[int]]) -> list[dict]:
+        ordinals = {doc_id: list(wanted) for doc_id, wanted in ordinals.items() if wanted}
+        if not ordinals:
+            return []
+        response = self.chunks_collection.query.fetch_objects(
+            filters=self._ordinal_filters(user_id, ordinals),
+            limit=sum(len(wanted) for wanted in ordinals.values()),
+            return_properties=self.chunk_properties,
+        )
+        return [{**self._chunk_to_dict(item), "score": None} for item in response.objects]
 
     def find_chunks_by_user(self, user_id: int, limit: int = 5) -> list[dict]:
         filters = Filter.by_property("user_id").equal(user_id)
         response = self.chunks_collection.query.fetch_objects(
             limit=limit,
             filters=filters,
-            return_properties=[self.text_key, "document_id", "user_id", "object_id"],
-        )
-        items = response.objects
-        results = []
-        for item in items:
-            props = item.properties or {}
-            results.append(
-                {
-                    "_id": props.get("object_id"),
-                    "text": props.get(self.text_key),
-                    "document_id": props.get("document_id"),
-                    "user_id": props.get("user_id"),
-                }
+            return_properties=self.chunk_properties,
+        )
+        return [self._chunk_to_dict(item) for item in response.objects]
+
+    def iter_chunks(
+            self,
+            user_id: Optional[int] = None,
+            page_size: int = 500,
+            include_vector: bool = False,
+    ) -> Iterator[dict]:
+        """
+        Stream chunks page by page without loading them all into memory.
+
+        Without a user the collection cursor (iterator / after=) is used.
+        Weaviate's cursor API does not accept filters, so a user's chunks are
+        walked with keyset pagination on object_id instead. That needs
+        object_id to be field-tokenized; collections created before it was
+        are walked with the cursor and filtered here until they are rebuilt
+        with the reindex_collection command.
+
+        Args:
+            user_id: Optional user ID to restrict the walk to
+            page_size: Objects fetched per request
+            include_vector: Include each chunk's vector under "vector"
+
+        Returns:
+            Iterator of chunk dictionaries
+        """
+        return_properties = self.chunk_properties
+        if user_id is None or not self._keyset_walkable():
+            for item in self.chunks_collection.iterator(
+                    include_vector=include_vector,
+                    return_properties=return_properties,
+                    cache_size=page_size,
+            ):
+                if user_id is None or (item.properties or {}).get("user_id") == user_id:
+                    yield self._chunk_to_dict(item, include_vector)
+            return
+
+        last_id = None
+        while True:
+            filters = Filter.by_property("user_id").equal(user_id)
+            if last_id is not None:
+                filters = filters & Filter.by_property("object_id").greater_than(last_id)
+            response = self.chunks_collection.query.fetch_objects(
+                limit=page_size,
+                filters=filters,
+                sort=Sort.by_property("object_id"),
+                include_vector=include_vector,
+                return_properties=return_properties,
             )
-        return results
\ No newline at end of file
+            for item in response.objects:
+                yield self._chunk_to_dict(item, include_vector)
+            if len(response.objects) < page_size:
+                return
+            last_id = response.objects[-1].properties["object_id"]
+
+
+    def _keyset_walkable(self) -> bool:
+        """Whether object_id is field-tokenized, so it sorts and compares as a whole string."""
+        if self._keyset_ready is None:
+            properties = {prop.name: prop for prop in self.chunks_collection.config.get().properties}
+            object_id = properties.get("object_id")
+            self._keyset_ready = object_id is not None and object_id.tokenization == Tokenization.FIELD
+        return self._keyset_ready
+
+
+class AsyncWeaviateClient(WeaviateChunkMapping, AsyncVectorStore):
+    """
+    Search operations on Weaviate's async client. Schema management and
+    writes stay with WeaviateClient, which creates the collections.
+    """
+
+    def __init__(self):
+        self._configure()
+        self.client = weaviate.use_async_with_local(skip_init_checks=True, additional_config=additional_config())
+
+    async def connect(self) -> None:
+        await self.client.connect()
+        self.chunks_collection = self.client.collections.get(self.chunks_index)
+        self.documents_collection = self.client.collections.get(self.documents_index)
+
+    async def close(self) -> None:
+        await self.client.close()
+
+    async def near_vector(
+            self,
+            vector: list[float],
+            user_id: int,
+            limit: int = 5,
+            document_ids: Optional[list[str]] = None,
+            offset: int = 0,
+    ) -> list[dict]:
+        response = await self.chunks_collection.query.near_vector(
+            near_vector=vector,
+            limit=limit,
+            offset=offset or None,
+            filters=self._chunk_filters(user_id, document_ids),
+            return_metadata=["distance"],
+            return_properties=self.chunk_properties,
+        )
+        return [
+            {**self._chunk_to_dict(obj), "score": obj.metadata.distance if obj.metadata else None}
+            for obj in response.objects
+        ]
+
+    async def near_vector_documents(
+            self,
+            vector: list[float],
+            user_id: int,
+            limit: int = 10,
+            document_ids: Optional[list[str]] = None,
+    ) -> list[dict]:
+        response = await self.documents_collection.query.near_vector(
+            near_vector=vector,
+            limit=limit,
+            filters=self._document_filters(user_id, document_ids),
+            return_metadata=["distance"],
+            return_properties=["user_id"],
+        )
+        return [
+            {"document_id": str(obj.uuid), "score": obj.metadata.distance if obj.metadata else None}
+            for obj in response.objects
+        ]
+
+    async def bm25(
+            self,
+            query: str,
+            user_id: int,
+            limit: int = 5,
+            document_ids: Optional[list[str]] = None,
+            offset: int = 0,
+    ) -> list[dict]:
+        response = await self.chunks_collection.query.bm25(
+            query=query,
+            limit=limit,
+            offset=offset or None,
+            filters=self._chunk_filters(user_id, document_ids),
+            return_metadata=["score"],
+            return_properties=self.chunk_properties,
+        )
+        return [
+            {**self._chunk_to_dict(obj), "score": obj.metadata.score if obj.metadata else None}
+            for obj in response.objects
+        ]
+
+    async def fetch_chunks(self, user_id: int, ordinals: dict[str, Iterable[int]]) -> list[dict]:
+        ordinals = {doc_id: list(wanted) for doc_id, wanted in ordinals.items() if wanted}
+        if not ordinals:
+            return []
+        response = await self.chunks_collection.query.fetch_objects(
+            filters=self._ordinal_filters(user_id, ordinals),
+            limit=sum(len(wanted) for wanted in ordinals.values()),
+            return_properties=self.chunk_properties,
+        )
+        return [{**self._chunk_to_dict(item), "score": None} for item in response.objects]
@@ -0,0 +1,85 @@
+"""
+Throughput benchmark for document chunking on the tests/test_documents corpus.
+
+Compares the shared RecursiveChunker against the LangChain splitter the
+Weaviate client used to build on every call, and the fixed-size slicer the
+Mongo client used.
+
+Usage: python tests/bench_chunking.py [--repeat 200] [--rounds 5]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from rag_engine.chunking import DEFAULT_SEPARATORS, get_chunker
+
+CORPUS_DIR = Path(__file__).resolve().parent / "test_documents"
+SIZE = 800
+OVERLAP = 150
+
+
+def langchain_per_call(text):
+    return RecursiveCharacterTextSplitter(
+        chunk_size=SIZE,
+        chunk_overlap=OVERLAP,
+        separators=list(DEFAULT_SEPARATORS),
+    ).split_text(text)
+
+
+def fixed_slices(text):
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = start + SIZE
+        chunks.append(text[start:end])
+        start = end - OVERLAP
+    return chunks
+
+
+def recursive_chunker(text):
+    return get_chunker(SIZE, OVERLAP).split_text(text)
+
+
+def recursive_chunker_tokens(text):
+    return get_chunker(200, 40, "tokens").split_text(text)
+
+
+def measure(fn, documents, rounds):
+    total_bytes = sum(len(doc.encode("utf-8")) for doc in documents)
+    best = float("inf")
+    chunks = 0
+    for _ in range(rounds):
+        started = time.perf_counter()
+        chunks = sum(len(fn(doc)) for doc in documents)
+        best = min(best, time.perf_counter() - started)
+    return total_bytes / best / 1_000_000, chunks
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=200, help="Times each corpus file is concatenated")
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    documents = [path.read_text("utf-8") * args.repeat for path in sorted(CORPUS_DIR.glob("*.txt"))]
+    size_mb = sum(len(doc.encode("utf-8")) for doc in documents) / 1_000_000
+    print(f"Corpus: {len(documents)} documents, {size_mb:.1f} MB")
+
+    for name, fn in (
+            ("langchain splitter (per call)", langchain_per_call),
+            ("fixed slices (mongo)", fixed_slices),
+            ("RecursiveChunker chars", recursive_chunker),
+            ("RecursiveChunker tokens", recursive_chunker_tokens),
+    ):
+        throughput, chunks = measure(fn, documents, args.rounds)
+        print(f"{name:<32} {throughput:8.1f} MB/s  {chunks:>7} chunks")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Recall / latency benchmark for two-stage semantic search on the local backend.
+
+Builds a synthetic corpus in a temporary LocalVectorStore: documents drawn
+around a number of topics, chunks drawn around their document. Flat chunk
+search (exact for this backend) is the reference; two-stage search first
+picks the D nearest documents by pooled vector and only searches their
+chunks.
+
+Sample run (1000 documents x 20 chunks, dimension 64, k=5): flat 13.3 ms/query;
+two-stage D=10 2.2 ms at recall 0.97, D=20 2.9 ms at 0.99, D=100 4.2 ms at 1.00.
+
+Usage: python tests/bench_two_stage.py [--documents 2000] [--chunks 20] [--queries 200]
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from rag_engine import local_store
+from rag_engine.local_store import LocalVectorStore
+from rag_engine.vectors import pool_vectors
+
+USER_ID = 1
+
+
+def build_corpus(store, rng, documents, chunks_per_document, dimension, topics):
+    centers = rng.normal(size=(topics, dimension))
+    vectors_by_text = {}
+    local_store.embed_many = lambda texts: [vectors_by_text[text] for text in texts]
+
+    chunk_vectors = []
+    for doc_index in range(documents):
+        doc_id = f"doc-{doc_index}"
+        doc_center = centers[doc_index % topics] + rng.normal(scale=0.6, size=dimension)
+        matrix = doc_center + rng.normal(scale=0.8, size=(chunks_per_document, dimension))
+        texts = [f"{doc_id} chunk {i}" for i in range(chunks_per_document)]
+        vectors_by_text.update({text: vector.tolist() for text, vector in zip(texts, matrix)})
+        store.create_document(doc_id, USER_ID, f"{doc_id}.txt", "local", False, "")
+        vectors = store.store_chunks(texts, doc_id, USER_ID)
+        store.update_document(doc_id, {"processed": True}, vector=pool_vectors(vectors))
+        chunk_vectors.append(matrix)
+    return np.concatenate(chunk_vectors)
+
+
+def timed(fn, queries):
+    results = []
+    started = time.perf_counter()
+    for query in queries:
+        results.append(fn(query))
+    return results, (time.perf_counter() - started) / len(queries) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--documents", type=int, default=2000)
+    parser.add_argument("--chunks", type=int, default=20, help="Chunks per document")
+    # Low by default: with isotropic noise, high dimensions make topics trivially separable.
+    parser.add_argument("--dimension", type=int, default=64)
+    parser.add_argument("--topics", type=int, default=50)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--candidates", type=int, nargs="+", default=[5, 10, 20, 50, 100])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as path, LocalVectorStore(path=path) as store:
+        chunk_matrix = build_corpus(store, rng, args.documents, args.chunks, args.dimension, args.topics)
+        print(f"Corpus: {args.documents} documents, {len(chunk_matrix)} chunks, dimension {args.dimension}")
+
+        picks = rng.integers(0, len(chunk_matrix), size=args.queries)
+        queries = [(chunk_matrix[i] + rng.normal(scale=1.5, size=args.dimension)).tolist() for i in picks]
+
+        def flat(query):
+            return {hit["_id"] for hit in store.near_vector(query, USER_ID, limit=args.k)}
+
+        reference, flat_ms = timed(flat, queries)
+        print(f"{'flat':<16} {flat_ms:8.2f} ms/query  recall@{args.k} 1.000")
+
+        for candidates in args.candidates:
+            def two_stage(query):
+                documents = store.near_vector_documents(query, USER_ID, limit=candidates)
+                document_ids = [document["document_id"] for document in documents]
+                return {hit["_id"] for hit in store.near_vector(query, USER_ID, args.k, document_ids=document_ids)}
+
+            found, ms = timed(two_stage, queries)
+            recall = np.mean([len(a & b) / len(a) for a, b in zip(reference, found)])
+            print(f"{f'two-stage D={candidates}':<16} {ms:8.2f} ms/query  recall@{args.k} {recall:.3f}")
+
+
+if __name__ == "__main__":
+    main()
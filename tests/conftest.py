@@ -0,0 +1,53 @@
+import fakeredis
+import pytest
+import redis
+import redis.asyncio
+from django.core.cache import cache
+
+from rag_engine import local_store
+from rag_engine.local_store import LocalVectorStore
+
+VOCABULARY = ["jwt", "token", "refresh", "django", "session", "cache", "index", "query"]
+
+
+def fake_embed_many(texts):
+    # Bag-of-words vectors over a tiny vocabulary: deterministic and offline.
+    return [[float(text.lower().count(word)) + 0.01 for word in VOCABULARY] for text in texts]
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    # Query vectors, fused rankings and corpus generations are keyed by user id.
+    cache.clear()
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    """Redis clients made from a URL, sync and async, share one in-memory fake server."""
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(redis.Redis, "from_url", classmethod(lambda cls, url: fakeredis.FakeRedis(server=server)))
+    monkeypatch.setattr(
+        redis.asyncio.Redis, "from_url", classmethod(lambda cls, url: fakeredis.FakeAsyncRedis(server=server)),
+    )
+    return server
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(local_store, "embed_many", fake_embed_many)
+    store = LocalVectorStore(path=str(tmp_path))
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def populated(store):
+    store.create_document("doc-1", 1, "auth.txt", "local", False, "")
+    store.store_chunks(
+        ["JWT token refresh flow", "Django session cache", "Query index tuning"],
+        "doc-1",
+        user_id=1,
+    )
+    store.create_document("doc-2", 2, "other.txt", "local", False, "")
+    store.store_chunks(["JWT token for another user"], "doc-2", user_id=2)
+    return store
@@ -0,0 +1,42 @@
+"""
+Django settings for the test suite: the project settings on SQLite and a
+local-memory cache, so tests need neither Postgres nor Redis.
+"""
+
+import os
+import tempfile
+
+for name, value in {
+    "DEBUG": "False",
+    "SECRET_KEY": "test-secret-key",
+    "REDIS_URL": "redis://localhost:6379/15",
+    "DB_NAME": "test",
+    "DB_USER": "test",
+    "DB_PASSWORD": "test",
+    "DB_HOST": "localhost",
+    "DB_PORT": "5432",
+    "ADMISSION_CONTROL": "off",
+}.items():
+    os.environ.setdefault(name, value)
+
+from config.settings import *  # noqa: E402,F401,F403
+
+DATABASES = {
+    "default": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": ":memory:",
+    }
+}
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    }
+}
+
+# The local-memory cache above is deliberate.
+SILENCED_SYSTEM_CHECKS = ["rag_engine.W001"]
+
+PASSWORD_HASHERS = ["django.contrib.auth.hashers.MD5PasswordHasher"]
+
+MEDIA_ROOT = tempfile.mkdtemp(prefix="rag-test-media-")
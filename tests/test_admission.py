@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory
+from prometheus_client import REGISTRY
+
+from config import middleware
+from config.middleware import AdmissionControlMiddleware, RouteLimits
+
+
+@pytest.fixture
+def server(fake_redis, monkeypatch):
+    monkeypatch.setattr(middleware, "ADMISSION_CONTROL", True)
+    monkeypatch.setattr(middleware, "QUEUE_TIMEOUT", 0.2)
+    return fake_redis
+
+
+def limit(monkeypatch, burst=10, concurrency=5, global_in_flight=100):
+    limits = RouteLimits(rate=0.001, burst=burst, concurrency=concurrency)
+    monkeypatch.setattr(middleware, "ADMISSION_ROUTES", {"/api/chat": ("chat", limits)})
+    monkeypatch.setattr(middleware, "GLOBAL_IN_FLIGHT", global_in_flight)
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, {"route": "chat", **labels}) or 0
+
+
+def outcomes(outcome):
+    return sample("rag_admission_requests_total", outcome=outcome)
+
+
+def request(client="10.0.0.1"):
+    return RequestFactory().post("/api/chat/", REMOTE_ADDR=client)
+
+
+def test_bucket_exhaustion_is_429(server, monkeypatch):
+    limit(monkeypatch, burst=2)
+    admission = AdmissionControlMiddleware(lambda request: HttpResponse("ok"))
+    before = outcomes("rate_limited")
+
+    assert [admission(request()).status_code for _ in range(2)] == [200, 200]
+    response = admission(request())
+    assert response.status_code == 429
+    assert int(response["Retry-After"]) >= 1
+    assert admission(request("10.0.0.2")).status_code == 200  # buckets are per client
+    assert outcomes("rate_limited") == before + 1
+
+
+def test_user_concurrency_is_429_without_spending_a_token(server, monkeypatch):
+    limit(monkeypatch, burst=2, concurrency=1)
+    admission = AdmissionControlMiddleware(lambda request: StreamingHttpResponse(iter(["a", "b"])))
+    before = outcomes("user_concurrency")
+
+    streaming = admission(request())
+    busy = admission(request())
+    assert busy.status_code == 429
+    assert outcomes("user_concurrency") == before + 1
+
+    # The stream's slot is released once it ends; the busy request left the second token.
+    assert b"".join(streaming.streaming_content) == b"ab"
+    assert admission(request()).status_code == 200
+
+
+def test_global_cap_is_503_with_retry_after_after_queue_timeout(server, monkeypatch):
+    limit(monkeypatch, global_in_flight=1)
+    admission = AdmissionControlMiddleware(lambda request: StreamingHttpResponse(iter(["a"])))
+    waited = sample("rag_admission_queue_wait_seconds_total")
+
+    streaming = admission(request("10.0.0.1"))
+    response = admission(request("10.0.0.2"))
+    assert response.status_code == 503
+    assert response["Retry-After"] == "1"
+    assert sample("rag_admission_queue_wait_seconds_total") - waited >= 0.1
+    assert sample("rag_admission_queued") == 0
+
+    list(streaming.streaming_content)
+    assert admission(request("10.0.0.2")).status_code == 200
+
+
+def test_async_stream_holds_its_slot_until_it_ends(server, monkeypatch):
+    limit(monkeypatch, concurrency=1)
+
+    async def content():
+        yield "a"
+        yield "b"
+
+    async def view(request):
+        return StreamingHttpResponse(content())
+
+    admission = AdmissionControlMiddleware(view)
+    in_flight = sample("rag_admission_in_flight")
+
+    async def main():
+        streaming = await admission(request())
+        assert sample("rag_admission_in_flight") == in_flight + 1
+        assert (await admission(request())).status_code == 429
+        assert b"".join([part async for part in streaming.streaming_content]) == b"ab"
+        assert sample("rag_admission_in_flight") == in_flight
+        assert (await admission(request())).status_code == 200
+
+    asyncio.run(main())
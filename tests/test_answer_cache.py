@@ -0,0 +1,57 @@
+import numpy as np
+
+from rag_engine.answer_cache import CachedAnswer, SemanticAnswerCache
+
+
+def unit(seed, dimension=16):
+    vector = np.random.default_rng(seed).normal(size=dimension)
+    return vector / np.linalg.norm(vector)
+
+
+def test_paraphrase_hits_within_threshold():
+    cache = SemanticAnswerCache(threshold=0.9, capacity=4)
+    question = unit(0)
+    cache.store(1, question.tolist(), 0, CachedAnswer("how do I refresh a JWT", "POST api/token/refresh", ["c1"]))
+
+    paraphrase = question + 0.1 * unit(1)
+    hit = cache.lookup(1, paraphrase.tolist(), 0)
+    assert hit is not None and hit.answer == "POST api/token/refresh" and hit.similarity >= 0.9
+    assert cache.lookup(1, unit(2).tolist(), 0) is None
+    assert cache.lookup(2, question.tolist(), 0) is None  # other users never hit
+
+
+def test_generation_change_and_eviction():
+    cache = SemanticAnswerCache(threshold=0.99, capacity=2)
+    vectors = [unit(seed) for seed in range(3)]
+    for i, vector in enumerate(vectors):
+        cache.store(1, vector.tolist(), 0, CachedAnswer(f"q{i}", f"a{i}"))
+
+    assert cache.lookup(1, vectors[0].tolist(), 0) is None  # oldest replaced
+    assert cache.lookup(1, vectors[2].tolist(), 0).answer == "a2"
+    assert cache.lookup(1, vectors[2].tolist(), 1) is None  # corpus changed
+    assert cache.lookup(1, vectors[1].tolist(), 0) is None  # entries were dropped
+
+
+def test_matrix_grows_on_demand_and_stays_a_ring():
+    cache = SemanticAnswerCache(threshold=0.99, capacity=20)
+    vectors = [unit(seed) for seed in range(25)]
+    cache.store(1, vectors[0].tolist(), 0, CachedAnswer("q0", "a0"))
+    assert cache._users[1].matrix.shape == (8, 16)
+
+    for i, vector in enumerate(vectors[1:], start=1):
+        cache.store(1, vector.tolist(), 0, CachedAnswer(f"q{i}", f"a{i}"))
+    assert cache._users[1].matrix.shape == (20, 16)
+    assert all(cache.lookup(1, vectors[i].tolist(), 0) is None for i in range(5))
+    assert all(cache.lookup(1, vectors[i].tolist(), 0).answer == f"a{i}" for i in range(5, 25))
+
+
+def test_least_recently_used_user_is_dropped():
+    cache = SemanticAnswerCache(threshold=0.99, capacity=4, max_users=2)
+    question = unit(0)
+    for user_id in (1, 2):
+        cache.store(user_id, question.tolist(), 0, CachedAnswer("q", f"a{user_id}"))
+    assert cache.lookup(1, question.tolist(), 0).answer == "a1"  # user 2 is now the oldest
+
+    cache.store(3, question.tolist(), 0, CachedAnswer("q", "a3"))
+    assert cache.lookup(2, question.tolist(), 0) is None
+    assert [cache.lookup(user_id, question.tolist(), 0).answer for user_id in (1, 3)] == ["a1", "a3"]
@@ -0,0 +1,77 @@
+import asyncio
+import json
+
+from django.contrib.auth.models import User
+from django.http import JsonResponse
+from django.test import RequestFactory
+from rest_framework.authentication import BaseAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.throttling import BaseThrottle
+
+from config.async_views import AsyncAPIView
+
+
+class TokenAuthentication(BaseAuthentication):
+    def authenticate(self, request):
+        header = request.META.get("HTTP_AUTHORIZATION")
+        if header is None:
+            return None
+        if header != "Token good":
+            raise AuthenticationFailed("Invalid token.")
+        return User(id=7, username="reader"), None
+
+    def authenticate_header(self, request):
+        return "Token"
+
+
+class EchoView(AsyncAPIView):
+    authentication_classes = [TokenAuthentication]
+    throttle_classes = []
+
+    async def post(self, request):
+        error = await self.initial(request)
+        if error is not None:
+            return error
+        return JsonResponse({"user": self.user.id, "question": self.data.get("question")})
+
+
+class ExhaustedThrottle(BaseThrottle):
+    def allow_request(self, request, view):
+        return False
+
+    def wait(self):
+        return 2.5
+
+
+def call(view_class, request):
+    response = asyncio.run(view_class.as_view()(request))
+    return response.status_code, json.loads(response.content), response
+
+
+def test_json_and_form_bodies_are_parsed():
+    factory = RequestFactory()
+    requests = (
+        factory.post("/echo", {"question": "why?"}, content_type="application/json", HTTP_AUTHORIZATION="Token good"),
+        factory.post("/echo", {"question": "why?"}, HTTP_AUTHORIZATION="Token good"),
+    )
+    for request in requests:
+        assert call(EchoView, request)[:2] == (200, {"user": 7, "question": "why?"})
+
+
+def test_unauthenticated_and_invalid_credentials_get_401_with_challenge():
+    factory = RequestFactory()
+    status, body, response = call(EchoView, factory.post("/echo", {}))
+    assert (status, body) == (401, {"detail": "Authentication credentials were not provided."})
+    assert response["WWW-Authenticate"] == "Token"
+    status, body, _ = call(EchoView, factory.post("/echo", {}, HTTP_AUTHORIZATION="Token bad"))
+    assert (status, body) == (401, {"detail": "Invalid token."})
+
+
+def test_throttles_apply():
+    class ThrottledView(EchoView):
+        throttle_classes = [ExhaustedThrottle]
+
+    request = RequestFactory().post("/echo", {"question": "q"}, HTTP_AUTHORIZATION="Token good")
+    status, _, response = call(ThrottledView, request)
+    assert status == 429
+    assert response["Retry-After"] == "3"
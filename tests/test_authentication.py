@@ -0,0 +1,58 @@
+import logging
+
+import pytest
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from rest_framework_simplejwt.tokens import AccessToken
+
+from chat.models import ChatSession
+from users.authentication import CachedJWTAuthentication
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def user():
+    return User.objects.create_user(username="reader", email="reader@example.com", password="secret")
+
+
+@pytest.fixture
+def authenticate(user):
+    token = str(AccessToken.for_user(user))
+
+    def authenticate():
+        authentication = CachedJWTAuthentication()
+        return authentication.get_user(authentication.get_validated_token(token))
+    return authenticate
+
+
+def test_cached_user_keeps_integer_pk_for_ownership_checks(user, authenticate, django_assert_num_queries):
+    session = ChatSession.objects.create(user=user)
+    authenticate()
+    with django_assert_num_queries(0):
+        cached = authenticate()
+
+    assert cached.pk == user.pk and isinstance(cached.pk, int)
+    assert session.user_id == cached.id
+    assert ChatSession.objects.filter(id=session.id, user=cached).exists()
+
+
+def test_cached_user_defers_uncached_fields(authenticate, django_assert_num_queries):
+    authenticate()
+    cached = authenticate()
+    assert "password" in cached.get_deferred_fields()
+    assert (cached.username, cached.email, cached.is_active) == ("reader", "reader@example.com", True)
+    with django_assert_num_queries(1):
+        assert cached.check_password("secret")
+
+
+def test_cache_outage_does_not_fail_user_saves(user, monkeypatch, caplog):
+    def unavailable(*args, **kwargs):
+        raise ConnectionError("cache down")
+
+    monkeypatch.setattr(cache, "set", unavailable)
+    user.email = "new@example.com"
+    with caplog.at_level(logging.WARNING, logger="users.signals"):
+        user.save()
+    assert User.objects.get(pk=user.pk).email == "new@example.com"
+    assert "Could not invalidate cached user" in caplog.text
@@ -0,0 +1,111 @@
+import base64
+from unittest.mock import Mock
+
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from documents import api, serializers
+from documents.api import DocumentDetail, DocumentList, UploadDocument
+from documents.catalog import document_count
+from documents.models import Document
+from rag_engine.local_store import LocalVectorStore
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def user(django_user_model):
+    return django_user_model.objects.create_user(username="owner", password="pw")
+
+
+@pytest.fixture
+def uploads(tmp_path, monkeypatch, store):
+    path = str(tmp_path)
+    monkeypatch.setattr(serializers, "get_vector_store", lambda: LocalVectorStore(path=path))
+    monkeypatch.setattr(api, "get_vector_store", lambda: LocalVectorStore(path=path))
+    monkeypatch.setattr(serializers, "progress", Mock())
+    monkeypatch.setattr(serializers.process_document, "delay", Mock())
+
+
+def documents_for(user, count):
+    documents = [Document.objects.create(owner=user, filename=f"{i}.txt") for i in range(count)]
+    # Bulk imports and clock granularity give many rows the same timestamp.
+    Document.objects.filter(owner=user).update(uploaded_at=timezone.now())
+    return documents
+
+
+def get_list(user, **params):
+    request = APIRequestFactory().get("/api/documents", params)
+    force_authenticate(request, user=user)
+    return DocumentList.as_view()(request)
+
+
+def upload(user, name):
+    request = APIRequestFactory().post(
+        "/api/upload",
+        {"files": [SimpleUploadedFile(name, b"Refresh tokens rotate on every use.", content_type="text/plain")]},
+        format="multipart",
+    )
+    force_authenticate(request, user=user)
+    return UploadDocument.as_view()(request)
+
+
+def test_pages_continue_across_tied_timestamps(user):
+    documents = documents_for(user, 7)
+    seen, cursor = [], None
+    while True:
+        response = get_list(user, limit=3, **({"cursor": cursor} if cursor else {}))
+        assert response.status_code == 200
+        seen += [result["id"] for result in response.data["results"]]
+        cursor = response.data["next"]
+        if cursor is None:
+            break
+        # A concurrent upload is newer than every listed row: no repeats, no shift.
+        Document.objects.create(owner=user, filename="late.txt")
+
+    assert seen == [str(document.document_id) for document in reversed(documents)]
+
+
+@pytest.mark.parametrize("cursor", ["not base64!", base64.urlsafe_b64encode(b"yesterday|one").decode()])
+def test_invalid_cursor_is_400(user, cursor):
+    response = get_list(user, cursor=cursor)
+    assert response.status_code == 400
+    assert response.data == {"detail": "Invalid cursor."}
+
+
+def test_count_is_dropped_on_upload_and_delete(user, uploads, django_capture_on_commit_callbacks):
+    documents_for(user, 2)
+    assert get_list(user).data["count"] == 2
+
+    with django_capture_on_commit_callbacks(execute=True):
+        response = upload(user, "new.txt")
+    assert response.status_code == 201
+    assert document_count(user.id) == 3
+    assert get_list(user).data["count"] == 3
+
+    request = APIRequestFactory().delete(f"/api/documents/{response.data['document_ids'][0]}")
+    force_authenticate(request, user=user)
+    assert DocumentDetail.as_view()(request, document_id=response.data["document_ids"][0]).status_code == 200
+    assert get_list(user).data["count"] == 2
+
+
+def test_replacement_rehomes_references_before_reingesting(user, uploads, monkeypatch, django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        document_id = upload(user, "old.txt").data["document_ids"][0]
+    monkeypatch.setattr(serializers, "DEDUP_INDEX_BACKEND", "sqlite")
+
+    request = APIRequestFactory().put(
+        f"/api/documents/{document_id}",
+        {"file": SimpleUploadedFile("new.txt", b"Access tokens expire.", content_type="text/plain")},
+        format="multipart",
+    )
+    force_authenticate(request, user=user)
+    with django_capture_on_commit_callbacks() as callbacks:
+        assert DocumentDetail.as_view()(request, document_id=document_id).status_code == 200
+
+    [workflow] = [callback.__self__ for callback in callbacks if getattr(callback, "__name__", "") == "delay"]
+    assert [task.task for task in workflow.tasks] == ["documents.tasks.rehome_references", "documents.tasks.process_document"]
+    assert workflow.tasks[0].args == (document_id, user.id)
+    assert workflow.tasks[1].kwargs["filename"] == "new.txt"
@@ -0,0 +1,15 @@
+from django.test import override_settings
+
+from rag_engine.checks import check_shared_cache
+
+
+def test_warns_on_process_local_cache():
+    with override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}):
+        warnings = check_shared_cache(None)
+    assert [warning.id for warning in warnings] == ["rag_engine.W001"]
+
+
+def test_shared_cache_passes():
+    caches = {"default": {"BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": "redis://cache:6379/1"}}
+    with override_settings(CACHES=caches):
+        assert check_shared_cache(None) == []
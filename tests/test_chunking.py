@@ -0,0 +1,72 @@
+from pathlib import Path
+
+from rag_engine import chunking
+from rag_engine.chunking import Chunk, RecursiveChunker, chunk_text, count_tokens, get_chunker, merge_chunks
+
+CORPUS_DIR = Path(__file__).resolve().parent / "test_documents"
+
+
+def load_corpus():
+    return [path.read_text("utf-8") for path in sorted(CORPUS_DIR.glob("*.txt"))]
+
+
+def test_offsets_point_into_source_text():
+    for text in load_corpus():
+        for chunk in chunk_text(text, size=800, overlap=150):
+            assert text[chunk.start:chunk.end] == chunk.text
+            assert 0 < len(chunk.text) <= 800
+
+
+def test_chunks_cover_text_in_order_with_overlap():
+    text = load_corpus()[0]
+    chunks = chunk_text(text, size=300, overlap=60)
+    assert len(chunks) > 1
+    for previous, current in zip(chunks, chunks[1:]):
+        assert previous.start < current.start
+        assert current.start <= previous.end + 2
+    assert chunks[0].start == len(text) - len(text.lstrip())
+    assert chunks[-1].end == len(text.rstrip())
+
+
+def test_hard_split_without_separators():
+    chunks = RecursiveChunker(size=10, overlap=0).split_text("x" * 35)
+    assert chunks == ["x" * 10, "x" * 10, "x" * 10, "x" * 5]
+
+
+def test_token_sizing():
+    text = load_corpus()[1]
+    chunks = chunk_text(text, size=100, overlap=20, unit="tokens")
+    assert len(chunks) > 1
+    assert all(count_tokens(chunk.text) <= 110 for chunk in chunks)
+
+
+def test_chunker_configuration_is_cached():
+    assert get_chunker(500, 50) is get_chunker(500, 50)
+
+
+def test_merge_chunks_stitches_overlap_once():
+    text = load_corpus()[0]
+    chunks = chunk_text(text, size=300, overlap=50)
+    i = next(i for i in range(len(chunks) - 1) if chunks[i + 1].start < chunks[i].end)
+    merged = merge_chunks([chunks[i + 1], chunks[i]])
+    assert merged == [Chunk(text[chunks[i].start:chunks[i + 1].end], chunks[i].start, chunks[i + 1].end)]
+    assert merge_chunks([chunks[i], chunks[i + 3]]) == [chunks[i], chunks[i + 3]]
+
+
+def test_overlap_after_paragraph_breaks():
+    paragraphs = [" ".join(f"word{i}_{j}" for j in range(8 + i % 17)) + "." for i in range(60)]
+    text = "\n\n".join(paragraphs)
+    chunks = chunk_text(text, size=300, overlap=60)
+    assert len(chunks) > 10
+    for previous, current in zip(chunks, chunks[1:]):
+        assert current.start < previous.end
+        assert current.end > previous.end
+        assert previous.end - current.start <= 60
+
+
+def test_token_starts_reuses_cached_encoding():
+    chunking.token_starts("warm up")
+    misses = chunking._get_encoding.cache_info().misses
+    chunking.token_starts("first call")
+    chunking.token_starts("second call")
+    assert chunking._get_encoding.cache_info().misses == misses
@@ -0,0 +1,162 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from prometheus_client import REGISTRY
+
+from rag_engine import deadline, embeddings, generation, weaviate_client
+from rag_engine.deadline import Deadline, DeadlineExceeded, LatencyWindow, deadline_scope
+
+
+def test_scope_keeps_the_earlier_deadline():
+    assert deadline.timeout(30) == 30
+    with deadline_scope(Deadline.after(1)):
+        assert deadline.timeout(30) <= 1
+        with deadline_scope(Deadline.after(60)):
+            assert deadline.timeout(30) <= 1
+        with deadline_scope(Deadline.after(-1)), pytest.raises(DeadlineExceeded):
+            deadline.timeout(30)
+    assert deadline.current() is None
+
+
+def test_wait_for_cancels_at_the_deadline():
+    async def slow():
+        await asyncio.sleep(5)
+
+    async def main():
+        with deadline_scope(Deadline.after(0.05)):
+            await deadline.wait_for(slow(), "vector search")
+
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(main())
+    assert time.monotonic() - started < 1
+
+
+def test_latency_window_percentile():
+    window = LatencyWindow(size=100, min_samples=10)
+    assert window.percentile(95) is None
+    for ms in range(1, 101):
+        window.observe(ms / 1000)
+    assert window.percentile(95) == pytest.approx(0.095)
+
+
+def test_slow_embed_is_hedged(monkeypatch):
+    calls = []
+
+    async def fake_post(path, payload):
+        calls.append(path)
+        await asyncio.sleep(1 if len(calls) == 1 else 0.01)
+        return {"embedding": [float(len(calls))]}
+
+    window = LatencyWindow(min_samples=1)
+    window.observe(0.02)
+    monkeypatch.setattr(embeddings, "EMBED_HEDGE", True)
+    monkeypatch.setattr(embeddings, "embed_latency", window)
+    monkeypatch.setattr(embeddings, "_apost", fake_post)
+
+    hedge_wins = REGISTRY.get_sample_value("rag_embed_hedges_total", {"winner": "hedge"}) or 0
+    started = time.monotonic()
+    assert asyncio.run(embeddings.aembed("q")) == [2.0]
+    assert len(calls) == 2 and time.monotonic() - started < 0.5
+    assert REGISTRY.get_sample_value("rag_embed_hedges_total", {"winner": "hedge"}) == hedge_wins + 1
+
+
+@pytest.fixture
+def ollama(monkeypatch):
+    """A fake Ollama whose n-th embedding request takes delays[n] seconds and answers [n]."""
+    delays, calls = [], []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers["Content-Length"]))
+            calls.append(self.path)
+            call = len(calls)
+            time.sleep(delays[call - 1])
+            body = json.dumps({"embedding": [float(call)]}).encode()
+            try:
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            except OSError:
+                pass  # the client aborted
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(embeddings, "OLLAMA_URL", f"http://127.0.0.1:{server.server_address[1]}")
+    yield delays, calls
+    server.shutdown()
+    server.server_close()
+
+
+def test_slow_sync_embed_is_hedged_from_the_calling_thread(monkeypatch, ollama):
+    delays, calls = ollama
+    delays += [1, 0.01]
+    window = LatencyWindow(min_samples=1)
+    window.observe(0.05)
+    monkeypatch.setattr(embeddings, "EMBED_HEDGE", True)
+    monkeypatch.setattr(embeddings, "embed_latency", window)
+
+    callers = []
+    send = embeddings._EmbeddingRequest.send
+    monkeypatch.setattr(
+        embeddings._EmbeddingRequest, "send",
+        lambda request: callers.append(threading.current_thread().name) or send(request),
+    )
+
+    started = time.monotonic()
+    assert embeddings.embed("q") == [2.0]
+    assert time.monotonic() - started < 0.5
+    assert len(calls) == 2
+    assert callers[0] == threading.current_thread().name
+    assert callers[1].startswith("embed-hedge")
+    # The aborted primary's latency is recorded too.
+    assert len(window.samples) == 3
+
+
+def test_timed_out_embed_records_its_latency(monkeypatch, ollama):
+    delays, _ = ollama
+    delays.append(1)
+    window = LatencyWindow(min_samples=1)
+    monkeypatch.setattr(embeddings, "embed_latency", window)
+
+    # The socket timeout ends at the deadline; whichever is noticed first is raised.
+    with deadline_scope(Deadline.after(0.1)), pytest.raises((DeadlineExceeded, RuntimeError)):
+        embeddings.embed("q")
+    assert len(window.samples) == 1 and window.samples[0] >= 0.09
+
+
+def test_sync_weaviate_query_timeout_is_capped_at_the_deadline(monkeypatch):
+    configs = []
+
+    def connect_to_local(**kwargs):
+        configs.append(kwargs["additional_config"])
+        raise ConnectionError("no weaviate in tests")
+
+    monkeypatch.setattr(weaviate_client.weaviate, "connect_to_local", connect_to_local)
+    with deadline_scope(Deadline.after(2)), pytest.raises(ConnectionError):
+        weaviate_client.WeaviateClient()
+    with pytest.raises(ConnectionError):
+        weaviate_client.WeaviateClient()
+    assert configs[0].timeout.query <= 2
+    assert configs[1].timeout.query == weaviate_client.QUERY_TIMEOUT
+
+
+def test_async_generation_client_per_event_loop(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+
+    async def clients():
+        return generation.get_async_client(), generation.get_async_client()
+
+    first, again = asyncio.run(clients())
+    second, _ = asyncio.run(clients())
+    assert first is again
+    assert first is not second
@@ -0,0 +1,117 @@
+from functools import partial
+from unittest.mock import Mock
+from uuid import UUID, uuid4
+
+import pytest
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from conftest import fake_embed_many
+
+from documents import api, tasks
+from rag_engine import dedup
+from rag_engine.chunking import chunk_text
+from rag_engine.dedup import SQLiteSignatureIndex, minhash, similarity
+from rag_engine.local_store import LocalVectorStore
+from rag_engine.search import SearchRag
+from rag_engine.vector_store import chunk_uuid
+
+DISCLAIMER = (
+    "Confidential. This document is the property of Example Corp and may not be distributed, copied or "
+    "disclosed without the prior written permission of the legal department. If you received it in error, "
+    "notify the sender and delete every copy. Retention follows policy {policy}."
+)
+
+
+def test_minhash_estimates_similarity():
+    first, second = minhash(DISCLAIMER.format(policy="R-12")), minhash(DISCLAIMER.format(policy="R-40"))
+    unrelated = minhash("Celery retries the ingestion task with exponential backoff after a broker failure.")
+    assert similarity(first, first) == 1.0
+    assert similarity(first, second) >= 0.8
+    assert similarity(first, unrelated) < 0.3
+
+
+def test_sqlite_index_finds_duplicates_and_forgets_documents(tmp_path):
+    with SQLiteSignatureIndex(path=str(tmp_path)) as index:
+        texts = [DISCLAIMER.format(policy="A"), "A unique paragraph about vector search. " * 3, DISCLAIMER.format(policy="B")]
+        signatures, matches = index.find_duplicates(1, texts)
+        assert matches == [None, None, "batch:0"]
+
+        index.add(1, "doc-1", [("chunk-a", signatures[0]), ("chunk-b", signatures[1])])
+        assert index.find_duplicates(1, [DISCLAIMER.format(policy="C")])[1] == ["chunk-a"]
+        assert index.find_duplicates(2, [DISCLAIMER.format(policy="C")])[1] == [None]
+
+        index.forget_document(1, "doc-1")
+        assert index.find_duplicates(1, [DISCLAIMER.format(policy="C")])[1] == [None]
+
+
+def test_redis_buckets_expire_after_their_ttl(fake_redis, monkeypatch):
+    monkeypatch.setattr(dedup, "DEDUP_BUCKET_TTL", 3600)
+    with dedup.RedisSignatureIndex() as index:
+        signature = minhash(DISCLAIMER.format(policy="A"))
+        index.add(1, "doc-1", [("chunk-a", signature)])
+        buckets = [index._bucket(1, band, key) for band, key in enumerate(dedup.band_keys(signature))]
+        assert all(0 < index.redis.ttl(bucket) <= 3600 for bucket in buckets)
+        assert index.redis.ttl("rag:minhash:1") == -1
+
+
+@pytest.fixture
+def ingestion(tmp_path, monkeypatch, store):
+    path = str(tmp_path)
+    monkeypatch.setattr(tasks, "get_vector_store", lambda: LocalVectorStore(path=path))
+    monkeypatch.setattr(api, "get_vector_store", lambda: LocalVectorStore(path=path))
+    monkeypatch.setattr(tasks, "get_signature_index", lambda: SQLiteSignatureIndex(path=path))
+    monkeypatch.setattr(dedup, "get_signature_index", lambda backend=None: SQLiteSignatureIndex(path=path))
+    dedup.search_signature_index.cache_clear()
+    monkeypatch.setattr(api, "DEDUP_INDEX_BACKEND", "sqlite")
+    monkeypatch.setattr(tasks, "progress", Mock())
+    monkeypatch.setattr(tasks, "chunk_text", partial(chunk_text, size=400, overlap=0))
+    monkeypatch.setattr(api.rehome_references, "delay", api.rehome_references)
+
+    def ingest(user, text):
+        doc_id = str(uuid4())
+        file_path = tmp_path / f"{doc_id}.txt"
+        file_path.write_text(text, "utf-8")
+        store.create_document(doc_id, user.id, file_path.name, "local", False, "", storage_path=str(file_path))
+        return doc_id, tasks.process_document(doc_id, user.id, str(file_path), filename=file_path.name)
+
+    yield ingest
+    dedup.search_signature_index.cache_clear()
+
+
+def keyword_hits(store, user, document_ids=None):
+    return SearchRag(client=store).search(
+        "confidential legal department", user.id, 5, "keyword", document_ids=document_ids
+    )
+
+
+@pytest.mark.django_db
+def test_skipped_chunk_stays_searchable_after_canonical_document_is_deleted(ingestion, store, django_user_model):
+    user = django_user_model.objects.create_user(username="owner", password="pw")
+    first, _ = ingestion(user, DISCLAIMER.format(policy="A") + "\n\n" + "Celery retries ingestion after a broker failure. " * 3)
+    text = "Vector search ranks chunks by cosine distance to the query. " * 3 + "\n\n" + DISCLAIMER.format(policy="B")
+    second, result = ingestion(user, text)
+    assert result["duplicate_chunks"] == 1
+
+    [hit] = keyword_hits(store, user, [second])
+    assert hit["document_id"] == second
+    assert text[hit["start_offset"]:hit["end_offset"]] == DISCLAIMER.format(policy="B")
+
+    request = APIRequestFactory().delete(f"/api/documents/{first}")
+    force_authenticate(request, user=user)
+    assert api.DocumentDetail.as_view()(request, document_id=UUID(first)).status_code == 200
+
+    for hits in (keyword_hits(store, user, [second]), keyword_hits(store, user)):
+        assert [(hit["document_id"], hit["text"]) for hit in hits] == [(second, DISCLAIMER.format(policy="B"))]
+    assert hits[0]["_id"] == chunk_uuid(second, 1)
+
+
+@pytest.mark.django_db
+def test_grouped_semantic_search_resolves_skipped_chunks(ingestion, store, django_user_model):
+    user = django_user_model.objects.create_user(username="owner", password="pw")
+    ingestion(user, DISCLAIMER.format(policy="A") + "\n\n" + "Celery retries ingestion after a broker failure. " * 3)
+    second, _ = ingestion(user, "Vector search ranks chunks by cosine distance to the query. " * 3 + "\n\n" + DISCLAIMER.format(policy="B"))
+
+    vector = fake_embed_many(["confidential legal department"])[0]
+    groups = SearchRag(client=store).grouped_search("", user.id, document_ids=[second], vector=vector)
+    assert [group["document_id"] for group in groups] == [second]
+    assert {chunk["_id"] for chunk in groups[0]["results"]} == {chunk_uuid(second, 0), chunk_uuid(second, 1)}
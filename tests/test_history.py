@@ -0,0 +1,135 @@
+import asyncio
+import json
+
+import pytest
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import RequestFactory
+from rest_framework.authentication import BaseAuthentication
+
+from chat import history as chat_history
+from chat import tasks as chat_tasks
+from chat.api import ChatView
+from chat.history import (
+    HISTORY_MESSAGES, SUMMARY_BATCH, compact_session, get_session, history_key, load_history, record_turn,
+)
+from chat.models import ChatSession, Message
+
+pytestmark = pytest.mark.django_db(transaction=True)
+
+
+@pytest.fixture
+def users():
+    return User.objects.create(username="owner"), User.objects.create(username="other")
+
+
+@pytest.fixture
+def queued(monkeypatch):
+    calls = []
+    monkeypatch.setattr(chat_tasks.compact_session, "delay", calls.append)
+    return calls
+
+
+@pytest.fixture
+def summaries(monkeypatch):
+    calls = []
+
+    def summarize(summary, messages):
+        calls.append([message.content for message in messages])
+        return f"{summary}+{len(messages)}"
+
+    monkeypatch.setattr(chat_history, "summarize", summarize)
+    return calls
+
+
+def chat(session, turns, start=0):
+    async def run():
+        history = await load_history(session)
+        for turn in range(start, start + turns):
+            await record_turn(session, history, f"q{turn}", f"a{turn}")
+        return history
+    return asyncio.run(run())
+
+
+def test_get_session_only_returns_own_sessions(users):
+    owner, other = users
+    session = ChatSession.objects.create(user=owner)
+    assert asyncio.run(get_session(owner, session.id)).id == session.id
+    assert asyncio.run(get_session(other, session.id)) is None
+
+
+def test_chat_on_another_users_session_is_404(users):
+    owner, other = users
+    session = ChatSession.objects.create(user=owner)
+
+    class OtherAuthentication(BaseAuthentication):
+        def authenticate(self, request):
+            return other, None
+
+    class OtherChatView(ChatView):
+        authentication_classes = [OtherAuthentication]
+        throttle_classes = []
+
+    request = RequestFactory().post("/chat", {"question": "hi"}, content_type="application/json")
+    response = asyncio.run(OtherChatView.as_view()(request, session_id=session.id))
+    assert response.status_code == 404
+    assert json.loads(response.content) == {"detail": "Chat session not found."}
+
+
+def test_load_history_reloads_from_database_on_cache_miss(users, queued):
+    session = ChatSession.objects.create(user=users[0], summary="earlier")
+    cached = chat(session, 2)
+    cache.delete(history_key(session.id))
+    reloaded = asyncio.run(load_history(session))
+    assert reloaded == cached
+    assert reloaded.summary == "earlier"
+    assert [message["content"] for message in reloaded.messages] == ["q0", "a0", "q1", "a1"]
+
+
+def test_cached_window_is_trimmed_and_compaction_queued_once(users, queued):
+    session = ChatSession.objects.create(user=users[0])
+    limit = HISTORY_MESSAGES + SUMMARY_BATCH
+    history = chat(session, limit)
+    assert len(history.messages) == limit
+    assert history.messages[0]["content"] == f"q{limit // 2}"
+    assert len(cache.get(history_key(session.id))["messages"]) == limit
+    assert queued == [session.id]
+    assert Message.objects.filter(session=session).count() == 2 * limit
+
+
+def test_compaction_folds_overflow_once(users, queued, summaries):
+    session = ChatSession.objects.create(user=users[0])
+    chat(session, (HISTORY_MESSAGES + SUMMARY_BATCH) // 2)
+
+    assert compact_session(session.id) == SUMMARY_BATCH
+    assert summaries == [["q0", "a0", "q1", "a1"]]
+    session.refresh_from_db()
+    assert session.summary == f"+{SUMMARY_BATCH}"
+    assert cache.get(history_key(session.id)) is None
+
+    # Nothing left to fold: no second LLM call.
+    assert compact_session(session.id) == 0
+    assert len(summaries) == 1
+
+    # The window is reloaded without the folded messages and compaction can be queued again.
+    history = chat(session, SUMMARY_BATCH // 2, start=100)
+    assert len(history.messages) == HISTORY_MESSAGES + SUMMARY_BATCH
+    assert history.messages[0]["content"] == f"q{SUMMARY_BATCH // 2}"
+    assert queued == [session.id, session.id]
+
+
+def test_overlapping_compaction_discards_its_summary(users, queued, monkeypatch):
+    session = ChatSession.objects.create(user=users[0])
+    chat(session, (HISTORY_MESSAGES + SUMMARY_BATCH) // 2)
+    first_pending = Message.objects.filter(session=session).order_by("id").first()
+
+    def summarize(summary, messages):
+        # Another compaction commits while this one is waiting on the LLM.
+        ChatSession.objects.filter(id=session.id).update(summary="theirs", summarized_through=first_pending.id)
+        return "ours"
+
+    monkeypatch.setattr(chat_history, "summarize", summarize)
+    assert compact_session(session.id) == 0
+    session.refresh_from_db()
+    assert (session.summary, session.summarized_through) == ("theirs", first_pending.id)
+    assert cache.get(history_key(session.id)) is None
@@ -0,0 +1,64 @@
+from unittest.mock import Mock
+
+import pytest
+
+from documents import tasks
+from documents.models import Document
+from rag_engine.local_store import LocalVectorStore
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def document(tmp_path, monkeypatch, store, django_user_model):
+    path = str(tmp_path)
+    monkeypatch.setattr(tasks, "get_vector_store", lambda: LocalVectorStore(path=path))
+    monkeypatch.setattr(tasks, "progress", Mock())
+    user = django_user_model.objects.create_user(username="owner", password="pw")
+    row = Document.objects.create(owner=user, filename="notes.txt")
+    file_path = tmp_path / "notes.txt"
+    file_path.write_text("Django session cache.\n\nJWT token refresh flow.", "utf-8")
+    store.create_document(str(row.document_id), user.id, "notes.txt", "local", False, "", storage_path=str(file_path))
+    return row, str(file_path)
+
+
+@pytest.fixture
+def transitions(monkeypatch):
+    statuses = []
+    set_document_status = tasks.set_document_status
+
+    def record(doc_id, status):
+        statuses.append(status)
+        set_document_status(doc_id, status)
+
+    monkeypatch.setattr(tasks, "set_document_status", record)
+    return statuses
+
+
+def test_processing_then_processed(document, transitions):
+    row, file_path = document
+    assert row.status == Document.Status.PENDING
+
+    tasks.process_document(str(row.document_id), row.owner_id, file_path)
+
+    assert transitions == [Document.Status.PROCESSING, Document.Status.PROCESSED]
+    row.refresh_from_db()
+    assert (row.status, row.processed) == (Document.Status.PROCESSED, True)
+
+
+def test_failed_only_once_retries_are_exhausted(document, transitions):
+    row, _ = document
+    doc_id, user_id = str(row.document_id), row.owner_id
+    with pytest.raises(FileNotFoundError):
+        tasks.process_document(doc_id, user_id, "/missing/notes.txt")
+    error = FileNotFoundError("notes.txt")
+
+    # A retry leaves the row processing.
+    tasks.process_document.on_retry(error, "task", (doc_id, user_id, "/missing/notes.txt"), {}, None)
+    row.refresh_from_db()
+    assert row.status == Document.Status.PROCESSING
+
+    tasks.process_document.on_failure(error, "task", (), {"doc_id": doc_id, "user_id": user_id}, None)
+    assert transitions == [Document.Status.PROCESSING, Document.Status.FAILED]
+    row.refresh_from_db()
+    assert (row.status, row.processed) == (Document.Status.FAILED, False)
@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+from conftest import VOCABULARY, fake_embed_many
+from rag_engine.vector_store import chunk_uuid
+
+
+def test_near_vector_ranks_by_cosine_and_scopes_user(populated):
+    hits = populated.near_vector(fake_embed_many(["refresh jwt token"])[0], user_id=1, limit=2)
+    assert [hit["text"] for hit in hits][0] == "JWT token refresh flow"
+    assert all(hit["user_id"] == 1 for hit in hits)
+    assert hits[0]["score"] < hits[1]["score"]
+
+
+def test_near_vector_offset_and_document_filter(populated):
+    vector = fake_embed_many(["django session"])[0]
+    first_page = populated.near_vector(vector, user_id=1, limit=1)
+    second_page = populated.near_vector(vector, user_id=1, limit=1, offset=1)
+    assert first_page[0]["_id"] != second_page[0]["_id"]
+    assert populated.near_vector(vector, user_id=1, document_ids=["doc-2"]) == []
+
+
+def test_bm25_keyword_search(populated):
+    hits = populated.bm25("session OR cache", user_id=1)
+    assert [hit["text"] for hit in hits] == ["Django session cache"]
+    assert populated.bm25("!!!", user_id=1) == []
+
+
+def test_restore_and_delete(populated):
+    populated.store_chunks(["JWT token refresh flow, revised"], "doc-1", user_id=1)
+    texts = {chunk["text"] for chunk in populated.iter_chunks(user_id=1)}
+    assert "JWT token refresh flow" not in texts
+    assert len(texts) == 3
+
+    assert populated.delete_document("doc-1") == 3
+    assert list(populated.iter_chunks(user_id=1)) == []
+    assert populated.bm25("session", user_id=1) == []
+    assert populated.get_document("doc-1") is None
+
+
+def test_iter_chunks_with_vectors(populated):
+    chunks = list(populated.iter_chunks(user_id=1, page_size=2, include_vector=True))
+    assert [chunk["_id"] for chunk in chunks] == [chunk_uuid("doc-1", index) for index in range(3)]
+    assert np.isclose(np.linalg.norm(chunks[0]["vector"]), 1.0)
+
+
+
+def test_failed_append_is_not_reused(populated):
+    row_bytes = len(VOCABULARY) * 4
+    size = populated.vectors_path.stat().st_size
+    # Duplicate ordinals collide on the chunk id after the vectors were written.
+    with pytest.raises(Exception):
+        populated.store_chunks(["session cache", "session cache again"], "doc-3", user_id=1, ordinals=[0, 0])
+    assert populated.vectors_path.stat().st_size == size + 2 * row_bytes
+    # A torn write from an interrupted process.
+    with open(populated.vectors_path, "ab") as handle:
+        handle.write(b"\xff" * (row_bytes // 2))
+
+    populated.store_chunks(["Query index tuning"], "doc-3", user_id=1)
+    assert populated.vectors_path.stat().st_size == size + row_bytes
+    hits = populated.near_vector(fake_embed_many(["query index tuning"])[0], user_id=1, limit=5)
+    assert all(hit["score"] == pytest.approx(0.0, abs=1e-6) for hit in hits if hit["text"] == "Query index tuning")
+    chunks = list(populated.iter_chunks(include_vector=True))
+    assert all(np.isclose(np.linalg.norm(chunk["vector"]), 1.0) for chunk in chunks)
+
+
+def test_document_vector_and_metadata(populated):
+    populated.update_document("doc-1", {"processed": True, "text": "ignored"}, vector=[1.0, 0.0])
+    document = populated.get_document("doc-1")
+    assert document["processed"] is True
+    assert document["filename"] == "auth.txt"
+
+
+def test_near_vector_grouped_collapses_documents(store):
+    store.store_chunks(["JWT token", "JWT token refresh", "JWT token rotation"], "doc-a", user_id=1)
+    store.store_chunks(["JWT token cache"], "doc-b", user_id=1)
+    groups = store.near_vector_grouped(fake_embed_many(["jwt token"])[0], user_id=1, groups=2, per_group=2)
+    assert [group["document_id"] for group in groups] == ["doc-a", "doc-b"]
+    assert [len(group["chunks"]) for group in groups] == [2, 1]
+    assert groups[0]["score"] == groups[0]["chunks"][0]["score"]
@@ -0,0 +1,57 @@
+import subprocess
+import sys
+
+import ipaddress
+
+from django.test import RequestFactory
+
+from rag_engine import metrics
+from rag_engine.metrics import metrics_view
+from rag_engine.timings import stage
+
+WORKER = """
+from prometheus_client import Counter, Gauge
+Counter("test_worker_requests_total", "Requests.", ["route"]).labels(route="chat").inc(2)
+Gauge("test_worker_in_flight", "In flight.", multiprocess_mode="livesum").inc()
+"""
+
+
+def scrape() -> str:
+    response = metrics_view(RequestFactory().get("/metrics"))
+    assert response.status_code == 200
+    assert response["Content-Type"].startswith("text/plain")
+    return response.content.decode()
+
+
+def test_scrape_returns_this_process_metrics():
+    with stage("test_scraped"):
+        pass
+    text = scrape()
+    assert "# TYPE rag_stage_seconds histogram" in text
+    assert 'rag_stage_seconds_count{stage="test_scraped"} 1.0' in text
+
+
+def test_multiprocess_scrape_sums_workers(tmp_path, monkeypatch):
+    for _ in range(2):
+        subprocess.run(
+            [sys.executable, "-c", WORKER],
+            env={"PROMETHEUS_MULTIPROC_DIR": str(tmp_path), "PATH": ""},
+            check=True,
+        )
+    monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(tmp_path))
+
+    text = scrape()
+    assert 'test_worker_requests_total{route="chat"} 4.0' in text
+    assert "test_worker_in_flight 2.0" in text
+    assert "rag_stage_seconds" not in text  # this process is not in multiprocess mode
+
+
+def test_scrape_requires_an_allowed_address_and_the_token(monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_ALLOWED_IPS", [ipaddress.ip_network("10.0.0.0/8")])
+    monkeypatch.setattr(metrics, "METRICS_TOKEN", "secret")
+    factory = RequestFactory()
+
+    assert metrics_view(factory.get("/metrics", REMOTE_ADDR="10.1.2.3")).status_code == 403
+    assert metrics_view(factory.get("/metrics", REMOTE_ADDR="10.1.2.3", HTTP_AUTHORIZATION="Bearer wrong")).status_code == 403
+    assert metrics_view(factory.get("/metrics", REMOTE_ADDR="192.0.2.1", HTTP_AUTHORIZATION="Bearer secret")).status_code == 403
+    assert metrics_view(factory.get("/metrics", REMOTE_ADDR="10.1.2.3", HTTP_AUTHORIZATION="Bearer secret")).status_code == 200
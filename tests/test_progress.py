@@ -0,0 +1,170 @@
+import asyncio
+import json
+from uuid import uuid4
+
+import pytest
+from django.contrib.auth.models import User
+from django.test import RequestFactory
+from rest_framework.authentication import BaseAuthentication
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from documents import api, tasks
+from documents.api import DocumentProgress, DocumentProgressStream
+from documents.progress import CHUNKING, DONE, EMBEDDING, FAILED, QUEUED, RETRYING, IngestProgress, snapshot
+
+OWNER = User(id=7, username="owner")
+
+
+class HeaderAuthentication(BaseAuthentication):
+    def authenticate(self, request):
+        return (OWNER, None) if request.META.get("HTTP_AUTHORIZATION") == "Bearer owner" else None
+
+    def authenticate_header(self, request):
+        return "Bearer"
+
+
+class ProgressStream(DocumentProgressStream):
+    authentication_classes = [HeaderAuthentication]
+    throttle_classes = []
+
+
+@pytest.fixture
+def progress(fake_redis, monkeypatch):
+    progress = IngestProgress()
+    monkeypatch.setattr(api, "progress", progress)
+    monkeypatch.setattr(tasks, "progress", progress)
+    return progress
+
+
+def parse_events(body):
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.split("\n") if not line.startswith(":"))
+        if lines:
+            events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def stream(document_ids, on_event=None, authorization="Bearer owner"):
+    """The events of a progress stream; on_event(event, data) runs as each arrives."""
+    request = RequestFactory().get(
+        "/api/documents/progress/stream", {"ids": ",".join(document_ids)}, HTTP_AUTHORIZATION=authorization,
+    )
+
+    async def main():
+        response = await ProgressStream.as_view()(request)
+        if response.status_code != 200:
+            return response, None
+        events = []
+        async for part in response.streaming_content:
+            for event in parse_events(part.decode() if isinstance(part, bytes) else part):
+                events.append(event)
+                if on_event is not None:
+                    await asyncio.to_thread(on_event, *event)
+        return response, events
+
+    return asyncio.run(main())
+
+
+def test_snapshot_decodes_redis_hash():
+    raw = {
+        b"user_id": b"7",
+        b"filename": b"notes.txt",
+        b"stage": EMBEDDING.encode(),
+        b"total": b"10",
+        b"stored": b"3",
+        b"duplicates": b"1",
+        b"started": b"100.0",
+        b"updated": b"102.0",
+    }
+
+    state = snapshot("doc", raw)
+
+    assert state["user_id"] == 7
+    assert state["total"] == 10
+    assert state["processed"] == 4
+    assert state["chunks_per_second"] == 2.0
+    assert not state["finished"]
+    assert snapshot("doc", {**raw, b"stage": DONE.encode()})["finished"]
+    assert snapshot("doc", {}) is None
+
+
+def test_snapshot_without_start_has_no_rate():
+    state = snapshot("doc", {"user_id": "1", "stage": "queued", "updated": "5.0"})
+
+    assert state["chunks_per_second"] == 0.0
+    assert state["total"] == 0
+
+
+def test_progress_reads_survive_a_redis_outage():
+    progress = IngestProgress("redis://127.0.0.1:1/0")
+    assert progress.get_many(["a", "b"]) == {"a": None, "b": None}
+    assert asyncio.run(progress.aget_many(["a"])) == {"a": None}
+
+
+def test_progress_endpoint_hides_other_users_documents(progress):
+    mine, theirs = str(uuid4()), str(uuid4())
+    progress.queued(mine, OWNER.id, "mine.txt")
+    progress.queued(theirs, 8, "theirs.txt")
+
+    def get(**kwargs):
+        request = APIRequestFactory().get("/api/documents/progress", kwargs.pop("params", {}))
+        force_authenticate(request, user=OWNER)
+        return DocumentProgress.as_view()(request, **kwargs)
+
+    response = get(document_id=mine)
+    assert response.status_code == 200
+    assert (response.data["stage"], response.data["filename"]) == (QUEUED, "mine.txt")
+    assert get(document_id=theirs).status_code == 404
+    response = get(params={"ids": f"{mine},{theirs}"})
+    assert response.data["documents"][theirs] is None
+    assert response.data["documents"][mine]["stage"] == QUEUED
+    assert get(params={"ids": "not-a-uuid"}).status_code == 400
+
+
+def test_stream_requires_authentication(progress):
+    response, _ = stream([str(uuid4())], authorization="")
+    assert response.status_code == 401
+    assert response["WWW-Authenticate"] == "Bearer"
+
+
+def test_stream_follows_updates_until_done(progress):
+    running, finished, unknown = str(uuid4()), str(uuid4()), str(uuid4())
+    progress.queued(running, OWNER.id, "running.txt")
+    progress.started(running, OWNER.id)
+    progress.queued(finished, OWNER.id, "finished.txt")
+    progress.stage(finished, OWNER.id, DONE)
+
+    def on_event(event, data):
+        # The task reports progress once the stream has shown the current states.
+        if event == "missing":
+            progress.chunked(running, OWNER.id, 2)
+            progress.advance(running, OWNER.id, stored=2)
+            progress.stage(running, OWNER.id, DONE)
+
+    response, events = stream([running, finished, unknown], on_event)
+    assert response["Content-Type"] == "text/event-stream"
+    assert [(event, data.get("document_id"), data.get("stage")) for event, data in events] == [
+        ("progress", running, CHUNKING),
+        ("progress", finished, DONE),
+        ("missing", unknown, None),
+        ("progress", running, EMBEDDING),
+        ("progress", running, EMBEDDING),
+        ("progress", running, DONE),
+        ("done", None, None),
+    ]
+    assert events[-2][1]["stored"] == 2 and events[-1][1] == {"pending": []}
+
+
+@pytest.mark.django_db
+def test_task_hooks_record_retry_and_failure(progress):
+    doc_id = str(uuid4())
+    progress.queued(doc_id, OWNER.id, "notes.txt")
+
+    tasks.process_document.on_retry(OSError("broker down"), "task", (doc_id, OWNER.id, "notes.txt"), {}, None)
+    assert progress.get_many([doc_id])[doc_id]["stage"] == RETRYING
+    assert progress.get_many([doc_id])[doc_id]["error"] == "broker down"
+
+    tasks.process_document.on_failure(OSError("gave up"), "task", (), {"doc_id": doc_id, "user_id": OWNER.id}, None)
+    state = progress.get_many([doc_id])[doc_id]
+    assert (state["stage"], state["error"], state["finished"]) == (FAILED, "gave up", True)
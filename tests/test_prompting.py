@@ -0,0 +1,62 @@
+from rag_engine.chunking import chunk_text, count_tokens
+from rag_engine.prompting import pack_prompt
+from rag_engine.search import SearchResult
+
+TEXT = " ".join(f"Sentence {i} explains how Django sessions and JWT tokens interact." for i in range(60))
+
+
+def results(chunks, document_id="doc-1", with_offsets=True):
+    return [
+        SearchResult(
+            id=f"{document_id}-{i}", text=chunk.text, document_id=document_id, user_id=1,
+            score=0.1 * i, search_type="semantic", ordinal=i,
+            start_offset=chunk.start if with_offsets else None, end_offset=chunk.end if with_offsets else None,
+        )
+        for i, chunk in enumerate(chunks)
+    ]
+
+
+def test_overlap_is_packed_once_by_offsets():
+    chunks = chunk_text(TEXT, size=300, overlap=80)[:3]
+    packed = pack_prompt(results(chunks), "How do sessions work?", budget=10_000)
+    assert TEXT[chunks[0].start:chunks[2].end] in packed.prompt
+    assert packed.prompt.count(chunks[1].text[:60]) == 1
+    assert packed.used_chunks == 3 and packed.sources == ["doc-1"]
+
+
+def test_overlap_is_trimmed_without_offsets():
+    chunks = chunk_text(TEXT, size=300, overlap=80)[:2]
+    packed = pack_prompt(results(chunks, with_offsets=False), "q", budget=10_000)
+    assert packed.prompt.count(chunks[1].text[:40]) == 1
+
+
+def test_budget_keeps_best_chunks_and_equal_scores():
+    chunks = chunk_text(TEXT, size=300, overlap=0)[:6]
+    found = results(chunks) + [
+        SearchResult(id="doc-2-0", text="Tied result.", document_id="doc-2", user_id=1, score=0.0, search_type="semantic")
+    ]
+    budget = 150
+    packed = pack_prompt(found, "q", budget=budget)
+    assert packed.tokens == count_tokens(packed.prompt) <= budget
+    assert chunks[0].text in packed.prompt and "Tied result." in packed.prompt
+    assert chunks[5].text not in packed.prompt
+    assert packed.dropped_chunks > 0
+
+
+def test_history_counts_against_budget():
+    chunks = chunk_text(TEXT, size=300, overlap=80)[:6]
+    without = pack_prompt(results(chunks), "And then?", budget=300)
+    history = "User: How do sessions work?\nAssistant: " + "They store state server-side. " * 20
+    packed = pack_prompt(results(chunks), "And then?", budget=300, history=history)
+    assert "Conversation so far:" in packed.prompt and history in packed.prompt
+    assert packed.tokens <= 300 and packed.used_chunks < without.used_chunks
+
+
+def test_history_is_trimmed_oldest_first_to_fit_the_budget():
+    lines = ["Summary of earlier messages: " + "Sessions were discussed at length. " * 30]
+    lines += [f"User: question {i} " + "about caching " * 10 for i in range(6)]
+    packed = pack_prompt([], "And then?", budget=150, history=lines)
+    assert packed.tokens <= 150 and packed.dropped_history > 0
+    assert lines[0] not in packed.prompt and lines[-1] in packed.prompt
+    kept = lines[packed.dropped_history:]
+    assert "\n".join(kept) in packed.prompt
@@ -0,0 +1,142 @@
+import pytest
+from django.contrib.auth.models import User
+from django.core import signing
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from conftest import fake_embed_many
+from rag_engine import api, search as search_module
+from rag_engine.chunking import chunk_text
+from rag_engine.search import SearchRag
+from rag_engine.vectors import pool_vectors
+
+
+def test_search_many_embeds_once(populated, monkeypatch):
+    calls = []
+
+    def counting_embed_many(texts):
+        calls.append(list(texts))
+        return fake_embed_many(texts)
+
+    monkeypatch.setattr(search_module, "embed_many", counting_embed_many)
+    search = SearchRag(client=populated)
+    results = search.search_many(["jwt refresh", "django session"], user_id=1, limit=1, strategy="hybrid")
+
+    assert calls == [["jwt refresh", "django session"]]
+    assert [found[0]["text"] for found in results] == ["JWT token refresh flow", "Django session cache"]
+    assert all(found[0]["search_type"] == "hybrid" for found in results)
+
+
+def test_two_stage_semantic_search_restricts_to_candidate_documents(store):
+    for doc_id, texts in (("doc-a", ["JWT token refresh", "JWT token"]), ("doc-b", ["Django session cache"])):
+        store.create_document(doc_id, 1, f"{doc_id}.txt", "local", False, "")
+        store.update_document(doc_id, {}, vector=pool_vectors(store.store_chunks(texts, doc_id, user_id=1)))
+
+    vector = fake_embed_many(["django session"])[0]
+    assert [hit["document_id"] for hit in store.near_vector_documents(vector, user_id=1, limit=1)] == ["doc-b"]
+    results = SearchRag(client=store).semantic_search("", user_id=1, limit=3, vector=vector, candidate_documents=1)
+    assert {result.document_id for result in results} == {"doc-b"}
+
+
+def test_expand_neighbors_stitches_windows_once(store):
+    text = " ".join(f"sentence {i} about django session cache." for i in range(40))
+    chunks = chunk_text(text, size=120, overlap=30)
+    store.store_chunks(chunks, "doc-a", user_id=1)
+    hits = [hit for hit in store.iter_chunks(user_id=1)]
+    results = SearchRag(client=store).expand_neighbors([hits[3], hits[4], hits[6], hits[0]], user_id=1, neighbors=1)
+
+    assert [result["window"] for result in results] == [[2, 4], [5, 7], [0, 1]]
+    for result in results:
+        assert text[result["start_offset"]:result["end_offset"]] == result["text"]
+    assert results[0]["end_offset"] == results[1]["start_offset"]
+
+
+def test_batch_search_clamps_limit(populated, monkeypatch):
+    limits = []
+
+    class RecordingSearch(SearchRag):
+        def search_many(self, queries, user_id, limit=5, **kwargs):
+            limits.append(limit)
+            return super().search_many(queries, user_id, limit=limit, **kwargs)
+
+    monkeypatch.setattr(search_module, "embed_many", fake_embed_many)
+    monkeypatch.setattr(api, "SearchRag", lambda: RecordingSearch(client=populated))
+    for requested, used in ((10**9, api.MAX_PAGE_SIZE), (-5, 1)):
+        request = APIRequestFactory().post("/api/search/batch", {"queries": ["jwt"], "limit": requested}, format="json")
+        force_authenticate(request, user=User(id=1, username="reader"))
+        response = api.BatchSearchView.as_view()(request)
+        assert response.status_code == 200
+    assert limits == [api.MAX_PAGE_SIZE, 1]
+
+
+def test_batch_search_workers_see_the_request_deadline(populated, monkeypatch):
+    monkeypatch.setattr(search_module, "embed_many", fake_embed_many)
+    monkeypatch.setattr(api, "SEARCH_DEADLINE", 0)
+    monkeypatch.setattr(api, "SearchRag", lambda: SearchRag(client=populated))
+    request = APIRequestFactory().post("/api/search/batch", {"queries": ["jwt", "django"]}, format="json")
+    force_authenticate(request, user=User(id=1, username="reader"))
+
+    assert api.BatchSearchView.as_view()(request).status_code == 504
+
+def test_hybrid_pages_have_no_duplicates_or_gaps(store, monkeypatch):
+    monkeypatch.setattr(search_module, "get_query_vector", lambda query: fake_embed_many([query])[0])
+    monkeypatch.setattr(search_module, "HYBRID_WINDOW", 20)
+    words = ["jwt", "token", "refresh", "django", "session", "cache"]
+    store.store_chunks([f"{words[i % 6]} {words[i * 5 % 6]} note {i}" for i in range(40)], "doc-a", user_id=1)
+    search = SearchRag(client=store)
+
+    pages, offset = [], 0
+    while True:
+        page = search.search("jwt session cache", 1, 7, "hybrid", offset=offset)
+        pages.append(page)
+        if len(page) < 7:
+            break
+        offset += len(page)
+    ids = [result["_id"] for page in pages for result in page]
+
+    full = search.search("jwt session cache", 1, 20, "hybrid")
+    assert ids == [result["_id"] for result in full]
+    assert len(ids) == len(set(ids)) == 20
+
+
+def test_hybrid_first_page_fuses_only_its_own_results(store, monkeypatch):
+    monkeypatch.setattr(search_module, "get_query_vector", lambda query: fake_embed_many([query])[0])
+    store.store_chunks([f"jwt session note {i}" for i in range(40)], "doc-a", user_id=1)
+    search = SearchRag(client=store)
+    fetched = []
+    for name in ("semantic_search", "keyword_search"):
+        def recording(*args, _search=getattr(search, name), **kwargs):
+            fetched.append(kwargs["limit"])
+            return _search(*args, **kwargs)
+        monkeypatch.setattr(search, name, recording)
+
+    first = search.hybrid_search("jwt session", 1, limit=5)
+    assert fetched == [10, 10]
+    second = search.hybrid_search("jwt session", 1, limit=5, offset=5)
+    assert fetched[2:] == [search_module.HYBRID_WINDOW * 2] * 2
+    assert not {result.id for result in first} & {result.id for result in second}
+
+
+@pytest.mark.parametrize("value, streamed", [("false", False), ("0", False), (False, False), ("true", True), (1, True)])
+def test_search_stream_flag_is_parsed(populated, monkeypatch, value, streamed):
+    monkeypatch.setattr(search_module, "get_query_vector", lambda query: fake_embed_many([query])[0])
+    monkeypatch.setattr(api, "SearchRag", lambda: SearchRag(client=populated))
+    request = APIRequestFactory().post("/api/search", {"query": "jwt", "stream": value}, format="json")
+    force_authenticate(request, user=User(id=1, username="reader"))
+    response = api.SearchView.as_view()(request)
+    assert response.status_code == 200
+    assert response.streaming is streamed
+
+
+def test_search_rejects_unparseable_stream_flag():
+    request = APIRequestFactory().post("/api/search", {"query": "jwt", "stream": "maybe"}, format="json")
+    force_authenticate(request, user=User(id=1, username="reader"))
+    assert api.SearchView.as_view()(request).status_code == 400
+
+
+def test_search_cursor_is_bound_to_document_filter():
+    cursor = api.encode_cursor("jwt", 1, "hybrid", 10, ["doc-b", "doc-a"])
+    assert api.decode_cursor(cursor, "jwt", 1, "hybrid", ["doc-a", "doc-b"]) == 10
+    with pytest.raises(signing.BadSignature):
+        api.decode_cursor(cursor, "jwt", 1, "hybrid", ["doc-a"])
+    with pytest.raises(signing.BadSignature):
+        api.decode_cursor(cursor, "jwt", 1, "hybrid")
@@ -0,0 +1,37 @@
+import pytest
+from prometheus_client import REGISTRY
+
+from rag_engine.timings import collect, stage
+
+
+def observations(stage_name):
+    return REGISTRY.get_sample_value("rag_stage_seconds_count", {"stage": stage_name}) or 0
+
+
+def test_stage_times_into_collector_and_histogram():
+    before = observations("test_fusion")
+    with collect() as timings:
+        with stage("test_fusion"):
+            pass
+        with stage("test_fusion"):
+            pass
+    with stage("test_fusion"):
+        pass
+
+    assert set(timings) == {"test_fusion"}
+    assert timings["test_fusion"] >= 0
+    assert observations("test_fusion") == before + 3
+
+
+def test_stage_counts_errors():
+    with pytest.raises(RuntimeError), stage("test_broken"):
+        raise RuntimeError("boom")
+
+    assert REGISTRY.get_sample_value("rag_stage_errors_total", {"stage": "test_broken"}) == 1
+
+
+def test_collect_disabled_yields_none():
+    with collect(enabled=False) as timings:
+        with stage("test_disabled"):
+            pass
+    assert timings is None
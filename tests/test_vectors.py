@@ -0,0 +1,20 @@
+import numpy as np
+
+from rag_engine.vectors import pool_vectors, top_k_indices
+
+
+def test_pool_vectors_is_normalized_weighted_mean():
+    pooled = pool_vectors([[2.0, 0.0], [0.0, 5.0]], weights=[3, 1])
+    assert np.isclose(np.linalg.norm(pooled), 1.0)
+    assert np.allclose(pooled, np.array([3.0, 1.0]) / np.sqrt(10))
+
+
+def test_pool_vectors_empty():
+    assert pool_vectors([]) is None
+
+
+def test_top_k_indices_orders_best_first():
+    scores = np.array([0.1, 0.9, 0.5, 0.7, 0.3])
+    assert top_k_indices(scores, 3).tolist() == [1, 3, 2]
+    assert top_k_indices(scores, 10).tolist() == [1, 3, 2, 4, 0]
+    assert top_k_indices(scores, 0).tolist() == []
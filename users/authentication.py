@@ -0,0 +1,82 @@
+import logging
+import os
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+logger = logging.getLogger(__name__)
+
+# Seconds an authenticated user is served from the cache; changes to the user invalidate it sooner.
+USER_CACHE_TTL = int(os.environ.get("AUTH_USER_CACHE_TTL", 60))
+# The fields the API reads from request.user, besides its id.
+CACHED_USER_FIELDS = ("username", "email", "is_active", "is_staff", "is_superuser")
+
+
+def user_cache_key(user_id, jti: str) -> str:
+    return f"auth:user:{user_id}:{jti}"
+
+
+def user_version_key(user_id) -> str:
+    return f"auth:user_version:{user_id}"
+
+
+def invalidate_cached_user(user_id) -> None:
+    """Make every cached copy of a user stale, e.g. after it was changed, deactivated or deleted."""
+    cache.set(user_version_key(user_id), uuid4().hex, timeout=None)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that caches the authenticated user for a short time
+    instead of loading it from the database on every request.
+
+    Entries are keyed by user id and token jti and hold a minimal, unsaved
+    User instance's fields. Each entry records the user's version stamp
+    (see invalidate_cached_user), which the users app replaces whenever a
+    user is saved or deleted; an entry with an outdated stamp is ignored
+    and the user is reloaded (and re-checked, e.g. for is_active). If the
+    cache is unreachable the database is used.
+    """
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(jwt_settings.USER_ID_CLAIM)
+        if user_id is None:
+            return super().get_user(validated_token)
+
+        entry_key = user_cache_key(user_id, validated_token.get(jwt_settings.JTI_CLAIM, ""))
+        version_key = user_version_key(user_id)
+        try:
+            cached = cache.get_many([entry_key, version_key])
+        except Exception:
+            logger.warning("User cache unavailable, loading user from the database", exc_info=True)
+            return super().get_user(validated_token)
+
+        entry = cached.get(entry_key)
+        if entry is not None and entry["version"] == cached.get(version_key):
+            return self._cached_user(entry["fields"])
+
+        user = super().get_user(validated_token)
+        entry = {
+            "version": cached.get(version_key),
+            "fields": {
+                field: getattr(user, field)
+                for field in (jwt_settings.USER_ID_FIELD, *CACHED_USER_FIELDS)
+                if hasattr(user, field)
+            },
+        }
+        try:
+            cache.set(entry_key, entry, USER_CACHE_TTL)
+        except Exception:
+            logger.warning("Could not cache user", exc_info=True)
+        return user
+
+    def _cached_user(self, fields: dict):
+        # The id comes from the cached fields: the token's claim is a string.
+        # Fields that are not cached are deferred, so reading one loads it.
+        # from_db() takes the values in the model's field order.
+        names = [field.attname for field in self.user_model._meta.concrete_fields if field.attname in fields]
+        return self.user_model.from_db(DEFAULT_DB_ALIAS, names, [fields[name] for name in names])
+
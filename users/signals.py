@@ -0,0 +1,19 @@
+import logging
+
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .authentication import invalidate_cached_user
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def invalidate_user_cache(sender, instance, **kwargs):
+    try:
+        invalidate_cached_user(instance.pk)
+    except Exception:
+        # A cache outage must not fail the save; cached copies still expire after AUTH_USER_CACHE_TTL.
+        logger.warning(f"Could not invalidate cached user {instance.pk}", exc_info=True)